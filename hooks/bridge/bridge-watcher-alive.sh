@@ -11,9 +11,10 @@ if [ ! -x "$HOME/.agent-bridge/bridge" ]; then
     exit 0
 fi
 
+source "$HOME/.claude/hooks/lib/payload.sh"
+
 INPUT=$(cat 2>/dev/null)
-SESSION_ID=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('session_id',''))" 2>/dev/null)
-EVENT=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('hook_event_name',''))" 2>/dev/null)
+payload_fields "$INPUT" SESSION_ID=.session_id EVENT=.hook_event_name
 
 # Identity resolution: trust the SESSION_ID from Claude's hook input (it's
 # authoritative — Claude Code's own session id, not something derived from
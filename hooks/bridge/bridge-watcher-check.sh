@@ -22,9 +22,10 @@ if [ ! -x "$HOME/.agent-bridge/bridge" ]; then
     exit 0
 fi
 
+source "$HOME/.claude/hooks/lib/payload.sh"
+
 INPUT=$(cat 2>/dev/null)
-EVENT=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('hook_event_name',''))" 2>/dev/null)
-SESSION_ID=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('session_id',''))" 2>/dev/null)
+payload_fields "$INPUT" EVENT=.hook_event_name SESSION_ID=.session_id
 
 # NON-BLOCKING on PreToolUse: a PreToolUse hook exit-2 blocks the call AND cancels the
 # whole parallel tool batch. NEVER do that for a bridge message — exit 0 immediately,
@@ -1,19 +1,25 @@
 #!/bin/bash
-# PostToolUse hook for Bash — auto-closes bd issues referenced in git commit messages
+# PostToolUse hook for Bash — auto-closes bd issues referenced in git commit messages,
+# and invalidates the open-issues snapshot (lib/bd_issues.py) on any bd mutation
 source "$HOME/.claude/hooks/lib/claude-env.sh"
+source "$HOME/.claude/hooks/lib/payload.sh"
 
 INPUT=$(cat)
-TOOL_NAME=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_name',''))" 2>/dev/null)
+payload_fields "$INPUT" TOOL_NAME=.tool_name COMMAND=.tool_input.command \
+    EXIT_CODE='.tool_result.exitCode // .tool_result.exit_code // 0'
 
 [[ "$TOOL_NAME" != "Bash" ]] && exit 0
 
-COMMAND=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_input',{}).get('command',''))" 2>/dev/null)
+# bd create/update/close/...: the open-issues snapshot is stale -- mark it dirty
+# and refresh it in the background (open_issues_surface.py never calls bd itself)
+if echo "$COMMAND" | grep -qE '(^|[;&|(]|\s)bd\s+(create|new|q|update|edit|close|reopen|delete)\b'; then
+    python3 "$CLAUDE_DIR/hooks/lib/bd_issues.py" --invalidate "${CLAUDE_PROJECT_DIR:-$PWD}" 2>/dev/null
+fi
 
 # Only fire on git commit commands
 echo "$COMMAND" | grep -qE '^\s*git\s+commit\b' || exit 0
 
 # Check if commit succeeded (tool_result exit code)
-EXIT_CODE=$(echo "$INPUT" | python3 -c "import sys,json; d=json.load(sys.stdin); print(d.get('tool_result',{}).get('exitCode', d.get('tool_result',{}).get('exit_code', 0)))" 2>/dev/null)
 [[ "$EXIT_CODE" != "0" ]] && exit 0
 
 # Extract bd issue references from the commit message in the command
@@ -29,6 +35,7 @@ if [[ -n "$BD_IDS" ]]; then
     while IFS= read -r id; do
         bd close "$id" 2>/dev/null && echo "Auto-closed bd issue: $id"
     done <<< "$BD_IDS"
+    python3 "$CLAUDE_DIR/hooks/lib/bd_issues.py" --invalidate "${CLAUDE_PROJECT_DIR:-$PWD}" 2>/dev/null
 else
     # Warn if implementation files changed but no issue referenced
     STAGED=$(git diff --cached --name-only HEAD~1 2>/dev/null | grep -vE '\.(md|txt|json)$' | head -1)
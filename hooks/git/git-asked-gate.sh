@@ -11,10 +11,11 @@
 # Flag: timestamp file at /tmp/claude-gitdestruct-allow-${SESSION_ID}; the guard
 # checks mtime against a 10-minute window. Per-session (no cross-agent leak).
 
+source "$HOME/.claude/hooks/lib/payload.sh"
+
 INPUT=$(cat)
-TOOL_NAME=$(printf '%s' "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_name',''))" 2>/dev/null)
+payload_fields "$INPUT" TOOL_NAME=.tool_name SESSION_ID=.session_id
 [ "$TOOL_NAME" != "AskUserQuestion" ] && exit 0
 
-SESSION_ID=$(printf '%s' "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('session_id',''))" 2>/dev/null)
 [ -n "$SESSION_ID" ] && : > "/tmp/claude-gitdestruct-allow-${SESSION_ID}"
 exit 0
@@ -12,26 +12,21 @@
 # follow-up bullets that nobody ever picks up. bd-IDs make the work
 # first-class so 'bd ready' surfaces it.
 
+source "$HOME/.claude/hooks/lib/payload.sh"
+
 INPUT=$(cat)
-TOOL_NAME=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_name',''))" 2>/dev/null)
+# Write supplies 'content'; Edit supplies 'new_string'. Scan whichever applies.
+payload_fields "$INPUT" TOOL_NAME=.tool_name FILE_PATH=.tool_input.file_path \
+    CONTENT='(.tool_input.content | select(. != "")) // .tool_input.new_string'
 
 [ "$TOOL_NAME" != "Write" ] && [ "$TOOL_NAME" != "Edit" ] && exit 0
 
-FILE_PATH=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_input',{}).get('file_path',''))" 2>/dev/null)
-
 # Only check plan files
 case "$FILE_PATH" in
     */.claude*/plans/PLAN-*.md) ;;
     *) exit 0 ;;
 esac
 
-# Write supplies 'content'; Edit supplies 'new_string'. Scan whichever applies.
-CONTENT=$(echo "$INPUT" | python3 -c "
-import sys, json
-data = json.load(sys.stdin).get('tool_input', {})
-print(data.get('content') or data.get('new_string') or '')
-" 2>/dev/null)
-
 # bd-ID regex: <project-slug>-<short> or bd-<short>. Examples:
 #   llamacpp-abcd, secular-constraints-adkh, bd-1234, claude-xy12
 BD_ID_RX='([a-z][a-z0-9_-]+-[a-z0-9]+|bd-[a-z0-9]+)'
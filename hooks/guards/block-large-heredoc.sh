@@ -18,11 +18,12 @@
 #       always allowed.
 #   - Anything else: warn at 30 lines, BLOCK at 60 lines.
 
+source "$HOME/.claude/hooks/lib/payload.sh"
+
 INPUT=$(cat)
-TOOL_NAME=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_name',''))" 2>/dev/null)
+payload_fields "$INPUT" TOOL_NAME=.tool_name CMD=.tool_input.command
 [ "$TOOL_NAME" != "Bash" ] && exit 0
 
-CMD=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_input',{}).get('command',''))" 2>/dev/null)
 [ -z "$CMD" ] && exit 0
 
 # Cheap early-out: no heredoc at all?
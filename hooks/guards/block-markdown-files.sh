@@ -9,13 +9,14 @@
 #      by md-asked-gate.sh whenever Claude calls AskUserQuestion (the
 #      canonical user-intent capture mechanism).
 
+source "$HOME/.claude/hooks/lib/payload.sh"
+
 INPUT=$(cat)
-TOOL_NAME=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_name',''))" 2>/dev/null)
-SESSION_ID=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('session_id',''))" 2>/dev/null)
+payload_fields "$INPUT" TOOL_NAME=.tool_name SESSION_ID=.session_id \
+    FILE_PATH=.tool_input.file_path
 
 [ "$TOOL_NAME" != "Write" ] && exit 0
 
-FILE_PATH=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_input',{}).get('file_path',''))" 2>/dev/null)
 [[ "$FILE_PATH" != *.md ]] && exit 0
 
 BASENAME=$(basename "$FILE_PATH")
@@ -15,9 +15,10 @@
 #   git mv EXISTING.md other.md  — moving an existing file (allowed)
 #   bridge send / kb add ... / bd update ... — CLI args citing .md paths
 
+source "$HOME/.claude/hooks/lib/payload.sh"
+
 INPUT=$(cat)
-TOOL_NAME=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_name',''))" 2>/dev/null)
-SESSION_ID=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('session_id',''))" 2>/dev/null)
+payload_fields "$INPUT" TOOL_NAME=.tool_name SESSION_ID=.session_id
 [ "$TOOL_NAME" != "Bash" ] && exit 0
 
 CMD=$(CLAUDE_MD_HOOK_INPUT="$INPUT" python3 <<'PYEOF' 2>/dev/null
@@ -13,22 +13,16 @@
 # stop_hook_active flag prevents infinite loops — if we've already
 # blocked once for this stop, the harness will let it through.
 
+source "$HOME/.claude/hooks/lib/payload.sh"
+
 INPUT=$(cat)
 
 # Don't loop: if stop hook already fired for this stop, let it through.
-# Accept truthy in any form (Python True repr, JSON true string, '1').
-STOP_HOOK_ACTIVE=$(echo "$INPUT" | python3 -c "
-import sys, json
-v = json.load(sys.stdin).get('stop_hook_active', False)
-# Normalise to '1' / '0'
-if v is True or (isinstance(v, str) and v.lower() == 'true'):
-    print('1')
-else:
-    print('0')
-" 2>/dev/null)
+# Accept truthy in any form (JSON true, or the string "true"); normalised to 1/0.
+payload_fields "$INPUT" TRANSCRIPT_PATH=.transcript_path \
+    STOP_HOOK_ACTIVE='.stop_hook_active | if . == true or (type == "string" and ascii_downcase == "true") then "1" else "0" end'
 [ "$STOP_HOOK_ACTIVE" = "1" ] && exit 0
 
-TRANSCRIPT_PATH=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('transcript_path',''))" 2>/dev/null)
 [ -z "$TRANSCRIPT_PATH" ] && exit 0
 [ ! -f "$TRANSCRIPT_PATH" ] && exit 0
 
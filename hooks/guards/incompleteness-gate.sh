@@ -2,14 +2,13 @@
 # PreToolUse hook for Bash — blocks git commit if staged changes have
 # incompleteness markers without corresponding bd issues
 source "$HOME/.claude/hooks/lib/claude-env.sh"
+source "$HOME/.claude/hooks/lib/payload.sh"
 
 INPUT=$(cat)
-TOOL_NAME=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_name',''))" 2>/dev/null)
+payload_fields "$INPUT" TOOL_NAME=.tool_name COMMAND=.tool_input.command
 
 [[ "$TOOL_NAME" != "Bash" ]] && exit 0
 
-COMMAND=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_input',{}).get('command',''))" 2>/dev/null)
-
 # Only fire on git commit commands
 echo "$COMMAND" | grep -qE '^\s*git\s+commit\b' || exit 0
 
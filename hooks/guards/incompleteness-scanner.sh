@@ -4,28 +4,17 @@
 source "$HOME/.claude/hooks/lib/claude-env.sh"
 
 source "$HOME/.claude/hooks/lib/state.sh"
+source "$HOME/.claude/hooks/lib/payload.sh"
 
 INPUT=$(cat)
-TOOL_NAME=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_name',''))" 2>/dev/null)
+# NEW_CONTENT: only the content being written (not pre-existing file content)
+payload_fields "$INPUT" TOOL_NAME=.tool_name FILE_PATH=.tool_input.file_path \
+    NEW_CONTENT='if .tool_name == "Edit" then .tool_input.new_string elif .tool_name == "Write" then .tool_input.content else "" end'
 
 [[ "$TOOL_NAME" != "Edit" && "$TOOL_NAME" != "Write" ]] && exit 0
 
-# Extract only the NEW content being written (not pre-existing file content)
-NEW_CONTENT=$(echo "$INPUT" | python3 -c "
-import sys, json
-d = json.load(sys.stdin)
-ti = d.get('tool_input', {})
-tn = d.get('tool_name', '')
-if tn == 'Edit':
-    print(ti.get('new_string', ''))
-elif tn == 'Write':
-    print(ti.get('content', ''))
-" 2>/dev/null)
-
 [[ -z "$NEW_CONTENT" ]] && exit 0
 
-FILE_PATH=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_input',{}).get('file_path',''))" 2>/dev/null)
-
 # Skip files where markers are expected/legitimate
 # (aligned with skip_patterns in incompleteness-gate.sh)
 [[ "$FILE_PATH" == *.md ]] && exit 0
@@ -34,7 +23,7 @@ FILE_PATH=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.std
 [[ "$FILE_PATH" == *.yaml ]] && exit 0
 
 # Session ID for state tracking
-SESSION_ID="${CLAUDE_SESSION_ID:-$(cat "$STATE_DIR/session-$PPID" 2>/dev/null || echo unknown)}"
+SESSION_ID=$(session_id) || SESSION_ID=unknown
 MARKER_FILE="$STATE_DIR/${SESSION_ID}-incomplete-markers"
 
 # Scan for incompleteness markers
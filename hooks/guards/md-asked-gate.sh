@@ -12,12 +12,12 @@
 # The session-agnostic /tmp/claude-md-allow-any flag has been retired — it
 # leaked across worktree agents and produced false "agent escape" suspicions.
 
+source "$HOME/.claude/hooks/lib/payload.sh"
+
 INPUT=$(cat)
-TOOL_NAME=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_name',''))" 2>/dev/null)
+payload_fields "$INPUT" TOOL_NAME=.tool_name SESSION_ID=.session_id
 [ "$TOOL_NAME" != "AskUserQuestion" ] && exit 0
 
-SESSION_ID=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('session_id',''))" 2>/dev/null)
-
 # Per-session timestamp flag. The block-markdown hook checks mtime.
 if [ -n "$SESSION_ID" ]; then
     : > "/tmp/claude-md-allow-${SESSION_ID}"
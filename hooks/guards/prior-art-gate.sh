@@ -29,9 +29,8 @@ except:
 
     [[ "$SUBAGENT_TYPE" == "kb-research" ]] && exit 0
 
-    SESSION_FILE="$STATE_DIR/session-$PPID"
-    [[ ! -f "$SESSION_FILE" ]] && exit 0
-    SESSION_ID=$(cat "$SESSION_FILE")
+    SESSION_ID=$(session_id)
+    [[ -z "$SESSION_ID" ]] && exit 0
 
     SEARCHED_FILE="$STATE_DIR/${SESSION_ID}-searched"
     if [[ ! -f "$SEARCHED_FILE" ]]; then
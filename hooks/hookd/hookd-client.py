@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Thin client for the warm hook daemon (lib/hookd.py).
+
+Wired in settings.json in place of a whole event+matcher hook list:
+
+    python3 $HOME/.claude/hooks/hookd/hookd-client.py PreToolUse:Bash
+
+Forwards the payload (plus env + cwd, so hooks see the caller's view) to this
+session's daemon and replays its merged exit code / stdout / stderr. If the
+daemon is not running, runs the same group in-process via hook_dispatch -- same
+hooks, same merge, just without the warm start. A guard can never silently
+vanish because the daemon is down.
+
+The daemon serves one request at a time, so a call can queue behind another
+tool call's group. The client waits at most the group's budget (its
+slowest hook's timeout) plus READ_SLACK_S for an answer, then runs the group
+itself rather than let a stuck daemon stall every later call.
+
+Imports are kept to the bare minimum: this runs on every tool call.
+"""
+import json
+import os
+import socket
+import sys
+
+HOOKS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIB = os.path.join(HOOKS, 'lib')
+GROUPS_FILE = os.path.join(HOOKS, 'hookd', 'groups.json')
+STATE_DIR = os.environ.get('CLAUDE_STATE_DIR') or os.path.expanduser('~/.claude/state')
+DEFAULT_TIMEOUT_MS = 60000  # as hook_dispatch: Claude Code's default
+READ_SLACK_S = 1.0
+
+
+def _session_id(payload: bytes) -> str:
+    sid = os.environ.get('CLAUDE_SESSION_ID', '').strip()
+    if sid:
+        return sid
+    try:
+        return json.loads(payload).get('session_id', '') or ''
+    except Exception:
+        return ''
+
+
+def _budget(group: str) -> float:
+    """Seconds the daemon may take on `group`: its hooks run concurrently, each
+    under its own deadline, so the slowest hook's timeout."""
+    try:
+        with open(GROUPS_FILE) as fh:
+            hooks = json.load(fh).get('groups', {}).get(group) or []
+        return max((h.get('timeout') or DEFAULT_TIMEOUT_MS) for h in hooks) / 1000.0
+    except (OSError, ValueError, AttributeError):
+        return DEFAULT_TIMEOUT_MS / 1000.0
+
+
+def _via_daemon(group: str, payload: bytes, sid: str):
+    """Return (rc, stdout, stderr) from the daemon, or None if it is not up or
+    did not answer within the group's budget."""
+    if not sid:
+        return None
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(0.5)
+    try:
+        s.connect(os.path.join(STATE_DIR, f'{sid}-hookd.sock'))
+    except OSError:
+        s.close()
+        return None
+    try:
+        s.settimeout(_budget(group) + READ_SLACK_S)
+        head = json.dumps({'group': group, 'cwd': os.getcwd(), 'env': dict(os.environ)})
+        s.sendall(head.encode() + b'\n' + payload)
+        s.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            buf = s.recv(65536)
+            if not buf:
+                break
+            chunks.append(buf)
+        resp = json.loads(b''.join(chunks))
+        return resp['rc'], resp['stdout'], resp['stderr']
+    except (OSError, ValueError, KeyError):
+        return None
+    finally:
+        s.close()
+
+
+def main() -> int:
+    if len(sys.argv) < 2:
+        return 0
+    group = sys.argv[1]
+    payload = sys.stdin.buffer.read()
+    sid = _session_id(payload)
+    if sid:
+        # Hooks run under the daemon (or this shim), not Claude, so `session-$PPID`
+        # lookups would miss -- hand them the session explicitly.
+        os.environ['CLAUDE_SESSION_ID'] = sid
+    res = _via_daemon(group, payload, sid)
+    if res is None:
+        sys.path.insert(0, LIB)
+        import hook_dispatch
+        res = hook_dispatch.run_group(group, payload)
+    rc, out, err = res
+    if out:
+        sys.stdout.write(out)
+    if err:
+        sys.stderr.write(err)
+    return rc
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,6 +16,8 @@ import sys as _sys, os as _os
 _sys.path.insert(0, _os.path.expanduser('~/.claude/hooks/lib'))
 from _seen import filter_unseen  # noqa: E402
 from _state import kb_project_for_path  # noqa: E402
+import kb_db  # noqa: E402
+import text_tokens  # noqa: E402
 try:
     from ash_health import ash_down, STOP_LINE
 except Exception:
@@ -23,63 +25,24 @@ except Exception:
     STOP_LINE = ''
 
 
-def extract_candidate_tokens(text: str) -> list[str]:
-    """Extract candidate symbol/quantity tokens from prompt text."""
-    candidates: set[str] = set()
-
-    # Verb-phrase extraction: "compute/derive/implement/prove/find X"
-    verb_re = re.compile(
-        r'\b(?:compute|derive|implement|prove|find|calculate|determine|evaluate|check)\s+'
-        r'([A-Za-z_][A-Za-z0-9_]{2,})',
-        re.IGNORECASE,
-    )
-    for m in verb_re.finditer(text):
-        candidates.add(m.group(1))
-
-    # Explicit "= value" constants: "G = 17/24", "alpha = 3/64", "c = 3"
-    eq_re = re.compile(r'\b([A-Za-z_]\w*)\s*=\s*[\d/\.]+')
-    for m in eq_re.finditer(text):
-        tok = m.group(1)
-        if len(tok) >= 2:
-            candidates.add(tok)
-
-    # Exact fractional values that may be KB-indexed: "17/24", "3/64"
-    frac_re = re.compile(r'\b(\d{1,4}/\d{1,4})\b')
-    for m in frac_re.finditer(text):
-        candidates.add(m.group(1))
-
-    # snake_case identifiers (likely function/variable names from codebase)
-    snake_re = re.compile(r'\b([a-z][a-z0-9]*(?:_[a-z0-9]+){1,})\b')
-    for m in snake_re.finditer(text):
-        tok = m.group(1)
-        # Skip common stop-words / short tokens
-        if len(tok) >= 6 and tok not in {
-            'the_user', 'for_the', 'in_the', 'to_the', 'of_the', 'with_the',
-        }:
-            candidates.add(tok)
-
-    # CamelCase identifiers
-    camel_re = re.compile(r'\b([A-Z][a-z]+(?:[A-Z][a-z0-9]+)+)\b')
-    for m in camel_re.finditer(text):
-        candidates.add(m.group(1))
-
-    # Mixed-case with underscores: Z_species, W_of_J, S_eff, Q_EM_w, T_3_L
-    mixed_re = re.compile(r'\b([A-Za-z][A-Za-z0-9]*(?:_[A-Za-z0-9]+)+)\b')
-    for m in mixed_re.finditer(text):
-        tok = m.group(1)
-        if len(tok) >= 3:
-            candidates.add(tok)
-
-    # ALL_CAPS constants (≥3 chars)
-    upper_re = re.compile(r'\b([A-Z][A-Z0-9_]{2,})\b')
-    for m in upper_re.finditer(text):
-        candidates.add(m.group(1))
-
-    # Greek letters (unicode range)
-    greek_re = re.compile(r'[α-ωΑ-Ω]')
-    for ch in greek_re.findall(text):
-        candidates.add(ch)
+_SNAKE_STOP = {'the_user', 'for_the', 'in_the', 'to_the', 'of_the', 'with_the'}
+
 
+def extract_candidate_tokens(text: str) -> list[str]:
+    """Extract candidate symbol/quantity tokens from prompt text (one scan, see
+    lib/text_tokens.py): "compute/derive/implement/prove/find X" objects,
+    `name = value` constants, exact fractions, snake_case (>= 6 chars, minus
+    prose stop-words), CamelCase, underscored mixed-case (>= 3), ALL_CAPS and
+    Greek letters."""
+    t = text_tokens.scan(text)
+    candidates: set[str] = set(t['verb'])
+    candidates.update(tok for tok in t['assign'] if len(tok) >= 2)
+    candidates.update(t['frac'])
+    candidates.update(tok for tok in t['snake'] if len(tok) >= 6 and tok not in _SNAKE_STOP)
+    candidates.update(t['camel'])
+    candidates.update(tok for tok in t['mixed'] if len(tok) >= 3)
+    candidates.update(t['upper'])
+    candidates.update(t['greek'])
     return list(candidates)
 
 
@@ -101,7 +64,7 @@ def extract_fractions(text: str) -> list[str]:
     """
     if not _FRAC_CONTEXT_RE.search(text):
         return []
-    return re.findall(r'\b\d{1,4}/\d{1,4}\b', text)
+    return list(text_tokens.scan(text)['frac'])
 
 
 def _project_from_cwd() -> str | None:
@@ -121,19 +84,10 @@ def query_db(conn: sqlite3.Connection, tokens: list[str], fracs: list[str],
         return advisories
 
     # --- python_symbols exact name match — project-scoped to prevent cross-project FPs ---
-    placeholders = ','.join('?' * len(tokens))
-    if project:
-        rows = conn.execute(
-            f'SELECT name, kind, status, module, file, line, redirect_to '
-            f'FROM python_symbols WHERE name IN ({placeholders}) AND project=? LIMIT 20',
-            tokens + [project],
-        ).fetchall()
-    else:
-        rows = conn.execute(
-            f'SELECT name, kind, status, module, file, line, redirect_to '
-            f'FROM python_symbols WHERE name IN ({placeholders}) LIMIT 20',
-            tokens,
-        ).fetchall()
+    # Only tokens that may be a symbol/notation name reach SQLite (Bloom prefilter).
+    kb_db.load_tokens(conn, kb_db.maybe_symbols(conn, tokens))
+    q, pp = kb_db.scoped('symbols_by_tokens', project)
+    rows = kb_db.query(conn, q, *pp, 20)
     canonical_candidates: list[tuple[str, str]] = []
     for name, kind, status, module, fpath, line, redirect_to in rows:
         if name in seen_names:
@@ -161,19 +115,8 @@ def query_db(conn: sqlite3.Connection, tokens: list[str], fracs: list[str],
         advisories.extend(line for k, line in canonical_candidates if k in new_key_set)
 
     # --- notations exact symbol match (skip generic-fallback rows) — project-scoped ---
-    _not_base = (
-        f"SELECT current_symbol, meaning FROM notations "
-        f"WHERE current_symbol IN ({placeholders}) "
-        f"AND meaning IS NOT NULL AND meaning != '' AND meaning != '?' "
-        f"AND (meaning_source IS NULL OR meaning_source != 'generic-fallback')"
-    )
-    if project:
-        rows2 = conn.execute(
-            _not_base + " AND (project IS NULL OR project=?) LIMIT 10",
-            tokens + [project],
-        ).fetchall()
-    else:
-        rows2 = conn.execute(_not_base + " LIMIT 10", tokens).fetchall()
+    q, pp = kb_db.scoped('meaningful_notations_by_tokens', project)
+    rows2 = kb_db.query(conn, q, *pp, 10)
     notation_candidates: list[tuple[str, str]] = []
     for sym, meaning in rows2:
         if sym in seen_names:
@@ -196,28 +139,9 @@ def query_db(conn: sqlite3.Connection, tokens: list[str], fracs: list[str],
     _FRAC_RARITY_THRESHOLD = 5
     seen_fids: set[str] = set()  # dedup across frac iterations
     for frac in fracs[:5]:
-        if project:
-            count = conn.execute(
-                "SELECT COUNT(*) FROM findings WHERE content LIKE ? AND project=?",
-                (f'%{frac}%', project),
-            ).fetchone()[0]
-        else:
-            count = conn.execute(
-                "SELECT COUNT(*) FROM findings WHERE content LIKE ?",
-                (f'%{frac}%',),
-            ).fetchone()[0]
+        count, rows3 = kb_db.fraction_hits(conn, frac, project, 2, _FRAC_RARITY_THRESHOLD)
         if count >= _FRAC_RARITY_THRESHOLD:
             continue  # too common — arithmetic furniture, not a notable quantity
-        if project:
-            rows3 = conn.execute(
-                "SELECT id, summary FROM findings WHERE content LIKE ? AND project=? LIMIT 2",
-                (f'%{frac}%', project),
-            ).fetchall()
-        else:
-            rows3 = conn.execute(
-                "SELECT id, summary FROM findings WHERE content LIKE ? LIMIT 2",
-                (f'%{frac}%',),
-            ).fetchall()
         for fid, summary in rows3:
             if not fid or fid in seen_fids:
                 continue
@@ -244,9 +168,9 @@ def _contract_tokens(text: str) -> list[str]:
         tok = m.group(1).lower()
         if len(tok) >= 5:
             toks.add(tok)
-    # snake_case components
-    for m in re.finditer(r'\b([a-z][a-z0-9]*(?:_[a-z0-9]+)+)\b', text):
-        for part in m.group(1).split('_'):
+    # snake_case components (from the memoized dispatch-tokenizer scan)
+    for snake in text_tokens.scan(text)['snake']:
+        for part in snake.split('_'):
             if len(part) >= 5:
                 toks.add(part)
     # Light stemming: add singular form for common plurals (charpolys -> charpoly)
@@ -267,41 +191,13 @@ def query_contracts(conn: sqlite3.Connection, tokens: list[str],
     all_tokens = list(set(tokens) | set(_contract_tokens(raw_text))) if raw_text else tokens
     if not all_tokens:
         return []
-    # Check table exists
-    try:
-        conn.execute('SELECT 1 FROM lean_contracts LIMIT 1')
-    except Exception:
+    if not kb_db.has_table(conn, 'lean_contracts'):
         return []
 
     # Track how many distinct tokens match each contract; require >= 2 to surface.
     # A single common token ("mass", "spectrum") matches too many unrelated contracts.
-    contract_hits: dict[str, int] = {}       # cid -> distinct token hit count
-    contract_meta: dict[str, tuple] = {}     # cid -> (fpath, line, decl_name, file_status, discharge_target, contract_awaiting, proof_grade, data_blocked_on)
-    for tok in all_tokens:
-        if len(tok) < 5:
-            continue
-        if project:
-            rows = conn.execute(
-                "SELECT id, file, line, decl_name, file_status, discharge_target, contract_awaiting, "
-                "proof_grade, data_blocked_on "
-                "FROM lean_contracts "
-                "WHERE (decl_name LIKE ? OR statement LIKE ?) AND project=? "
-                "AND file NOT LIKE '%/archive/%' LIMIT 3",
-                (f'%{tok}%', f'%{tok}%', project),
-            ).fetchall()
-        else:
-            rows = conn.execute(
-                "SELECT id, file, line, decl_name, file_status, discharge_target, contract_awaiting, "
-                "proof_grade, data_blocked_on "
-                "FROM lean_contracts "
-                "WHERE (decl_name LIKE ? OR statement LIKE ?) "
-                "AND file NOT LIKE '%/archive/%' LIMIT 3",
-                (f'%{tok}%', f'%{tok}%'),
-            ).fetchall()
-        for cid, fpath, line, decl_name, file_status, discharge_target, contract_awaiting, proof_grade, data_blocked_on in rows:
-            contract_hits[cid] = contract_hits.get(cid, 0) + 1
-            if cid not in contract_meta:
-                contract_meta[cid] = (fpath, line, decl_name, file_status, discharge_target, contract_awaiting, proof_grade, data_blocked_on)
+    # cid -> [distinct token hit count, (fpath, line, decl_name, file_status, discharge_target, contract_awaiting, proof_grade, data_blocked_on)]
+    contract_hits = kb_db.contract_hits(conn, [t for t in all_tokens if len(t) >= 5], project)
 
     # Relevance gate: require the text explicitly mentions EITHER:
     #   (a) the file basename (e.g. 'ChargedSectorKCharpolys'), OR
@@ -328,10 +224,10 @@ def query_contracts(conn: sqlite3.Connection, tokens: list[str],
 
     # Only surface contracts with >= 2 distinct token hits (noise filter)
     contract_candidates: list[tuple[str, str]] = []
-    for cid, hits in contract_hits.items():
+    for cid, (hits, meta) in contract_hits.items():
         if hits < 2:
             continue
-        fpath, line, decl_name, file_status, discharge_target, contract_awaiting, proof_grade, data_blocked_on = contract_meta[cid]
+        fpath, line, decl_name, file_status, discharge_target, contract_awaiting, proof_grade, data_blocked_on = meta
         if not _is_relevant(fpath, decl_name, file_status, text_lower):
             continue
         basename = os.path.basename(fpath or '')
@@ -397,9 +293,7 @@ def query_structural_facts(conn: sqlite3.Connection, text: str) -> list[str]:
       - OR 'recompute' appears with a known operator name (explicit recompute intent).
     Never blocks; advisory only.
     """
-    try:
-        conn.execute('SELECT 1 FROM structural_facts LIMIT 1')
-    except Exception:
+    if not kb_db.has_table(conn, 'structural_facts'):
         return []
 
     # Check whether any relation-shaped pattern fires
@@ -412,60 +306,34 @@ def query_structural_facts(conn: sqlite3.Connection, text: str) -> list[str]:
     if re.search(r'certified_data|STRUCTURAL.FACT|ALGEBRA_RELATIONS', text, re.IGNORECASE):
         return []
 
-    # Load catalog of known operators (lhs + rhs)
-    known_ops = set()
-    rows = conn.execute(
-        'SELECT DISTINCT lhs_operator, rhs_operator FROM structural_facts'
-    ).fetchall()
-    for lhs, rhs in rows:
-        # Split on '/' or whitespace in composite names like 'shift_matrix_sq_48 / M_full_48'
-        for part in re.split(r'[/\s]+', lhs or ''):
-            if len(part) >= 3:
-                known_ops.add(part)
-        if rhs:
-            for part in re.split(r'[/\s]+', rhs):
-                if len(part) >= 3:
-                    known_ops.add(part)
-
-    # Find which known operators appear in the text
-    matched_ops: set[str] = set()
-    for op in known_ops:
-        # Require word-boundary match; avoid matching 'M_odd' inside 'M_odd_gram' via token check
-        if re.search(r'\b' + re.escape(op) + r'\b', text):
-            matched_ops.add(op)
-
+    # Which cataloged operators (lhs + rhs parts) appear in the text, word-bounded
+    # so 'M_odd' does not match inside 'M_odd_gram'. The catalog is cached (kb_db).
+    matched_ops = kb_db.match_operators(conn, text)
     if not matched_ops:
         return []
 
     # Query structural_facts for all entries whose lhs or rhs matches a found operator
     advisories: list[str] = []
     seen_ids: set[str] = set()
-    for op in matched_ops:
-        sf_rows = conn.execute(
-            "SELECT id, relation_type, lhs_operator, rhs_operator, result_exact, "
-            "       negative, certified_data_key, lean_thm, notes "
-            "FROM structural_facts "
-            "WHERE lhs_operator LIKE ? OR rhs_operator LIKE ? LIMIT 4",
-            (f'%{op}%', f'%{op}%'),
-        ).fetchall()
-        for sf_id, rtype, lhs, rhs, result, negative, cd_key, lean_thm, notes in sf_rows:
-            if sf_id in seen_ids:
-                continue
-            seen_ids.add(sf_id)
-            lhs_str = lhs or ''
-            rhs_str = rhs or ''
-            if rhs_str:
-                pair = f'{{{lhs_str},{rhs_str}}}' if rtype == 'anticommutator' else f'[{lhs_str},{rhs_str}]' if rtype == 'commutator' else f'{lhs_str}/{rhs_str}'
-            else:
-                pair = lhs_str
-            neg_tag = ' (NEGATIVE RESULT)' if negative else ''
-            src = cd_key or lean_thm or 'certified_data'
-            result_short = result[:120] if result else '?'
-            line = (f'[STRUCTURAL-FACT{neg_tag}: {rtype}({pair}) = {result_short} '
-                    f'({src}) — DO NOT RECOMPUTE; cite certified_data]')
-            if notes and len(notes) < 80:
-                line += f' note: {notes}'
-            advisories.append(line)
+    for sf_id, rtype, lhs, rhs, result, negative, cd_key, lean_thm, notes in \
+            kb_db.structural_facts_for(conn, matched_ops, 4):
+        if sf_id in seen_ids:
+            continue
+        seen_ids.add(sf_id)
+        lhs_str = lhs or ''
+        rhs_str = rhs or ''
+        if rhs_str:
+            pair = f'{{{lhs_str},{rhs_str}}}' if rtype == 'anticommutator' else f'[{lhs_str},{rhs_str}]' if rtype == 'commutator' else f'{lhs_str}/{rhs_str}'
+        else:
+            pair = lhs_str
+        neg_tag = ' (NEGATIVE RESULT)' if negative else ''
+        src = cd_key or lean_thm or 'certified_data'
+        result_short = result[:120] if result else '?'
+        line = (f'[STRUCTURAL-FACT{neg_tag}: {rtype}({pair}) = {result_short} '
+                f'({src}) — DO NOT RECOMPUTE; cite certified_data]')
+        if notes and len(notes) < 80:
+            line += f' note: {notes}'
+        advisories.append(line)
 
     return advisories[:6]
 
@@ -528,19 +396,17 @@ def main() -> None:
             "hookEventName": "PreToolUse", "additionalContext": STOP_LINE}}))
         sys.exit(0)
 
-    db = os.path.expanduser('~/.cache/kb/knowledge.db')
-    if not os.path.exists(db):
+    conn = kb_db.connect()
+    if conn is None:
         sys.exit(0)
 
     try:
-        conn = sqlite3.connect(db, timeout=3)
         tokens = extract_candidate_tokens(prompt_text)
         fracs = extract_fractions(prompt_text)
         project = _project_from_cwd()
         advisories = query_db(conn, tokens, fracs, project=project)
         advisories += query_contracts(conn, tokens, project=project, raw_text=prompt_text)
         advisories += query_structural_facts(conn, prompt_text)
-        conn.close()
         advisories += query_route_to_tip(tool_name, ti, prompt_text)
         if advisories:
             print(json.dumps({
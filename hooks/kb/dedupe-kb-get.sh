@@ -21,9 +21,8 @@ print(m.group(1) if m else '')
 [[ -z "$KB_ID" ]] && exit 0
 
 source "$HOME/.claude/hooks/lib/state.sh"
-SESSION_FILE="$STATE_DIR/session-$PPID"
-[[ ! -f "$SESSION_FILE" ]] && exit 0
-SESSION_ID=$(cat "$SESSION_FILE")
+SESSION_ID=$(session_id)
+[[ -z "$SESSION_ID" ]] && exit 0
 
 KB_SEEN_FILE="$STATE_DIR/${SESSION_ID}-kb-seen"
 touch "$KB_SEEN_FILE"
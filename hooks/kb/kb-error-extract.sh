@@ -7,30 +7,25 @@
 KB_CLI="${HOME}/.local/bin/kb"
 [[ ! -x "$KB_CLI" ]] && exit 0
 
+source "$HOME/.claude/hooks/lib/payload.sh"
+
 INPUT=$(cat)
-TOOL_NAME=$(echo "$INPUT" | python3 -c "import sys,json; d=json.load(sys.stdin); print(d.get('tool_name',''))" 2>/dev/null) || exit 0
-EXIT_CODE=$(echo "$INPUT" | python3 -c "import sys,json; d=json.load(sys.stdin); r=d.get('tool_result',{}); print(r.get('exitCode', r.get('exit_code', 0)))" 2>/dev/null) || exit 0
+payload_fields "$INPUT" TOOL_NAME=.tool_name COMMAND=.tool_input.command \
+    EXIT_CODE='.tool_result.exitCode // .tool_result.exit_code // 0' \
+    STDOUT=.tool_result.stdout STDERR=.tool_result.stderr
 
 [[ "$TOOL_NAME" != "Bash" ]] && exit 0
-[[ "$EXIT_CODE" == "0" ]] && exit 0
+[[ -z "$EXIT_CODE" || "$EXIT_CODE" == "0" ]] && exit 0
 
 # Only fire on build/test commands
-COMMAND=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_input',{}).get('command',''))" 2>/dev/null) || exit 0
-
 IS_BUILD_TEST=0
 echo "$COMMAND" | grep -qE '(make|ninja|cmake|cargo build|cargo test|lake build|pytest|python.*test_|python.*-m pytest|python.*-m unittest|g\+\+|gcc|clang|rustc|latexmk|pdflatex)' && IS_BUILD_TEST=1
 [[ "$IS_BUILD_TEST" == "0" ]] && exit 0
 
 # Extract error output (last 3000 chars of combined stdout+stderr)
-OUTPUT=$(echo "$INPUT" | python3 -c "
-import sys, json
-d = json.load(sys.stdin)
-r = d.get('tool_result', {})
-stdout = r.get('stdout', '') or ''
-stderr = r.get('stderr', '') or ''
-combined = stdout[-1500:] + stderr[-1500:]
-print(combined)
-" 2>/dev/null) || exit 0
+_o=$(( ${#STDOUT} > 1500 ? ${#STDOUT} - 1500 : 0 ))
+_e=$(( ${#STDERR} > 1500 ? ${#STDERR} - 1500 : 0 ))
+OUTPUT="${STDOUT:$_o}"$'\n'"${STDERR:$_e}"
 
 [[ ${#OUTPUT} -lt 50 ]] && exit 0
 
@@ -6,13 +6,18 @@ The old surfacing was recency (kb-context.sh: `kb list --limit 3`) or token-over
 This hook vector-queries the actual prompt text against the kb (semantic, via
 ash:8081) and injects the top relevant findings as additionalContext.
 
-Cheap win: reuses the existing `kb search --json` engine. No new infra.
+Cheap win: reuses the existing `kb search --json` engine, served warm by the
+resident kb query service (lib/kbqd.py: kb already imported, its connections
+kept open) -- one local RPC per prompt. When the service is not up, this prompt
+runs the CLI as before and the service is started for the next one. Service and
+CLI share one BUDGET_S: a service that timed out is not retried via the CLI, and
+the CLI only gets what the service attempt left.
 - similarity floor filters cross-domain noise (kb-mrl's hybrid-workspace concern)
 - dedup: kb search auto-excludes session-seen ids; we also _seen-gate by kbq:<id>
   so a finding isn't re-surfaced on every prompt.
 - graceful: any failure / embed-down / timeout -> exit 0 (no output, no block).
 """
-import sys, os, json, subprocess
+import sys, os, json, subprocess, time
 
 sys.path.insert(0, os.path.expanduser('~/.claude/hooks/lib'))
 try:
@@ -20,6 +25,10 @@ try:
 except Exception:
     def filter_unseen(keys):
         return keys
+try:
+    import kbqd  # noqa: E402
+except Exception:
+    kbqd = None
 
 KB_SCRIPT = os.environ.get('KB_SCRIPT', os.path.expanduser('~/Projects/ai/kb/kb.py'))
 KB_VENV = os.environ.get('KB_VENV', os.path.expanduser('~/Projects/ai/kb/.venv/bin/python'))
@@ -27,9 +36,12 @@ SIM_FLOOR = 0.42      # cosine similarity floor; below this is cross-domain nois
                       # (tuned: 0.55 on-topic hit passed, ~0.40 weak matches dropped)
 MAX_SURFACE = 3
 MIN_PROMPT_LEN = 25
+BUDGET_S = 8          # service + CLI fallback together, under the 10 s hook timeout
+MIN_CLI_S = 1         # not worth starting the CLI with less left than this
 
 
 def main():
+    t0 = time.monotonic()
     try:
         data = json.load(sys.stdin)
     except Exception:
@@ -46,17 +58,24 @@ def main():
     env = dict(os.environ)
     env.setdefault('KB_EMBEDDING_URL', 'http://ash:8081/embedding')
     env.setdefault('KB_EMBEDDING_DIM', '4096')
-    try:
-        r = subprocess.run(
-            [KB_VENV, KB_SCRIPT, 'search', query, '-n', '8', '--json'],
-            capture_output=True, text=True, timeout=8, env=env,
-        )
-    except Exception:
-        return  # timeout / embed down -> silent
-    if r.returncode != 0 or not r.stdout.strip():
+    argv = ['search', query, '-n', '8', '--json']
+    res = kbqd.query(argv, env, BUDGET_S - (time.monotonic() - t0), KB_VENV, KB_SCRIPT) \
+        if kbqd else None
+    if res is None:
+        left = BUDGET_S - (time.monotonic() - t0)
+        if left < MIN_CLI_S:
+            return
+        try:
+            r = subprocess.run([KB_VENV, KB_SCRIPT, *argv],
+                               capture_output=True, text=True, timeout=left, env=env)
+        except Exception:
+            return  # timeout / embed down -> silent
+        res = r.returncode, r.stdout, r.stderr
+    rc, out, _ = res  # rc None: the service timed out, the budget is spent
+    if rc != 0 or not out.strip():
         return
     try:
-        results = json.loads(r.stdout)
+        results = json.loads(out)
     except Exception:
         return
     if not isinstance(results, list):
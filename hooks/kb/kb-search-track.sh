@@ -1,7 +1,7 @@
 #!/bin/bash
 # PostToolUse hook tracking kb search activity and seen KB IDs.
 #
-# Two jobs:
+# Three jobs:
 #  1. Set the -searched flag (gate for kb-search-gate.sh before Edit/Write)
 #  2. Append any kb-IDs in the command output to ${SESSION_ID}-kb-seen so
 #     that subsequent kb search calls automatically exclude them (via
@@ -9,26 +9,30 @@
 #       - kb add output: "Added: kb-XXXXXX"  (prevents self-echo on next search)
 #       - kb search/list output: result IDs  (prevents re-showing seen results)
 #       - kb get output: the fetched ID      (dedupe-kb-get.sh also writes this)
+#  3. After kb add/correct (CLI, PostToolUse only -- this script also runs
+#     before Bash) or kb_add/kb_correct (MCP), refresh the derived
+#     fraction-rarity index (lib/kb_index.py) in the background.
 
 source "$HOME/.claude/hooks/lib/state.sh"
+source "$HOME/.claude/hooks/lib/payload.sh"
 
 INPUT=$(cat)
-TOOL_NAME=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_name',''))" 2>/dev/null)
+payload_fields "$INPUT" EVENT=.hook_event_name TOOL_NAME=.tool_name CMD=.tool_input.command \
+    SUBAGENT_TYPE=.tool_input.subagent_type \
+    RESULT_TEXT='(.tool_result.stdout // "") + (.tool_result.stderr // "")'
 
-# Read session ID from PPID mapping (set by history-isolation.sh)
-SESSION_FILE="$STATE_DIR/session-$PPID"
-if [[ ! -f "$SESSION_FILE" ]]; then
-    echo "WARNING: Session file $SESSION_FILE not found (PPID=$PPID)"
+# Session ID: env (set for hookd-served groups), else the shared resolver
+# (state.sh session_id: session-$PPID / pid index / one /proc walk)
+SESSION_ID=$(session_id)
+if [[ -z "$SESSION_ID" ]]; then
+    echo "WARNING: Session not resolvable (PPID=$PPID)"
     exit 0
 fi
-SESSION_ID=$(cat "$SESSION_FILE")
 
 # CLI kb command via Bash
 if [[ "$TOOL_NAME" == "Bash" ]]; then
-    CMD=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_input',{}).get('command',''))" 2>/dev/null)
-
     # Only act on kb commands
-    if ! echo "$CMD" | grep -qE '(^|[[:space:];&|`(])(~/\.local/bin/)?kb[[:space:]]+(search|list|get|add|related)\b'; then
+    if ! echo "$CMD" | grep -qE '(^|[[:space:];&|`(])(~/\.local/bin/)?kb[[:space:]]+(search|list|get|add|correct|related)\b'; then
         exit 0
     fi
 
@@ -37,37 +41,28 @@ if [[ "$TOOL_NAME" == "Bash" ]]; then
         touch "$STATE_DIR/${SESSION_ID}-searched"
     fi
 
+    # A KB write queues changed findings for the fraction-rarity index; drain it
+    # now (detached) rather than waiting for the next session start. Before the
+    # command runs there is nothing queued yet.
+    if [[ "$EVENT" == "PostToolUse" ]] \
+            && echo "$CMD" | grep -qE '(^|[[:space:];&|`(])(~/\.local/bin/)?kb[[:space:]]+(add|correct)\b'; then
+        setsid python3 "$HOME/.claude/hooks/lib/kb_index.py" </dev/null >/dev/null 2>&1 &
+    fi
+
     # Extract kb IDs from stdout and append to seen file
     KB_SEEN_FILE="$STATE_DIR/${SESSION_ID}-kb-seen"
-    echo "$INPUT" | python3 -c "
-import sys, json, re
-try:
-    data = json.load(sys.stdin)
-    r = data.get('tool_result', {})
-    stdout = r.get('stdout', '') or ''
-    stderr = r.get('stderr', '') or ''
-    text = stdout + stderr
-    ids = re.findall(r'\bkb-\d{8}-\d{6}-[0-9a-f]{6}\b', text)
-    for i in set(ids):
-        print(i)
-except Exception:
-    pass
-" >> "$KB_SEEN_FILE" 2>/dev/null
+    printf '%s' "$RESULT_TEXT" | grep -oE '\bkb-[0-9]{8}-[0-9]{6}-[0-9a-f]{6}\b' \
+        | sort -u >> "$KB_SEEN_FILE" 2>/dev/null
 
 fi
 
+# MCP KB writes: same drain as the CLI add/correct above
+if [[ "$TOOL_NAME" == "mcp__knowledge-base__kb_add" || "$TOOL_NAME" == "mcp__knowledge-base__kb_correct" ]]; then
+    setsid python3 "$HOME/.claude/hooks/lib/kb_index.py" </dev/null >/dev/null 2>&1 &
+fi
+
 # Task delegation to kb-research agent (agent will call kb_search in its session)
 if [[ "$TOOL_NAME" == "Task" ]]; then
-    SUBAGENT_TYPE=$(echo "$INPUT" | python3 -c "
-import sys, json
-try:
-    data = json.load(sys.stdin)
-    tool_input = data.get('tool_input', {})
-    print(tool_input.get('subagent_type', ''))
-except:
-    pass
-" 2>/dev/null)
-
     if [[ "$SUBAGENT_TYPE" == "kb-research" ]]; then
         touch "$STATE_DIR/${SESSION_ID}-searched"
     fi
@@ -6,40 +6,27 @@ tokens that match open bd issue titles/descriptions. Surface matching issues
 as [OPEN-BD: ...] advisories so plans don't drop through compaction cracks.
 
 Fires PreToolUse/Task and PreToolUse/Bash (bridge send only).
-Advisory only (exit 0 always).
+Advisory only (exit 0 always). Issues come from a per-repo snapshot refreshed
+in the background (lib/bd_issues.py), so the hook never waits on bd/Dolt.
 
 Token matching strategy: extract significant tokens (>=5 chars) from the
 dispatch text; for each open issue, count how many tokens appear in the
-issue title+description. Issues with >= MIN_HITS matches surface.
+issue title+description. Issues with >= MIN_HITS matches surface. Counted
+over the snapshot's inverted index (bd_issues.hits), not per issue.
 """
 import sys
 import json
 import os
 import re
-import subprocess
 
 import sys as _sys, os as _os
 _sys.path.insert(0, _os.path.expanduser('~/.claude/hooks/lib'))
 from _seen import filter_unseen  # noqa: E402
+import bd_issues  # noqa: E402
 
 _MIN_TOKEN_LEN = 5
 _MIN_HITS = 3        # tokens from prompt that must appear in issue text (raised from 2 per archie #4474)
 _MAX_SURFACE = 3     # max issues to surface per hook call (reduced from 5)
-def _find_bd() -> str:
-    """Find bd executable — may be in nvm or ~/.local/bin."""
-    import shutil
-    path = shutil.which('bd')
-    if path:
-        return path
-    for candidate in [
-        os.path.expanduser('~/.local/bin/bd'),
-        os.path.expanduser('~/.nvm/versions/node/v24.0.2/bin/bd'),
-    ]:
-        if os.path.isfile(candidate):
-            return candidate
-    return 'bd'
-
-_BD = _find_bd()
 
 
 def _extract_tokens(text: str) -> set[str]:
@@ -50,52 +37,14 @@ def _extract_tokens(text: str) -> set[str]:
     return tokens
 
 
-def _current_repo_root() -> str | None:
-    """Return the git repo root of the current working directory."""
-    try:
-        result = subprocess.run(
-            ['git', 'rev-parse', '--show-toplevel'],
-            capture_output=True, text=True, timeout=3,
-            cwd=os.environ.get('CLAUDE_PROJECT_DIR', os.getcwd()),
-        )
-        if result.returncode == 0:
-            return result.stdout.strip()
-    except Exception:
-        pass
-    return None
-
-
-def _load_open_issues() -> list[dict]:
+def _load_open_issues() -> tuple[list[dict], dict]:
     """Load open bd issues from the CURRENT repo only. Cross-repo surfacing
-    caused false-positive advisories (secular-constraints issues in kb sessions)."""
-    issues: list[dict] = []
-    root = _current_repo_root()
-    if not root:
-        return issues
+    caused false-positive advisories (secular-constraints issues in kb sessions).
+    Served from the per-repo snapshot (lib/bd_issues.py) -- never a bd call."""
+    root = bd_issues.repo_root(os.environ.get('CLAUDE_PROJECT_DIR') or os.getcwd())
     if not os.path.isdir(os.path.join(root, '.beads')):
-        return issues
-    try:
-        result = subprocess.run(
-            f'{_BD} list --status=open --json',
-            shell=True, capture_output=True, text=True, timeout=5,
-            cwd=root,
-        )
-        if result.returncode == 0 and result.stdout.strip():
-            batch = json.loads(result.stdout)
-            for item in batch:
-                item['_root'] = root
-            issues.extend(batch)
-    except Exception:
-        pass
-    return issues
-
-
-def _score_issue(issue: dict, prompt_tokens: set[str]) -> int:
-    """Count how many prompt tokens appear in the issue title+description."""
-    haystack = (
-        (issue.get('title') or '') + ' ' + (issue.get('description') or '')
-    ).lower()
-    return sum(1 for tok in prompt_tokens if tok in haystack)
+        return [], {}
+    return bd_issues.load(root)
 
 
 def main() -> None:
@@ -130,7 +79,7 @@ def main() -> None:
         sys.exit(0)
 
     try:
-        issues = _load_open_issues()
+        issues, index = _load_open_issues()
     except Exception:
         sys.exit(0)
 
@@ -138,11 +87,8 @@ def main() -> None:
         sys.exit(0)
 
     # Score and rank
-    scored: list[tuple[int, dict]] = []
-    for issue in issues:
-        score = _score_issue(issue, prompt_tokens)
-        if score >= _MIN_HITS:
-            scored.append((score, issue))
+    scored = [(score, issues[i]) for i, score in sorted(bd_issues.hits(index, prompt_tokens).items())
+              if score >= _MIN_HITS]
 
     if not scored:
         sys.exit(0)
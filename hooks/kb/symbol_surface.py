@@ -14,7 +14,6 @@ import sys
 import json
 import os
 import ast
-import re
 import sqlite3
 import warnings
 
@@ -22,6 +21,9 @@ import sys as _sys, os as _os
 _sys.path.insert(0, _os.path.expanduser('~/.claude/hooks/lib'))
 from _seen import filter_unseen  # noqa: E402
 from _state import kb_project_for_path  # noqa: E402
+import extract_cache  # noqa: E402
+import kb_db  # noqa: E402
+import text_tokens  # noqa: E402
 
 _SCAN_EXTENSIONS = {
     '.lean', '.py', '.tex', '.md', '.txt', '.output', '.json',
@@ -30,6 +32,8 @@ _SCAN_EXTENSIONS = {
 
 _MIN_SYMBOL_LEN = 3
 _MAX_ADVISORIES = 12
+# Bump when extraction changes so cached token sets are not reused (lib/extract_cache.py).
+_EXTRACT_VERSION = 2
 
 
 # ---------------------------------------------------------------------------
@@ -72,38 +76,18 @@ def extract_from_python(source: str) -> list[str]:
 # ---------------------------------------------------------------------------
 
 def extract_from_text(text: str) -> list[str]:
-    """Extract symbol candidates from arbitrary text via regex.
+    """Extract symbol candidates from arbitrary text (lib/text_tokens.py: one
+    scan for snake_case, CamelCase, underscored mixed-case and Greek letters).
 
     Used for .lean, .tex, .md, bridge output, and Python files that fail to parse.
     Accepts some noise (tokens from comments/strings); that's acceptable for prose.
     """
-    candidates: set[str] = set()
-
-    # snake_case
-    for m in re.finditer(r'\b([a-z][a-z0-9]*(?:_[a-z0-9]+)+)\b', text):
-        tok = m.group(1)
-        if len(tok) >= _MIN_SYMBOL_LEN:
-            candidates.add(tok)
-
-    # CamelCase / PascalCase
-    for m in re.finditer(r'\b([A-Z][a-z]+(?:[A-Z][a-z0-9]+)+)\b', text):
-        candidates.add(m.group(1))
-
-    # Mixed-case with underscores: Z_species, W_of_J, Q_EM_w, T_3_L
-    for m in re.finditer(r'\b([A-Za-z][A-Za-z0-9]*(?:_[A-Za-z0-9]+)+)\b', text):
-        tok = m.group(1)
-        if len(tok) >= _MIN_SYMBOL_LEN:
-            candidates.add(tok)
-
-    # Greek letters
-    for ch in re.findall(r'[α-ωΑ-Ω]', text):
-        candidates.add(ch)
-
-    return list(candidates)
+    return text_tokens.symbols(text, _MIN_SYMBOL_LEN)
 
 
 def extract_fractions(text: str) -> list[str]:
-    return re.findall(r'\b(\d{1,4}/\d{1,4})\b', text)
+    """Distinct N/D fractions in first-occurrence order (same scan as above)."""
+    return list(text_tokens.scan(text)['frac'])
 
 
 # ---------------------------------------------------------------------------
@@ -135,21 +119,12 @@ def query_symbols(
     advisories = []
     seen: set[str] = set()
 
-    ph = ','.join('?' * len(tokens))
+    # Only tokens that may be a symbol/notation name reach SQLite (Bloom prefilter).
+    kb_db.load_tokens(conn, kb_db.maybe_symbols(conn, tokens))
 
     # python_symbols exact name match — project-scoped to prevent cross-project FPs
-    if project:
-        rows = conn.execute(
-            f'SELECT name, kind, status, module, file, line, redirect_to '
-            f'FROM python_symbols WHERE name IN ({ph}) AND project=? LIMIT 40',
-            tokens + [project],
-        ).fetchall()
-    else:
-        rows = conn.execute(
-            f'SELECT name, kind, status, module, file, line, redirect_to '
-            f'FROM python_symbols WHERE name IN ({ph}) LIMIT 40',
-            tokens,
-        ).fetchall()
+    q, pp = kb_db.scoped('symbols_by_tokens', project)
+    rows = kb_db.query(conn, q, *pp, 40)
     # On Read: only surface RETIRED (correctness hazard). CANONICAL is suppressed —
     # reading a file is research; the duplication risk is at Edit/Write time,
     # which compose_time_check covers at dispatch.
@@ -163,19 +138,8 @@ def query_symbols(
             advisories.append(f'[RETIRED: {name}{redir}]')
 
     # notations — skip generic-fallback rows; project-scoped
-    _not_base = (
-        f"SELECT current_symbol, meaning FROM notations "
-        f"WHERE current_symbol IN ({ph}) "
-        f"AND meaning IS NOT NULL "
-        f"AND (meaning_source IS NULL OR meaning_source != 'generic-fallback')"
-    )
-    if project:
-        rows2 = conn.execute(
-            _not_base + " AND (project IS NULL OR project=?) LIMIT 10",
-            tokens + [project],
-        ).fetchall()
-    else:
-        rows2 = conn.execute(_not_base + " LIMIT 10", tokens).fetchall()
+    q, pp = kb_db.scoped('notations_by_tokens', project)
+    rows2 = kb_db.query(conn, q, *pp, 10)
     notation_candidates: list[tuple[str, str]] = []
     for sym, meaning in rows2:
         key = f'notation:{sym}'
@@ -197,28 +161,9 @@ def query_symbols(
     _FRAC_RARITY = 5
     seen_fids: set[str] = set()
     for frac in fracs[:3]:
-        if project:
-            count = conn.execute(
-                "SELECT COUNT(*) FROM findings WHERE content LIKE ? AND project=?",
-                (f'%{frac}%', project),
-            ).fetchone()[0]
-        else:
-            count = conn.execute(
-                "SELECT COUNT(*) FROM findings WHERE content LIKE ?",
-                (f'%{frac}%',),
-            ).fetchone()[0]
+        count, rows3 = kb_db.fraction_hits(conn, frac, project, 2, _FRAC_RARITY)
         if count >= _FRAC_RARITY:
             continue
-        if project:
-            rows3 = conn.execute(
-                "SELECT id, summary FROM findings WHERE content LIKE ? AND project=? LIMIT 2",
-                (f'%{frac}%', project),
-            ).fetchall()
-        else:
-            rows3 = conn.execute(
-                "SELECT id, summary FROM findings WHERE content LIKE ? LIMIT 2",
-                (f'%{frac}%',),
-            ).fetchall()
         for fid, summary in rows3:
             if not fid or fid in seen_fids:
                 continue
@@ -258,29 +203,27 @@ def main() -> None:
 
     if not fpath or not os.path.isfile(fpath):
         sys.exit(0)
-    try:
-        with open(fpath, encoding='utf-8', errors='replace') as fh:
-            content = fh.read()
-    except OSError:
-        sys.exit(0)
 
-    if not content or len(content) < 50:
+    def _extract(content: str):
+        if not content or len(content) < 50:
+            return None
+        if ext == '.py':
+            return extract_from_python(content), []  # fractions in Python source aren't math notation
+        return extract_from_text(content), extract_fractions(content)
+
+    # Unchanged files (by stat, else content hash) skip parsing entirely.
+    kind = 'py' if ext == '.py' else 'text'
+    extracted = extract_cache.cached(fpath, f'symbol_surface.{kind}/{_EXTRACT_VERSION}', _extract)
+    if not extracted:
         sys.exit(0)
+    tokens, fracs = extracted
 
-    db = os.path.expanduser('~/.cache/kb/knowledge.db')
-    if not os.path.exists(db):
+    conn = kb_db.connect()
+    if conn is None:
         sys.exit(0)
 
     try:
-        conn = sqlite3.connect(db, timeout=3)
-        if ext == '.py':
-            tokens = extract_from_python(content)
-            fracs = []  # fractions in Python source aren't math notation
-        else:
-            tokens = extract_from_text(content)
-            fracs = extract_fractions(content)
         advisories = query_symbols(conn, tokens, fracs, project=project)
-        conn.close()
         if advisories:
             print(json.dumps({
                 "hookSpecificOutput": {
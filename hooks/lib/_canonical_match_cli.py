@@ -6,63 +6,44 @@ Same two-tier matching as check_symbols.py but accepts raw text (not tool-event
 JSON). CANONICAL hits participate in the cross-hook session-scoped seen-set.
 RETIRED hits are always printed regardless of prior surface.
 
-Tokenization: uses extract_from_text() from symbol_surface — consistent
-_MIN_SYMBOL_LEN=3 filter, handles snake_case + CamelCase + mixed + Greek.
+Batch mode: `_canonical_match_cli.py REPORT...` matches each report file in one
+process (one connection, one symbol-map load) and prints `== REPORT` before
+that report's hits. The symbol table comes from kb_db.symbol_map(), a snapshot
+rebuilt only when python_symbols changes, not a full SELECT per run.
+
+Tokenization: text_tokens.symbols(), the same single scan symbol_surface's
+extract_from_text() uses — _MIN_SYMBOL_LEN=3 filter, snake_case + CamelCase +
+mixed + Greek.
 """
 import sys
 import os
 import re
-import sqlite3
-
-# Inline the minimal tokenizer from symbol_surface to avoid circular import
-_MIN_SYMBOL_LEN = 3
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import kb_db  # noqa: E402
+import text_tokens  # noqa: E402
 
-def _extract_tokens(text: str) -> list[str]:
-    candidates: set[str] = set()
-    for m in re.finditer(r'\b([a-z][a-z0-9]*(?:_[a-z0-9]+)+)\b', text):
-        tok = m.group(1)
-        if len(tok) >= _MIN_SYMBOL_LEN:
-            candidates.add(tok)
-    for m in re.finditer(r'\b([A-Z][a-z]+(?:[A-Z][a-z0-9]+)+)\b', text):
-        candidates.add(m.group(1))
-    for m in re.finditer(r'\b([A-Za-z][A-Za-z0-9]*(?:_[A-Za-z0-9]+)+)\b', text):
-        tok = m.group(1)
-        if len(tok) >= _MIN_SYMBOL_LEN:
-            candidates.add(tok)
-    for ch in re.findall(r'[α-ωΑ-Ω]', text):
-        candidates.add(ch)
-    return list(candidates)
-
+_MIN_SYMBOL_LEN = 3
 
-def main() -> None:
-    text = sys.stdin.read()
-    if not text.strip():
-        return
 
-    db = os.path.expanduser('~/.cache/kb/knowledge.db')
-    if not os.path.exists(db):
-        return
+def match(conn, text: str) -> list[str]:
+    """Advisory lines for one report: CANONICAL hits not yet surfaced this
+    session, then every RETIRED hit."""
+    tokens = text_tokens.symbols(text, _MIN_SYMBOL_LEN)
+    # Skip the symbol map entirely when no token (or tier-2 leading component)
+    # can possibly be a known symbol.
+    leads = [re.split(r'_|(?<=[a-z])(?=[A-Z])', tok)[0] for tok in tokens]
+    if not kb_db.maybe_symbols(conn, tokens + [lead for lead in leads if len(lead) >= 6]):
+        return []
 
     try:
-        conn = sqlite3.connect(db, timeout=5)
-        rows = conn.execute(
-            "SELECT name, module, status, redirect_to FROM python_symbols "
-            "WHERE status IN ('canonical','retired')"
-        ).fetchall()
-        conn.close()
+        symbols = kb_db.symbol_map(conn)
     except Exception:
-        return
-
-    symbols = {name: (module, status, redir) for name, module, status, redir in rows}
+        return []
     if not symbols:
-        return
-
-    tokens = _extract_tokens(text)
+        return []
 
     # Collect hits — CANONICAL deduped cross-hook, RETIRED always shown
-    import sys as _sys
-    _sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
     from _seen import filter_unseen
 
     canonical_hits: list[tuple[str, str]] = []
@@ -98,15 +79,40 @@ def main() -> None:
                         f"[CANONICAL component: {module}.{lead} — '{tok}' contains this name]",
                     ))
 
+    out = []
     # Dedup CANONICAL against session-scoped seen-set
     if canonical_hits:
         new_keys = set(filter_unseen([k for k, _ in canonical_hits]))
-        for k, line in canonical_hits:
-            if k in new_keys:
-                print(line)
+        out += [line for k, line in canonical_hits if k in new_keys]
+    return out + sorted(set(retired_lines))
+
+
+def main() -> None:
+    paths = sys.argv[1:]
+    if not paths:
+        text = sys.stdin.read()
+        if not text.strip():
+            return
+        reports = [(None, text)]
+    else:
+        reports = []
+        for path in paths:
+            try:
+                with open(path, encoding='utf-8', errors='replace') as fh:
+                    reports.append((path, fh.read()))
+            except OSError:
+                continue
+
+    conn = kb_db.connect(timeout=5)
+    if conn is None:
+        return
 
-    for line in sorted(set(retired_lines)):
-        print(line)
+    for path, text in reports:
+        lines = match(conn, text)
+        if lines and path is not None:
+            print(f'== {path}')
+        for line in lines:
+            print(line)
 
 
 if __name__ == '__main__':
@@ -1,8 +1,10 @@
 """Session-scoped advisory dedup for kb hooks.
 
-Uses $STATE_DIR/<session_id>-hook-seen (one key per line, fcntl-locked).
-filter_unseen() atomically reads existing keys, filters candidates, appends
-new ones, and returns the new-only subset.
+Uses $STATE_DIR/<session_id>-hook-seen.db: a SQLite table (WAL) keyed on the
+advisory key, so a membership test is one index probe however long the session
+runs. filter_unseen() inserts the candidates that are absent inside one
+BEGIN IMMEDIATE transaction (atomic across processes and daemon threads) and
+returns exactly those.
 
 Key conventions (callers must use these prefixes):
   sym:{name}        — python_symbols CANONICAL advisory (NOT retired — always surface)
@@ -11,39 +13,92 @@ Key conventions (callers must use these prefixes):
 Keys NOT deduplicated (context-specific, worth re-surfacing):
   frac/kb-value hits, LEAN theorems, ALREADY-PROVEN, LAKE-ERROR
 
+CLAUDE_SEEN_TTL=<seconds> lets a key surface again once it was last surfaced
+longer ago than that (default 0: seen for the rest of the session); expired
+rows are evicted as new keys are recorded.
+
+A legacy line file ($STATE_DIR/<session_id>-hook-seen) left by a session that
+was running across the upgrade is imported once when the store is created.
+
 Falls back to returning all keys when session state is unavailable.
 """
-import fcntl
 import os
+import sqlite3
 import sys
+import threading
+import time
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from _state import STATE_DIR, state_path  # noqa: E402
 
+_local = threading.local()  # .conn = (path, connection), one per thread
+
+
+def _ttl() -> float:
+    try:
+        return max(0.0, float(os.environ.get('CLAUDE_SEEN_TTL') or 0))
+    except ValueError:
+        return 0.0
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    cached = getattr(_local, 'conn', None)
+    if cached and cached[0] == path and os.path.exists(path):
+        return cached[1]
+    fresh = not os.path.exists(path)
+    conn = sqlite3.connect(path, timeout=2, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, ts REAL NOT NULL) WITHOUT ROWID')
+    conn.execute('CREATE INDEX IF NOT EXISTS seen_ts ON seen(ts)')
+    legacy = path[:-len('.db')]
+    if fresh and os.path.isfile(legacy):
+        try:
+            with open(legacy) as fh:
+                now = time.time()
+                conn.executemany('INSERT OR IGNORE INTO seen VALUES (?, ?)',
+                                 ((k, now) for k in fh.read().splitlines() if k))
+            os.unlink(legacy)
+        except OSError:
+            pass
+    _local.conn = (path, conn)
+    return conn
+
 
 def filter_unseen(keys: list[str]) -> list[str]:
     """Return only keys not yet surfaced this session; atomically marks them seen.
 
-    Thread/process safe via fcntl.LOCK_EX on the seen file.
+    Thread/process safe via one BEGIN IMMEDIATE transaction on the seen store.
     Empty or unavailable state → returns all keys (safe degradation).
     """
     if not keys:
         return []
 
-    path = state_path('hook-seen')
+    path = state_path('hook-seen.db')
     if path is None:
         return keys  # no session state — pass everything through
 
     try:
         os.makedirs(STATE_DIR, exist_ok=True)
-        with open(path, 'a+') as fh:
-            fcntl.flock(fh, fcntl.LOCK_EX)
-            fh.seek(0)
-            already = set(fh.read().splitlines())
-            new_keys = [k for k in keys if k not in already]
-            if new_keys:
-                fh.seek(0, 2)  # seek to end
-                fh.write('\n'.join(new_keys) + '\n')
-            return new_keys
+        conn = _connect(path)
+        now = time.time()
+        ttl = _ttl()
+        # With a TTL, an expired row is refreshed and counts as new (rowcount 1).
+        sql = ('INSERT INTO seen VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET ts = excluded.ts '
+               'WHERE seen.ts < ?') if ttl else 'INSERT OR IGNORE INTO seen VALUES (?, ?)'
+        cutoff = (now - ttl,) if ttl else ()
+        new_keys = []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for k in keys:
+                if conn.execute(sql, (k, now, *cutoff)).rowcount > 0:
+                    new_keys.append(k)
+            if ttl and new_keys:
+                conn.execute('DELETE FROM seen WHERE ts < ?', cutoff)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return new_keys
     except Exception:
         return keys  # on any error, pass everything through
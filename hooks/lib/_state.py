@@ -3,11 +3,26 @@
 Locates the claude-kb-state session file using:
   1. $CLAUDE_SESSION_ID env var — fastest; set by session-init.sh, available
      in PreToolUse/PostToolUse hook environment.
-  2. PPID walk up /proc/{pid}/status PPid: chain — fallback for SubagentStop
-     and any other context where the env var is not inherited.
+  2. $STATE_DIR/session-<ppid> — the parent is the session owner.
+  3. The pid index: $STATE_DIR/pidsid-<ppid> ("<owner_pid> <starttime>"), written
+     by an earlier walk from the same parent and validated against the parent's
+     /proc start time (a recycled pid never inherits a session). It names the
+     owner, not the session id, so a session-<owner> rewritten by /clear or
+     resume is still read fresh.
+  4. PPID walk up /proc/{pid}/status PPid: chain — fallback for SubagentStop
+     and any other context where the env var is not inherited. A hit is recorded
+     in the pid index, so each parent walks at most once.
+
+The shell side (state.sh session_id) reads the same index, so a resolution made
+by any hook serves every later hook under that parent. pidsid-* files are swept
+by session-init.sh like the other per-session state.
+
+CLI:  _state.py session-id [PID]   (resolve starting at PID, default: parent)
 """
 import json
 import os
+import sys
+import time
 
 # Persistent (reboot-surviving) session-state root (kb-h3b). Was
 # /tmp/claude-kb-state (tmpfs, wiped on reboot — lost sub-TTL state like the
@@ -15,60 +30,156 @@ import os
 # must agree with the shell side (hooks/lib/state.sh).
 STATE_DIR = os.environ.get('CLAUDE_STATE_DIR') or os.path.expanduser('~/.claude/state')
 _MAX_WALK = 8
+_resolved: dict[int, str] = {}  # pid -> session id, this process
+_roots: dict[str, str | None] = {}  # dir -> project root (None: no marker up-tree)
+_projects: dict[str, tuple] = {}  # dir -> (config path | None, mtime_ns | checked-at, project)
+_NO_PROJECT_TTL = 30
+_MAX_PROJECT_DIRS = 4096
 
 
 def kb_project_for_path(fpath: str) -> str | None:
     """Resolve the KB project name for a file by walking up to the nearest
     `.claude/kb-project.json` ({"kb_project": "<name>"}). Generic replacement
     for the old hardcoded path->project map (kb-bp4 P6). Returns None if no
-    project config is found up-tree."""
+    project config is found up-tree.
+
+    Memoized per directory for the life of the process (every directory on the
+    walk shares the answer): a hit costs one stat of the config file, re-read
+    only when its mtime changed; a "no project" answer is trusted for
+    _NO_PROJECT_TTL seconds, so a config created later is still picked up by
+    a long-lived process (hookd)."""
     if not fpath:
         return None
-    d = os.path.dirname(os.path.abspath(fpath))
-    prev = None
+    start = os.path.dirname(os.path.abspath(fpath))
+    hit = _projects.get(start)
+    if hit:
+        cfg, stamp, project = hit
+        if cfg is None:
+            if time.monotonic() - stamp < _NO_PROJECT_TTL:
+                return None
+        else:
+            try:
+                if os.stat(cfg).st_mtime_ns == stamp:
+                    return project
+            except OSError:
+                pass
+    d, prev, walked = start, None, []
+    entry = (None, time.monotonic(), None)
     while d and d != prev:
+        walked.append(d)
         cfg = os.path.join(d, '.claude', 'kb-project.json')
         if os.path.isfile(cfg):
             try:
+                mtime = os.stat(cfg).st_mtime_ns
                 with open(cfg) as fh:
-                    return json.load(fh).get('kb_project') or None
+                    entry = (cfg, mtime, json.load(fh).get('kb_project') or None)
             except Exception:
-                return None
+                entry = (cfg, -1, None)  # unreadable: retried on the next call
+            break
         prev, d = d, os.path.dirname(d)
+    if len(_projects) > _MAX_PROJECT_DIRS:
+        _projects.clear()
+    for w in walked:
+        _projects[w] = entry
+    return entry[2]
+
+
+def project_root(fpath: str) -> str:
+    """Root of the project containing `fpath`: the nearest ancestor holding a
+    `.git` (directory, or file for worktrees/submodules) or a
+    `.claude/kb-project.json`, else the file's own directory. Every directory
+    on the walk is memoized, so sibling files resolve with one dict lookup."""
+    start = os.path.dirname(os.path.abspath(fpath))
+    d, walked = start, []
+    while d not in _roots:
+        walked.append(d)
+        if os.path.exists(os.path.join(d, '.git')) or \
+                os.path.isfile(os.path.join(d, '.claude', 'kb-project.json')):
+            _roots[d] = d
+            break
+        parent = os.path.dirname(d)
+        if parent == d:
+            _roots[d] = None
+            break
+        d = parent
+    root = _roots[d]
+    for w in walked:
+        _roots[w] = root
+    return root or start
+
+
+def _start_time(pid: int) -> str | None:
+    """Process start time (clock ticks since boot) -- pid + this is unique."""
+    try:
+        with open(f'/proc/{pid}/stat') as fh:
+            return fh.read().rsplit(')', 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+def _parent(pid: int) -> int | None:
+    try:
+        with open(f'/proc/{pid}/status') as fh:
+            for line in fh:
+                if line.startswith('PPid:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
     return None
 
 
-def get_session_id() -> str | None:
-    """Return the current Claude session ID, or None if unavailable."""
+def _read_sid(path: str) -> str | None:
+    try:
+        with open(path) as fh:
+            return fh.read().strip() or None
+    except OSError:
+        return None
+
+
+def get_session_id(pid: int | None = None) -> str | None:
+    """Return the current Claude session ID, or None if unavailable. `pid` is
+    where the lookup starts (default: this process's parent)."""
     # Prefer env var — O(1), works for all normal PreToolUse/PostToolUse hooks
     sid = os.environ.get('CLAUDE_SESSION_ID', '').strip()
     if sid:
         return sid
 
-    # PPID walk — for SubagentStop and other contexts where env var is absent
+    base = pid or os.getppid()
+    owner = _resolved.get(base)
+    if owner:
+        return _read_sid(os.path.join(STATE_DIR, f'session-{owner}'))
     try:
-        pid = os.getpid()
+        sid = _read_sid(os.path.join(STATE_DIR, f'session-{base}'))
+        if sid:
+            _resolved[base] = base
+            return sid
+        # Pid index — one read + one /proc read when this parent walked before
+        start = _start_time(base)
+        hit = (_read_sid(os.path.join(STATE_DIR, f'pidsid-{base}')) or '').split()
+        if start and len(hit) == 2 and hit[1] == start:
+            sid = _read_sid(os.path.join(STATE_DIR, f'session-{hit[0]}'))
+            if sid:
+                _resolved[base] = int(hit[0])
+                return sid
+        # PPID walk — for SubagentStop and other contexts where env var is absent
+        cur = base
         for _ in range(_MAX_WALK):
-            try:
-                with open(f'/proc/{pid}/status') as fh:
-                    ppid = None
-                    for line in fh:
-                        if line.startswith('PPid:'):
-                            ppid = int(line.split()[1])
-                            break
-                if ppid is None:
-                    break
-                pid = ppid
-            except OSError:
+            cur = _parent(cur)
+            if not cur:
                 break
-            session_file = os.path.join(STATE_DIR, f'session-{pid}')
-            if os.path.exists(session_file):
-                with open(session_file) as fh:
-                    return fh.read().strip() or None
+            sid = _read_sid(os.path.join(STATE_DIR, f'session-{cur}'))
+            if sid:
+                _resolved[base] = cur
+                if start:
+                    tmp = os.path.join(STATE_DIR, f'.pidsid-{base}.{os.getpid()}')
+                    with open(tmp, 'w') as fh:
+                        fh.write(f'{cur} {start}\n')
+                    os.replace(tmp, os.path.join(STATE_DIR, f'pidsid-{base}'))
+                return sid
     except Exception:
         pass
 
-    return None
+    return sid or None
 
 
 def state_path(suffix: str) -> str | None:
@@ -77,3 +188,12 @@ def state_path(suffix: str) -> str | None:
     if not sid:
         return None
     return os.path.join(STATE_DIR, f'{sid}-{suffix}')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['session-id']:
+        sid = get_session_id(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        if sid:
+            print(sid)
+        sys.exit(0 if sid else 1)
+    sys.exit(2)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Per-repo snapshot of open bd issues for open_issues_surface.py.
+
+open_issues_surface ran `git rev-parse` and `bd list --status=open --json` on
+every Agent/Task dispatch and every `bridge send` -- a round-trip to the shared
+Dolt server on the PreToolUse hot path. The hook now only reads
+
+    $STATE_DIR/bd-open-<blake2b(root)>.json   {"root": ..., "issues": [...],
+                                               "index": {"words": "w1\\nw2...",
+                                                         "postings": ["0 7 9", ...]}}
+
+and never runs bd itself. "index" is built once per refresh: every distinct
+lowercased word (>= INDEX_MIN_LEN chars) of an issue's title+description and
+the positions in "issues" it occurs in. Both are stored as strings (a JSON list
+of int lists loads ~4x slower) and a posting is only parsed when a token hits
+its word. hits() scores a prompt against it with one substring search of the
+vocabulary per token plus a sum over posting lists, instead of a substring test
+per token per issue.
+
+The snapshot is rewritten (atomically) by a detached `bd_issues.py ROOT`
+refresher, one per root under an flock, which load() spawns when the snapshot
+is missing, older than TTL seconds, or marked dirty. A stale snapshot is still
+served while the refresh runs; a missing one serves nothing. A failed `bd list`
+(no bd, no server, timeout) keeps the last snapshot but restarts its TTL -- or
+writes an empty one -- so a broken bd costs one refresher per TTL, not one per
+dispatch.
+
+ROOT is the directory bd itself resolves to: the nearest ancestor holding a
+`.beads`, else the git toplevel. A subdirectory with its own
+.claude/kb-project.json is a kb project root but shares the repo's issues.
+
+bd-lifecycle.sh marks the snapshot dirty (`bd_issues.py --invalidate ROOT`)
+when it sees a bd create/update/close, and spawns the refresh right away. The
+refresher clears the mark before it queries bd and loops while a mutation
+landed mid-query, so the write that reached bd is never shadowed by an older
+listing.
+
+Usage: bd_issues.py [--invalidate] DIR   (DIR is resolved to its project root)
+"""
+import fcntl
+import hashlib
+import itertools
+import json
+import bisect
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _state import STATE_DIR, project_root  # noqa: E402
+
+TTL = 60            # seconds a snapshot is served before a background refresh
+BD_TIMEOUT = 30     # off the hot path: the Dolt server may be slow, never the hook
+MAX_PASSES = 3      # refresher re-runs while invalidations keep arriving
+INDEX_MIN_LEN = 5   # shorter words cannot contain a prompt token (>= 5 chars)
+_WORD = re.compile(r'\w+')
+
+
+def _find_bd() -> str:
+    """Find bd executable — may be in nvm or ~/.local/bin."""
+    path = shutil.which('bd')
+    if path:
+        return path
+    for candidate in [
+        os.path.expanduser('~/.local/bin/bd'),
+        os.path.expanduser('~/.nvm/versions/node/v24.0.2/bin/bd'),
+    ]:
+        if os.path.isfile(candidate):
+            return candidate
+    return 'bd'
+
+
+_roots: dict[str, str] = {}
+
+
+def repo_root(cwd: str) -> str:
+    """The bd root of the directory `cwd`: its nearest ancestor holding a
+    `.beads`, else the nearest holding a `.git`, else _state.project_root."""
+    cwd = os.path.abspath(cwd)
+    if cwd not in _roots:
+        git = None
+        d = cwd
+        while True:
+            if os.path.isdir(os.path.join(d, '.beads')):
+                _roots[cwd] = d
+                break
+            if git is None and os.path.exists(os.path.join(d, '.git')):
+                git = d
+            parent = os.path.dirname(d)
+            if parent == d:
+                # project_root takes a path IN the dir
+                _roots[cwd] = git or project_root(os.path.join(cwd, '_'))
+                break
+            d = parent
+    return _roots[cwd]
+
+
+def snapshot_path(root: str) -> str:
+    key = hashlib.blake2b(os.path.abspath(root).encode(), digest_size=8).hexdigest()
+    return os.path.join(STATE_DIR, f'bd-open-{key}.json')
+
+
+def _busy(path: str) -> bool:
+    """True while a refresher holds the root's lock."""
+    try:
+        with open(path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+def spawn(root: str) -> None:
+    """Start a detached refresh of `root` (returns immediately)."""
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), root],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def build_index(issues: list[dict]) -> dict:
+    """Inverted index over the issues' lowercased title+description words."""
+    postings: dict[str, list[int]] = {}
+    for i, issue in enumerate(issues):
+        text = ((issue.get('title') or '') + ' ' + (issue.get('description') or '')).lower()
+        for w in set(_WORD.findall(text)):
+            if len(w) >= INDEX_MIN_LEN:
+                postings.setdefault(w, []).append(i)
+    return {'words': '\n'.join(postings),
+            'postings': [' '.join(map(str, ids)) for ids in postings.values()]}
+
+
+def hits(index: dict, tokens) -> dict[int, int]:
+    """{issue position: how many of `tokens` occur in its title+description}.
+    A token counts where it is a substring of an indexed word -- the same
+    answer as `tok in text.lower()` for the \\w-only, >= INDEX_MIN_LEN-char
+    tokens open_issues_surface extracts (an occurrence never spans a non-word
+    character)."""
+    if '_starts' not in index:  # word i of the '\n'-joined vocabulary starts here
+        index['_starts'] = list(itertools.accumulate(
+            (len(w) + 1 for w in index['words'].split('\n')[:-1]), initial=0))
+    blob, starts, postings = index['words'], index['_starts'], index['postings']
+    score: dict[int, int] = {}
+    for tok in tokens:
+        seen: set[int] = set()
+        at = blob.find(tok)
+        while at >= 0:
+            w = bisect.bisect_right(starts, at) - 1
+            seen.update(map(int, postings[w].split()))
+            at = blob.find(tok, starts[w + 1]) if w + 1 < len(starts) else -1
+        for i in seen:
+            score[i] = score.get(i, 0) + 1
+    return score
+
+
+def load(root: str) -> tuple[list[dict], dict]:
+    """(open issues of `root`, each tagged with `_root`; their inverted index)
+    from the snapshot. Never blocks on bd: a stale, dirty or missing snapshot
+    schedules a refresh and the current contents (possibly none) are returned."""
+    path = snapshot_path(root)
+    try:
+        st = os.stat(path)
+        with open(path) as fh:
+            snap = json.load(fh)
+        issues = snap.get('issues') or []
+        index = snap.get('index') or build_index(issues)  # pre-index snapshot
+    except (OSError, ValueError):
+        st, issues, index = None, [], build_index([])
+    if (st is None or time.time() - st.st_mtime > TTL or os.path.exists(path + '.dirty')) \
+            and not _busy(path):
+        try:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            spawn(root)
+        except OSError:
+            pass
+    for item in issues:
+        item['_root'] = root
+    return issues, index
+
+
+def invalidate(root: str) -> None:
+    """Mark `root`'s snapshot dirty and start its refresh."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(snapshot_path(root) + '.dirty', 'w'):
+        pass
+    spawn(root)
+
+
+def _write(path: str, root: str, issues: list[dict]) -> None:
+    tmp = f'{path}.{os.getpid()}'
+    with open(tmp, 'w') as fh:
+        json.dump({'root': root, 'issues': issues, 'index': build_index(issues)}, fh)
+    os.replace(tmp, path)
+
+
+def refresh(root: str) -> None:
+    """Query bd and rewrite the snapshot, again while a dirty mark reappears.
+    A failed query keeps the previous snapshot (or writes an empty one) with a
+    fresh mtime, so load() waits out a TTL before the next attempt."""
+    path = snapshot_path(root)
+    bd = _find_bd()
+    for _ in range(MAX_PASSES):
+        try:
+            os.unlink(path + '.dirty')
+        except FileNotFoundError:
+            pass
+        try:
+            result = subprocess.run([bd, 'list', '--status=open', '--json'], cwd=root,
+                                    capture_output=True, text=True, timeout=BD_TIMEOUT)
+            if result.returncode != 0:
+                raise OSError(f'bd list: rc {result.returncode}')
+            issues = json.loads(result.stdout) if result.stdout.strip() else []
+        except (OSError, subprocess.SubprocessError, ValueError):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                _write(path, root, [])
+            return
+        _write(path, root, issues)
+        if not os.path.exists(path + '.dirty'):
+            return
+
+
+def main(argv: list[str]) -> int:
+    flags = [a for a in argv if a.startswith('--')]
+    args = [a for a in argv if not a.startswith('--')]
+    if len(args) != 1 or not set(flags) <= {'--invalidate'} or not os.path.isdir(args[0]):
+        sys.stderr.write(__doc__.rsplit('Usage: ', 1)[1])
+        return 2
+    root = repo_root(args[0])
+    if flags:
+        invalidate(root)
+        return 0
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(snapshot_path(root) + '.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return 0  # another refresher is already querying this root
+        try:
+            refresh(root)
+        except Exception:
+            pass  # keep the last good snapshot; the next stale load retries
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
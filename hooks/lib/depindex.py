@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""Persistent per-repo definition/reference index for read_dep_augment.py.
+
+read_dep_augment answered "defs outside the slice" with one ast-grep run per
+DEFPATS pattern over the file, and "consumers of names in the slice" with one
+full-tree ast-grep run per name -- under a 4 s budget that big trees blow, so
+only MAX_NAMES names were ever looked up. This index answers both with an
+indexed SELECT:
+
+    files(path, mtime_ns, size, lang)   one row per indexed source file
+    defs(name, path, line)              DEFPATS matches (the $N capture)
+    refs(name, path, line)              call sites `$N($$$)`; a dotted callee
+                                        (obj.meth) is stored by its last name
+
+Python files are extracted with the `ast` module -- every def/class and every
+call from ONE parse, no process spawn (the DEFPATS route costs four ast-grep
+runs plus one for calls). A file `ast` cannot parse falls back to ast-grep.
+
+One SQLite file per project root (_state.project_root: git toplevel or the
+.claude/kb-project.json dir), $STATE_DIR/depindex-<blake2b(root)>.db (WAL),
+shared by every session. refresh() lists the root's source files (git ls-files
+in a work tree, so .gitignore applies; SKIP_DIRS always excluded), re-extracts
+only files whose mtime/size changed and drops deleted ones. Non-Python stale
+files are batched into one ast-grep run per pattern. It runs detached
+(`depindex.py ROOT`, one builder per root under an flock), spawned by the
+augmentation at most every REFRESH_EVERY seconds. The augmentation itself
+re-indexes only a stale Python file just Read (one `ast` parse, refresh_file);
+a stale file that needs ast-grep marks the root due for that builder instead.
+Until the first full walk completes (meta 'complete'), callers should not treat
+a missing consumer as "no consumers".
+
+Usage: depindex.py ROOT
+"""
+import ast
+import fcntl
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _state import STATE_DIR  # noqa: E402
+
+LANG = {
+    ".py": "python", ".pyi": "python", ".rs": "rust", ".go": "go", ".java": "java",
+    ".js": "javascript", ".mjs": "javascript", ".cjs": "javascript", ".ts": "typescript",
+    ".tsx": "tsx", ".jsx": "jsx", ".c": "c", ".h": "c", ".cpp": "cpp", ".cc": "cpp",
+    ".cxx": "cpp", ".hpp": "cpp", ".hh": "cpp", ".rb": "ruby", ".lua": "lua",
+    ".sh": "bash", ".bash": "bash", ".scala": "scala", ".swift": "swift", ".kt": "kotlin",
+}
+# def-site patterns per ast-grep language (return-annotated variants included --
+# the plain `def $N($$$): $$$` misses annotated defs, per the project's ast-grep gotcha)
+DEFPATS = {
+    "python": ["def $N($$$): $$$", "def $N($$$) -> $R: $$$", "class $N: $$$",
+               "class $N($$$): $$$"],
+    "rust": ["fn $N($$$) $$$", "fn $N($$$) -> $R $$$", "struct $N $$$", "enum $N $$$",
+             "trait $N $$$"],
+    "go": ["func $N($$$) $$$", "type $N struct $$$"],
+    "javascript": ["function $N($$$) { $$$ }", "const $N = $_"],
+    "typescript": ["function $N($$$) { $$$ }", "class $N { $$$ }"],
+    "c": ["$T $N($$$) { $$$ }"], "cpp": ["$T $N($$$) { $$$ }"],
+    "ruby": ["def $N\n$$$\nend", "class $N\n$$$\nend"],
+    "bash": ["$N() { $$$ }"], "lua": ["function $N($$$) $$$ end"],
+}
+REFPAT = "$N($$$)"
+SKIP_DIRS = {".git", ".hg", ".svn", "node_modules", "target", "build", "dist",
+             "__pycache__", ".venv", "venv", ".tox", ".mypy_cache", ".lake"}
+AST_TIMEOUT = 60      # seconds per ast-grep batch (background builder)
+BATCH = 200           # files per ast-grep invocation
+REFRESH_EVERY = 120   # seconds between background walks spawned by the hook
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime_ns INTEGER, '
+    'size INTEGER, lang TEXT) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS defs (name TEXT NOT NULL, path TEXT NOT NULL, line INTEGER NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS refs (name TEXT NOT NULL, path TEXT NOT NULL, line INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS defs_path ON defs(path, line)',
+    'CREATE INDEX IF NOT EXISTS refs_name ON refs(name, path)',
+    'CREATE INDEX IF NOT EXISTS refs_path ON refs(path)',
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID',
+)
+_IDENT = re.compile(r'[A-Za-z_]\w*$')
+_conns: dict[str, sqlite3.Connection] = {}
+
+
+def db_path(root: str) -> str:
+    key = hashlib.blake2b(os.path.abspath(root).encode(), digest_size=8).hexdigest()
+    return os.path.join(STATE_DIR, f'depindex-{key}.db')
+
+
+def connect(root: str) -> sqlite3.Connection:
+    path = db_path(root)
+    conn = _conns.get(path)
+    if conn is not None and os.path.exists(path):
+        return conn
+    os.makedirs(STATE_DIR, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    for ddl in _SCHEMA:
+        conn.execute(ddl)
+    conn.execute("INSERT OR IGNORE INTO meta VALUES ('root', ?)", (os.path.abspath(root),))
+    _conns[path] = conn
+    return conn
+
+
+def _meta(conn: sqlite3.Connection, key: str) -> str | None:
+    row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else None
+
+
+def complete(conn: sqlite3.Connection) -> bool:
+    """True once a full walk of the root has finished."""
+    return _meta(conn, 'complete') == '1'
+
+
+def due(conn: sqlite3.Connection) -> bool:
+    """True when no walk has started within REFRESH_EVERY seconds."""
+    try:
+        return time.time() - float(_meta(conn, 'walked') or 0) > REFRESH_EVERY
+    except ValueError:
+        return True
+
+
+def _ast_grep(lang: str, pattern: str, paths: list[str], timeout: float) -> list[tuple[str, str, int]]:
+    """(name, file, 1-based line) for each $N capture of `pattern` in `paths`.
+    Raises when ast-grep is missing, times out or prints garbage."""
+    txt = subprocess.run(["ast-grep", "--lang", lang, "--pattern", pattern, "--json", *paths],
+                         capture_output=True, text=True, timeout=timeout).stdout
+    out = []
+    for m in json.loads(txt or "[]"):
+        name = ((m.get("metaVariables", {}).get("single", {}).get("N")) or {}).get("text")
+        line = m.get("range", {}).get("start", {}).get("line")
+        if name and line is not None and m.get("file"):
+            out.append((name, os.path.abspath(m["file"]), line + 1))  # 0-based
+    return out
+
+
+def _python_extract(fp: str) -> tuple[list, list]:
+    """(defs, refs) for a Python file in one parse. Raises SyntaxError (and
+    OSError/ValueError) when it cannot be parsed."""
+    with open(fp, 'rb') as fh:
+        source = fh.read()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', SyntaxWarning)
+        tree = ast.parse(source, fp)
+    defs, refs = [], []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            defs.append((node.name, fp, node.lineno))
+        elif isinstance(node, ast.Call):
+            f = node.func
+            name = f.id if isinstance(f, ast.Name) else f.attr if isinstance(f, ast.Attribute) else None
+            if name:
+                refs.append((name, fp, node.lineno))
+    return defs, refs
+
+
+def index_files(conn: sqlite3.Connection, files: list[tuple[str, int, int, str]],
+                timeout: float = AST_TIMEOUT) -> None:
+    """(Re-)extract defs and refs for [(path, mtime_ns, size, lang)]. A batch
+    whose extraction fails is left unrecorded, so it is retried next time
+    instead of being indexed as empty."""
+    by_lang: dict[str, list] = {}
+    batch, defs, refs = [], [], []
+    for f in files:
+        if f[3] == 'python':
+            try:
+                d, r = _python_extract(f[0])
+            except (SyntaxError, ValueError, OSError):
+                pass
+            else:
+                batch.append(f); defs += d; refs += r
+                if len(batch) >= BATCH:
+                    _store(conn, batch, defs, refs)
+                    batch, defs, refs = [], [], []
+                continue
+        by_lang.setdefault(f[3], []).append(f)
+    if batch:
+        _store(conn, batch, defs, refs)
+    for lang, group in by_lang.items():
+        for i in range(0, len(group), BATCH):
+            batch = group[i:i + BATCH]
+            paths = [f[0] for f in batch]
+            try:
+                defs = [d for pat in DEFPATS.get(lang, []) for d in _ast_grep(lang, pat, paths, timeout)]
+                calls = _ast_grep(lang, REFPAT, paths, timeout)
+            except Exception:
+                continue
+            refs = []
+            for name, fp, line in calls:
+                m = _IDENT.search(name)
+                if m:
+                    refs.append((m.group(0), fp, line))
+            _store(conn, batch, defs, refs)
+
+
+def _store(conn: sqlite3.Connection, batch: list, defs: list, refs: list) -> None:
+    """Replace the rows of every file in `batch` in one transaction."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for f in batch:
+            conn.execute('DELETE FROM defs WHERE path = ?', (f[0],))
+            conn.execute('DELETE FROM refs WHERE path = ?', (f[0],))
+        conn.executemany('INSERT INTO defs VALUES (?, ?, ?)', sorted(set(defs)))
+        conn.executemany('INSERT INTO refs VALUES (?, ?, ?)', sorted(set(refs)))
+        conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', batch)
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _stale(conn: sqlite3.Connection, fp: str) -> tuple[str, int, int, str] | None:
+    lang = LANG.get(os.path.splitext(fp)[1].lower())
+    try:
+        st = os.stat(fp)
+    except OSError:
+        return None
+    row = conn.execute('SELECT mtime_ns, size FROM files WHERE path = ?', (fp,)).fetchone()
+    if lang and (row is None or row[0] != st.st_mtime_ns or row[1] != st.st_size):
+        return (fp, st.st_mtime_ns, st.st_size, lang)
+    return None
+
+
+def refresh_file(conn: sqlite3.Connection, fp: str) -> bool:
+    """Re-index one file if it changed since it was indexed, in-process only:
+    a Python file `ast` parses is re-extracted here; anything that needs
+    ast-grep is left to the detached builder, and the root is marked due so
+    the caller spawns it now. True when `fp`'s rows are current."""
+    stale = _stale(conn, os.path.abspath(fp))
+    if not stale:
+        return True
+    if stale[3] == 'python':
+        try:
+            d, r = _python_extract(stale[0])
+        except (SyntaxError, ValueError, OSError):
+            pass
+        else:
+            _store(conn, [stale], d, r)
+            return True
+    conn.execute("INSERT OR REPLACE INTO meta VALUES ('walked', '0')")
+    return False
+
+
+def _walk(root: str):
+    """Source files under `root`. In a git work tree this is `git ls-files`
+    (tracked plus untracked-but-not-ignored), so .gitignore bounds the index;
+    build/vendor dirs in SKIP_DIRS are excluded either way."""
+    try:
+        out = subprocess.run(['git', '-C', root, 'ls-files', '-z', '--cached', '--others',
+                              '--exclude-standard'], capture_output=True, timeout=AST_TIMEOUT)
+        if out.returncode == 0:
+            for rel in out.stdout.decode('utf-8', 'surrogateescape').split('\0'):
+                parts = rel.split('/')
+                if rel and os.path.splitext(rel)[1].lower() in LANG \
+                        and not any(p in SKIP_DIRS for p in parts[:-1]):
+                    yield os.path.join(root, rel)
+            return
+    except (OSError, subprocess.SubprocessError):
+        pass
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith('.')]
+        for f in files:
+            if os.path.splitext(f)[1].lower() in LANG:
+                yield os.path.join(dirpath, f)
+
+
+def refresh(root: str) -> int:
+    """Walk `root`, re-index changed files, drop vanished ones. Returns the
+    number of files re-indexed."""
+    root = os.path.abspath(root)
+    conn = connect(root)
+    conn.execute("INSERT OR REPLACE INTO meta VALUES ('walked', ?)", (str(time.time()),))
+    present, stale = set(), []
+    for fp in _walk(root):
+        present.add(fp)
+        s = _stale(conn, fp)
+        if s:
+            stale.append(s)
+    index_files(conn, stale)
+    gone = [p for (p,) in conn.execute('SELECT path FROM files') if p not in present]
+    if gone:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for fp in gone:
+                for table in ('files', 'defs', 'refs'):
+                    conn.execute(f'DELETE FROM {table} WHERE path = ?', (fp,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    conn.execute("INSERT OR REPLACE INTO meta VALUES ('complete', '1')")
+    return len(stale)
+
+
+def spawn(root: str) -> None:
+    """Start a detached refresh of `root` (returns immediately)."""
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), root],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def defs_in(conn: sqlite3.Connection, fp: str) -> list[tuple[str, int]]:
+    """(name, line) of every definition in `fp` by line -- overloads, same-named
+    methods and redefinitions each keep their own row."""
+    rows = conn.execute('SELECT DISTINCT name, line FROM defs WHERE path = ? ORDER BY line, name',
+                        (os.path.abspath(fp),))
+    return [(n, l) for n, l in rows]
+
+
+def consumers(conn: sqlite3.Connection, name: str, exclude_fp: str, limit: int) -> list[str]:
+    """file:line call sites of `name` outside `exclude_fp`."""
+    rows = conn.execute('SELECT path, line FROM refs WHERE name = ? AND path != ? '
+                        'ORDER BY path, line LIMIT ?', (name, os.path.abspath(exclude_fp), limit))
+    return [f"{p}:{l}" for p, l in rows]
+
+
+def main(argv: list[str]) -> int:
+    if len(argv) != 1 or not os.path.isdir(argv[0]):
+        sys.stderr.write(__doc__.rsplit('Usage: ', 1)[1])
+        return 2
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(db_path(argv[0]) + '.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return 0  # another builder is already walking this root
+        refresh(argv[0])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,115 @@
+"""Persistent cache of per-file extraction results (token sets, def lists, ...).
+
+The same large files get Read over and over in a session, and every PostToolUse
+hook that looks at them re-parses from scratch. cached() runs an extractor over a
+file's content at most once per content version:
+
+    entry key   (namespace, path)  -- namespace names the extractor and its
+                                      version, e.g. 'symbol_surface.py/1'
+    fast hit    st_mtime_ns and st_size unchanged: the file is not even read
+    slow hit    stat changed but the blake2b digest of the content matches
+                (touch, checkout of identical content): stat is refreshed
+    miss        extractor runs on the content; result stored as JSON
+
+Entries live in $STATE_DIR/extract-cache.db (sqlite, WAL, shared by every
+session and the hook daemon). Past MAX_ENTRIES the least recently used rows are
+evicted. Everything is fail-open: any cache error just runs the extractor.
+CLAUDE_EXTRACT_CACHE=0 disables the cache.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from _state import STATE_DIR
+
+CACHE_DB = os.path.join(STATE_DIR, 'extract-cache.db')
+MAX_ENTRIES = 2000
+
+_SCHEMA = ('CREATE TABLE IF NOT EXISTS entries ('
+           'ns TEXT NOT NULL, path TEXT NOT NULL, mtime_ns INTEGER NOT NULL, '
+           'size INTEGER NOT NULL, digest TEXT NOT NULL, value TEXT NOT NULL, '
+           'used REAL NOT NULL, PRIMARY KEY (ns, path))')
+_local = threading.local()  # .conn = (path, connection), one per thread
+
+
+def enabled() -> bool:
+    return os.environ.get('CLAUDE_EXTRACT_CACHE', '1') != '0'
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    cached = getattr(_local, 'conn', None)
+    if cached and cached[0] == path:
+        return cached[1]
+    conn = sqlite3.connect(path, timeout=1, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(_SCHEMA)
+    _local.conn = (path, conn)
+    return conn
+
+
+def _digest(content: str) -> str:
+    return hashlib.blake2b(content.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+def _read(fpath: str) -> str | None:
+    try:
+        with open(fpath, encoding='utf-8', errors='replace') as fh:
+            return fh.read()
+    except OSError:
+        return None
+
+
+def cached(fpath: str, ns: str, extract, path: str = CACHE_DB):
+    """extract(content) for the file at `fpath`, from cache when its content is
+    unchanged. `extract` must return something JSON-serializable; its result
+    is returned as decoded from JSON (tuples come back as lists). Returns None
+    if the file cannot be read."""
+    try:
+        st = os.stat(fpath)
+    except OSError:
+        return None
+    if not enabled():
+        content = _read(fpath)
+        return None if content is None else extract(content)
+    fpath = os.path.abspath(fpath)
+    try:
+        conn = _connect(path)
+        row = conn.execute('SELECT mtime_ns, size, digest, value FROM entries '
+                           'WHERE ns = ? AND path = ?', (ns, fpath)).fetchone()
+    except sqlite3.Error:
+        conn, row = None, None
+    if row and row[0] == st.st_mtime_ns and row[1] == st.st_size:
+        _touch(conn, ns, fpath, st)
+        return json.loads(row[3])
+
+    content = _read(fpath)
+    if content is None:
+        return None
+    digest = _digest(content)
+    if row and row[2] == digest:
+        _touch(conn, ns, fpath, st)
+        return json.loads(row[3])
+
+    value = json.loads(json.dumps(extract(content)))
+    if conn is not None:
+        try:
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (ns, fpath, st.st_mtime_ns, st.st_size, digest,
+                          json.dumps(value), time.time()))
+            conn.execute('DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries '
+                         'ORDER BY used DESC LIMIT -1 OFFSET ?)', (MAX_ENTRIES,))
+        except sqlite3.Error:
+            pass
+    return value
+
+
+def _touch(conn: sqlite3.Connection, ns: str, fpath: str, st: os.stat_result) -> None:
+    try:
+        conn.execute('UPDATE entries SET used = ?, mtime_ns = ?, size = ? WHERE ns = ? AND path = ?',
+                     (time.time(), st.st_mtime_ns, st.st_size, ns, fpath))
+    except sqlite3.Error:
+        pass
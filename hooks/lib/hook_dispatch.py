@@ -0,0 +1,435 @@
+"""Run a group of hooks against one payload and merge their verdicts.
+
+Shared engine for the warm hook daemon (lib/hookd.py) and its client shim
+(hookd/hookd-client.py, which falls back to running this in-process when the
+daemon is not up). A "group" is one event+matcher fan-out, e.g. PreToolUse:Bash,
+listed in hookd/groups.json in the same {command, timeout} shape settings.json
+uses -- so moving a hook in or out of the daemon is a copy-paste.
+
+Two ways a hook runs:
+  IN-PROCESS  `python3 <path>.py` hooks: the module is imported ONCE (re-imported
+              when the file's mtime changes) and its main() is called with
+              stdin/stdout/stderr bound to per-call buffers. No interpreter
+              start, no re-import of json/re/sqlite3, compiled regexes stay warm.
+  SUBPROCESS  everything else (the shell guards): spawned as before, in its own
+              process group so a timeout kills the whole pipeline.
+
+The hooks of a group run concurrently (see run_group), each under its own
+deadline, and are merged in group order. An in-process hook cannot be killed:
+once it misses a deadline it is run as a subprocess until its file changes.
+While such an abandoned hook is still running it keeps reading the process's
+os.environ and cwd, so a caller must not repoint those for another request
+(inprocess_running(); lib/hookd.py then runs the group with inprocess=False).
+
+Merge semantics -- identical to Claude Code running the hooks side by side:
+  - any exit 2 blocks; the blockers' stderr is the block message
+  - permissionDecision: deny > ask > allow (allow only when nothing blocked)
+  - additionalContext / systemMessage / reasons are concatenated in group order
+  - a hook that times out or crashes fails OPEN, exactly like its own timeout
+
+Every hook's wall time / exit code / output size (plus the group total) goes to
+the timing ledger (lib/hook_ledger.py); hooks/tests/hook_profile.py reports it.
+"""
+import importlib.util
+import io
+import json
+import os
+import re
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import hook_ledger
+
+HOOKS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GROUPS_FILE = os.path.join(HOOKS_DIR, 'hookd', 'groups.json')
+DEFAULT_TIMEOUT_MS = 60000  # Claude Code's own default when a hook sets none
+
+_PY_CMD = re.compile(r'^python3?\s+(\S+\.py)$')
+
+
+# ---------------------------------------------------------------------------
+# Thread-local stdio: sys.stdin/stdout/stderr are swapped for proxies that
+# forward to a per-thread buffer while a hook runs, and to the real stream
+# otherwise. Lets in-process hooks run concurrently without mixing output.
+# ---------------------------------------------------------------------------
+
+class _ThreadStream:
+    def __init__(self, real):
+        self._real = real
+        self._local = threading.local()
+
+    def bind(self, stream):
+        self._local.stream = stream
+
+    def unbind(self):
+        self._local.stream = None
+
+    def _target(self):
+        return getattr(self._local, 'stream', None) or self._real
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def __iter__(self):
+        return iter(self._target())
+
+
+_stdio_lock = threading.Lock()
+_stdio = None
+
+
+def _install_stdio():
+    global _stdio
+    with _stdio_lock:
+        if _stdio is None:
+            _stdio = (_ThreadStream(sys.stdin), _ThreadStream(sys.stdout),
+                      _ThreadStream(sys.stderr))
+            sys.stdin, sys.stdout, sys.stderr = _stdio
+    return _stdio
+
+
+# ---------------------------------------------------------------------------
+# Group table
+# ---------------------------------------------------------------------------
+
+_groups_cache: tuple[float, dict] | None = None
+
+
+def load_groups() -> dict:
+    """Return {group: [{command, timeout}, ...]} from hookd/groups.json.
+    Re-read when the file changes so a daemon picks up edits without restart."""
+    global _groups_cache
+    try:
+        mtime = os.stat(GROUPS_FILE).st_mtime
+    except OSError:
+        return {}
+    if _groups_cache and _groups_cache[0] == mtime:
+        return _groups_cache[1]
+    try:
+        with open(GROUPS_FILE) as fh:
+            groups = json.load(fh).get('groups', {})
+    except Exception:
+        return _groups_cache[1] if _groups_cache else {}
+    _groups_cache = (mtime, groups)
+    return groups
+
+
+def _expand(command: str, env: dict) -> str:
+    home = env.get('HOME') or os.path.expanduser('~')
+    return command.replace('${HOME}', home).replace('$HOME', home)
+
+
+def hook_label(command: str) -> str:
+    """Short stable name for a hook command (its script basename)."""
+    for tok in reversed(shlex.split(command)):
+        if tok.endswith(('.sh', '.py')):
+            return os.path.basename(tok)
+    return command.split()[0] if command.split() else command
+
+
+# ---------------------------------------------------------------------------
+# Runners
+# ---------------------------------------------------------------------------
+
+_modules: dict[str, tuple[float, object]] = {}
+_modules_lock = threading.Lock()
+_overdue: dict[str, float] = {}  # path -> mtime of an in-process hook that missed its deadline
+_running = 0  # in-process hooks executing right now (abandoned ones included)
+_running_lock = threading.Lock()
+
+
+def inprocess_running() -> int:
+    """How many in-process hooks are executing. Between requests, any are
+    abandoned overdue hooks still using this process's env and cwd."""
+    return _running
+
+
+def _inprocess_path(command: str) -> str | None:
+    """The .py a `python3 <path>.py` command would run in-process, unless that
+    file (at this mtime) has overrun a deadline before."""
+    m = _PY_CMD.match(command.strip())
+    if not m:
+        return None
+    try:
+        mtime = os.stat(m.group(1)).st_mtime
+    except OSError:
+        return None
+    return m.group(1) if _overdue.get(m.group(1)) != mtime else None
+
+
+def _mark_overdue(hook: dict, env: dict) -> bool:
+    """Demote `hook` to subprocess runs if it ran in-process. True if it did."""
+    path = _inprocess_path(_expand(hook['command'], env))
+    if path is None:
+        return False
+    try:
+        _overdue[path] = os.stat(path).st_mtime
+    except OSError:
+        pass
+    return True
+
+
+def _load_module(path: str):
+    mtime = os.stat(path).st_mtime
+    with _modules_lock:
+        hit = _modules.get(path)
+        if hit and hit[0] == mtime:
+            return hit[1]
+        name = '_hookd_' + re.sub(r'\W', '_', os.path.relpath(path, HOOKS_DIR))
+        spec = importlib.util.spec_from_file_location(name, path)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        _modules[path] = (mtime, mod)
+        return mod
+
+
+def _run_inprocess(path: str, payload: bytes) -> tuple[int, str, str]:
+    global _running
+    with _running_lock:
+        _running += 1
+    try:
+        return _run_module(path, payload)
+    finally:
+        with _running_lock:
+            _running -= 1
+
+
+def _run_module(path: str, payload: bytes) -> tuple[int, str, str]:
+    fin, fout, ferr = _install_stdio()
+    out, err = io.StringIO(), io.StringIO()
+    fin.bind(io.StringIO(payload.decode('utf-8', errors='replace')))
+    fout.bind(out)
+    ferr.bind(err)
+    try:
+        rv = _load_module(path).main()
+        rc = rv if isinstance(rv, int) else 0
+    except SystemExit as e:
+        if e.code is None:
+            rc = 0
+        elif isinstance(e.code, int):
+            rc = e.code
+        else:
+            err.write(str(e.code) + '\n')
+            rc = 1
+    except Exception as e:
+        err.write(f'hookd: {os.path.basename(path)} raised {e!r}\n')
+        rc = 1
+    finally:
+        fin.unbind()
+        fout.unbind()
+        ferr.unbind()
+    return rc, out.getvalue(), err.getvalue()
+
+
+def _run_subprocess(command: str, payload: bytes, env: dict, cwd: str,
+                    timeout_s: float) -> tuple[int | None, str, str]:
+    try:
+        p = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             env=env, cwd=cwd if os.path.isdir(cwd) else None,
+                             start_new_session=True)
+    except OSError as e:
+        return 1, '', f'hookd: cannot spawn {command}: {e}\n'
+    try:
+        out, err = p.communicate(payload, timeout=timeout_s)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        p.communicate()
+        return None, '', ''
+    return p.returncode, out.decode('utf-8', 'replace'), err.decode('utf-8', 'replace')
+
+
+def run_hook(hook: dict, payload: bytes, env: dict, cwd: str,
+             inprocess: bool = True) -> tuple[int | None, str, str]:
+    """Run one {command, timeout} hook. rc None = timed out (fail-open).
+    inprocess=False spawns python hooks too (how Claude Code runs them)."""
+    command = _expand(hook['command'], env)
+    timeout_s = (hook.get('timeout') or DEFAULT_TIMEOUT_MS) / 1000.0
+    path = _inprocess_path(command) if inprocess else None
+    if path:
+        return _run_inprocess(path, payload)
+    return _run_subprocess(command, payload, env, cwd, timeout_s)
+
+
+# ---------------------------------------------------------------------------
+# Merge
+# ---------------------------------------------------------------------------
+
+_DECISION_RANK = {'allow': 1, 'ask': 2, 'deny': 3}
+
+
+def merge(results: list[tuple[str, int | None, str, str]]) -> tuple[int, str, str]:
+    """Fold per-hook (label, rc, stdout, stderr) into one (rc, stdout, stderr)."""
+    blockers = [(lbl, err) for lbl, rc, _, err in results if rc == 2]
+    if blockers:
+        return 2, '', ''.join(err if err.endswith('\n') or not err else err + '\n'
+                              for _, err in blockers)
+
+    merged: dict = {}
+    hso: dict = {}
+    contexts: list[str] = []
+    reasons: list[str] = []
+    messages: list[str] = []
+    plain: list[str] = []
+    stderr: list[str] = []
+    decision = None
+    for lbl, rc, out, err in results:
+        if rc is None:
+            stderr.append(f'hookd: {lbl} timed out (fail-open)\n')
+            continue
+        if err:
+            stderr.append(err if err.endswith('\n') else err + '\n')
+        text = out.strip()
+        if not text:
+            continue
+        try:
+            obj = json.loads(text) if text.startswith('{') else None
+        except ValueError:
+            obj = None
+        if not isinstance(obj, dict):
+            plain.append(text)
+            continue
+        for k, v in obj.items():
+            if k == 'hookSpecificOutput' and isinstance(v, dict):
+                for hk, hv in v.items():
+                    if hk == 'additionalContext':
+                        contexts.append(hv)
+                    elif hk == 'permissionDecision':
+                        if _DECISION_RANK.get(hv, 0) > _DECISION_RANK.get(decision, 0):
+                            decision = hv
+                            reasons.clear()
+                        if hv == decision and v.get('permissionDecisionReason'):
+                            reasons.append(v['permissionDecisionReason'])
+                    elif hk != 'permissionDecisionReason':
+                        hso.setdefault(hk, hv)
+            elif k == 'systemMessage':
+                messages.append(v)
+            elif k == 'continue':
+                merged['continue'] = merged.get('continue', True) and bool(v)
+            elif k == 'decision':
+                if v == 'block' or 'decision' not in merged:
+                    merged['decision'] = v
+            else:
+                merged.setdefault(k, v)
+
+    if decision:
+        hso['permissionDecision'] = decision
+        if reasons:
+            hso['permissionDecisionReason'] = '; '.join(reasons)
+    if contexts:
+        hso['additionalContext'] = '\n'.join(contexts)
+    if hso:
+        merged['hookSpecificOutput'] = hso
+    if messages:
+        merged['systemMessage'] = '\n'.join(messages)
+
+    if merged:
+        # Claude Code parses stdout as ONE JSON object; non-JSON text from other
+        # hooks in the group rides on stderr (transcript-visible, as before).
+        stderr.extend(p + '\n' for p in plain)
+        return 0, json.dumps(merged), ''.join(stderr)
+    return 0, '\n'.join(plain) + ('\n' if plain else ''), ''.join(stderr)
+
+
+_MAX_WORKERS = int(os.environ.get('HOOKD_MAX_WORKERS') or 16)
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=_MAX_WORKERS, thread_name_prefix='hook')
+        return _pool
+
+
+def _retire(pool: ThreadPoolExecutor) -> None:
+    """Stop handing work to `pool` (a worker is stuck in an overdue hook); the
+    next request gets a fresh one, the stuck thread finishes unobserved."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _timed(hook: dict, payload: bytes, env: dict, cwd: str,
+           inprocess: bool = True) -> tuple[int | None, str, str, float]:
+    t0 = time.perf_counter()
+    rc, out, err = run_hook(hook, payload, env, cwd, inprocess)
+    return rc, out, err, (time.perf_counter() - t0) * 1000.0
+
+
+def _timed_deadline(hook: dict, payload: bytes, env: dict, cwd: str,
+                    inprocess: bool = True) -> tuple[int | None, str, str, float]:
+    """_timed on the calling thread for a spawned hook (killed at its own
+    deadline); an in-process one runs on a daemon thread that is abandoned --
+    and the hook demoted -- if it outlives the deadline."""
+    if not inprocess or not _inprocess_path(_expand(hook['command'], env)):
+        return _timed(hook, payload, env, cwd, inprocess)
+    timeout_s = (hook.get('timeout') or DEFAULT_TIMEOUT_MS) / 1000.0
+    box = []
+    t = threading.Thread(target=lambda: box.append(_timed(hook, payload, env, cwd)),
+                         name='hook', daemon=True)
+    t.start()
+    t.join(timeout_s)
+    if box:
+        return box[0]
+    _mark_overdue(hook, env)
+    return None, '', '', timeout_s * 1000.0
+
+
+def run_group(group: str, payload: bytes, env: dict | None = None,
+              cwd: str | None = None, inprocess: bool = True) -> tuple[int, str, str]:
+    """Run every hook in `group` against `payload`; return the merged verdict.
+    Unknown group -> (0, '', '') (fail-open, same as no hooks configured).
+
+    Hooks are independent, so they fan out on a thread pool (HOOKD_MAX_WORKERS,
+    1 = serial) and the group costs its slowest hook, not the sum. Each hook
+    keeps its own deadline, serial or not: one that misses it is reported as
+    timed out and merged as fail-open -- the verdict does not wait for it. A
+    spawned hook is killed at its deadline; an in-process one cannot be, so it
+    finishes unobserved, is run as a subprocess from then on, and the pool whose
+    worker it holds is retired so overdue hooks cannot starve later requests.
+    inprocess=False spawns every hook, each with exactly `env` and `cwd`."""
+    hooks = load_groups().get(group) or []
+    if not hooks:
+        return merge([])
+    env = dict(env if env is not None else os.environ)
+    cwd = cwd or os.getcwd()
+    t_group = time.perf_counter()
+    if _MAX_WORKERS <= 1 or len(hooks) == 1:
+        outcomes = [_timed_deadline(h, payload, env, cwd, inprocess) for h in hooks]
+    else:
+        pool = _executor()
+        futures = [pool.submit(_timed, h, payload, env, cwd, inprocess) for h in hooks]
+        outcomes = []
+        for hook, fut in zip(hooks, futures):
+            timeout_s = (hook.get('timeout') or DEFAULT_TIMEOUT_MS) / 1000.0
+            left = t_group + timeout_s - time.perf_counter()
+            try:
+                outcomes.append(fut.result(timeout=max(left, 0.0)))
+            except FutureTimeout:
+                outcomes.append((None, '', '', timeout_s * 1000.0))
+                if inprocess and _mark_overdue(hook, env):
+                    _retire(pool)
+    results = []
+    timings = []
+    for hook, (rc, out, err, ms) in zip(hooks, outcomes):
+        label = hook_label(hook['command'])
+        results.append((label, rc, out, err))
+        timings.append((group, label, ms, rc, len(out) + len(err)))
+    verdict = merge(results)
+    timings.append((group, hook_ledger.TOTAL, (time.perf_counter() - t_group) * 1000.0,
+                    verdict[0], len(verdict[1]) + len(verdict[2])))
+    hook_ledger.record(timings)
+    return verdict
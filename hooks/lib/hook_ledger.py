@@ -0,0 +1,88 @@
+"""Append-only per-hook timing ledger.
+
+One line per hook invocation, tab-separated:
+
+    epoch  group  hook  wall_ms  rc  out_bytes  source
+
+  group      Event:Matcher the hook ran under (e.g. PreToolUse:Bash); a row
+             whose hook is TOTAL is the whole group's wall time for that call
+  rc         exit code, or T when the hook hit its timeout (failed open)
+  out_bytes  stdout + stderr size
+  source     live (served by hook_dispatch) or replay (hooks/tests/hook_profile.py)
+
+Live rows cover only the hookd-served groups: a hook Claude Code runs directly
+never passes through hook_dispatch, so it has replay rows only.
+
+Writes are a single O_APPEND write() of one short line, so concurrent writers
+(the daemon, fallback clients, a replay run) never interleave. The file rotates
+to .1 past LEDGER_MAX_BYTES -- one generation, bounded disk. Recording is
+fail-open and can be switched off with CLAUDE_HOOK_LEDGER=0.
+"""
+import math
+import os
+import time
+
+from _state import STATE_DIR
+
+LEDGER = os.path.join(STATE_DIR, 'hook-ledger.tsv')
+LEDGER_MAX_BYTES = 4 * 1024 * 1024
+TOTAL = 'TOTAL'
+
+
+def enabled() -> bool:
+    return os.environ.get('CLAUDE_HOOK_LEDGER', '1') != '0'
+
+
+def record(rows, source: str = 'live', path: str = LEDGER) -> None:
+    """Append (group, hook, wall_ms, rc, out_bytes) rows. Never raises."""
+    if not rows or not enabled():
+        return
+    now = f'{time.time():.3f}'
+    lines = []
+    for group, hook, ms, rc, nbytes in rows:
+        lines.append('\t'.join((now, group, hook, f'{ms:.2f}',
+                                'T' if rc is None else str(rc), str(nbytes), source)))
+    data = ('\n'.join(lines) + '\n').encode()
+    try:
+        try:
+            if os.stat(path).st_size > LEDGER_MAX_BYTES:
+                os.replace(path, path + '.1')
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def read(path: str = LEDGER, since: float = 0.0, source: str | None = None):
+    """Yield (epoch, group, hook, wall_ms, rc, out_bytes, source) from the ledger
+    (rotated generation first). Malformed lines are skipped."""
+    for p in (path + '.1', path):
+        try:
+            fh = open(p)
+        except OSError:
+            continue
+        with fh:
+            for line in fh:
+                f = line.rstrip('\n').split('\t')
+                if len(f) != 7:
+                    continue
+                try:
+                    ts, ms, nbytes = float(f[0]), float(f[3]), int(f[5])
+                except ValueError:
+                    continue
+                if ts < since or (source and f[6] != source):
+                    continue
+                yield ts, f[1], f[2], ms, f[4], nbytes, f[6]
+
+
+def percentile(sorted_vals: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already-sorted list (q in 0..100)."""
+    if not sorted_vals:
+        return 0.0
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(q / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Warm hook daemon: serves whole hook groups over a per-session Unix socket.
+
+Every Bash tool call used to fan out to ~20 hook processes, each paying bash or
+python start-up plus its own json decode. session-init.sh starts ONE of these per
+Claude session; hookd/hookd-client.py (the only command settings.json wires for a
+served group) forwards the payload here and replays the merged verdict. The
+python hooks run in-process with their modules kept warm; the shell guards are
+still spawned, but from an already-running process. See lib/hook_dispatch.py for
+the run/merge rules and hookd/groups.json for what is served.
+
+Socket: $STATE_DIR/<session>-hookd.sock. Wire format (one request/connection):
+  client -> {"group", "cwd", "env"} JSON line, then the raw hook payload, EOF
+  daemon -> {"rc", "stdout", "stderr"} JSON
+
+Served hooks see the daemon (not Claude) as their parent, so `session-$PPID`
+lookups would miss: the client always forwards CLAUDE_SESSION_ID, and the
+PPID-keyed shell hooks prefer it. The daemon exits when the owning Claude process
+is gone. Fail-open everywhere: if it is down, the client runs the group itself.
+
+Usage: hookd.py --session <session_id> --owner <claude_pid>
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _state import STATE_DIR  # noqa: E402
+import hook_dispatch  # noqa: E402
+
+_OWNER_POLL_S = 5
+
+
+def socket_path(session_id: str) -> str:
+    return os.path.join(STATE_DIR, f'{session_id}-hookd.sock')
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _read_request(conn: socket.socket) -> bytes:
+    chunks = []
+    while True:
+        buf = conn.recv(65536)
+        if not buf:
+            return b''.join(chunks)
+        chunks.append(buf)
+
+
+def serve(req: dict, payload: bytes, session_id: str) -> tuple[int, str, str]:
+    """Run the request's group with the caller's env and cwd."""
+    env = dict(req.get('env') or {})
+    env.setdefault('CLAUDE_SESSION_ID', session_id)
+    cwd = req.get('cwd') or os.getcwd()
+    if hook_dispatch.inprocess_running():
+        # An overdue in-process hook from an earlier request is still running
+        # and reading os.environ / cwd: leave them as it saw them and spawn
+        # this group's hooks, each handed the caller's env and cwd explicitly.
+        return hook_dispatch.run_group(req.get('group', ''), payload, env, cwd,
+                                       inprocess=False)
+    # In-process hooks read os.environ / cwd directly; requests are served one
+    # at a time and no earlier hook is still running, so mirroring the
+    # caller's view here is race-free.
+    os.environ.clear()
+    os.environ.update(env)
+    try:
+        os.chdir(cwd)
+    except OSError:
+        pass
+    return hook_dispatch.run_group(req.get('group', ''), payload, env, cwd)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        raw = _read_request(self.request)
+        head, _, payload = raw.partition(b'\n')
+        try:
+            req = json.loads(head)
+        except ValueError:
+            return
+        try:
+            rc, out, err = serve(req, payload, self.server.session_id)
+        except Exception as e:  # never leave the client hanging
+            rc, out, err = 0, '', f'hookd: {e!r}\n'
+        self.request.sendall(json.dumps({'rc': rc, 'stdout': out,
+                                         'stderr': err}).encode())
+
+
+class _Server(socketserver.UnixStreamServer):
+    timeout = _OWNER_POLL_S
+
+    def __init__(self, path, session_id, owner):
+        self.session_id = session_id
+        self.owner = owner
+        self.running = True
+        super().__init__(path, _Handler)
+
+    def handle_timeout(self):
+        if self.owner and not _alive(self.owner):
+            self.running = False
+
+
+def _already_serving(path: str) -> bool:
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(0.5)
+    try:
+        s.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--session', required=True)
+    ap.add_argument('--owner', type=int, default=0)
+    args = ap.parse_args()
+
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = socket_path(args.session)
+    if _already_serving(path):
+        return 0
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+    os.umask(0o077)
+    server = _Server(path, args.session, args.owner)
+    try:
+        while server.running:
+            server.handle_request()
+            # session-init's GC sweeps *-hookd.sock by mtime; keep ours fresh.
+            try:
+                os.utime(path)
+            except OSError:
+                break  # swept or replaced: a newer daemon owns the path
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
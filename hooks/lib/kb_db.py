@@ -0,0 +1,566 @@
+"""Shared read-only access to the KB database for the surfacing hooks.
+
+compose_time_check.py, symbol_surface.py and _canonical_match_cli.py used to each
+open ~/.cache/kb/knowledge.db cold and build `name IN (?,?,...)` statements sized
+to the token set -- a big Read produced a 2000-placeholder statement that SQLite
+had to parse and plan from scratch every call. This module gives them:
+
+  connect()       one read-only connection per thread (mode=ro, query_only,
+                  mmap + page cache pragmas), kept open across calls so the warm
+                  hook daemon pays the open/schema-parse once. Reopened if the
+                  database file is replaced.
+  load_tokens()   fills temp.kb_tokens with a token set; the *_by_tokens
+                  queries join against it instead of inlining placeholders.
+  maybe_symbols() drops tokens that are certainly not a python_symbols name or
+                  notation symbol, via a Bloom filter of both columns kept in
+                  $STATE_DIR/kb-symbols.bloom and rebuilt when knowledge.db
+                  (or its -wal) changes. No false negatives.
+  symbol_map()    canonical/retired python_symbols as an mmap'd sorted table
+                  ($STATE_DIR/kb-symbol-map.bin, bisected per lookup) rebuilt
+                  only when the kb_symbols_version counter (lib/kb_index.py)
+                  moves.
+  SQL / query()   every statement the hooks issue, by name. The SQL text is
+                  fixed, so sqlite3's statement cache re-uses the prepared form.
+  findings_containing() / count_findings_containing()
+                  substring lookups on findings.content: an index probe through
+                  findings_fts (lib/kb_index.py) when present, else LIKE.
+  fraction_hits() the KB-VALUE rarity gate + preview: one kb_frac_rarity
+                  primary-key lookup when that table is current.
+  match_operators() structural_facts operator names present in a text: one word
+                  scan against a set built from the table, cached in-process
+                  and in $STATE_DIR/kb-operators.json keyed on the table's
+                  (row count, max rowid).
+  contract_hits() per-contract count of distinct tokens found in decl_name or
+                  statement: one grouped join over lean_contracts_fts when it
+                  exists, else a LIKE scan per token.
+
+CLAUDE_KB_DB overrides the database path (test isolation, like CLAUDE_STATE_DIR).
+Callers must not close() the shared connection.
+"""
+import array
+import json
+import math
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import zlib
+
+import _state
+
+KB_DB = os.environ.get('CLAUDE_KB_DB') or os.path.expanduser('~/.cache/kb/knowledge.db')
+
+_PRAGMAS = (
+    'PRAGMA query_only = ON',
+    'PRAGMA mmap_size = 268435456',   # 256 MiB: read pages straight from the page cache
+    'PRAGMA cache_size = -16384',     # 16 MiB
+    'PRAGMA temp_store = MEMORY',     # temp.kb_tokens never touches disk
+)
+
+_TOKENS = 'SELECT tok FROM temp.kb_tokens'
+
+_SYMBOL_COLS = 'name, kind, status, module, file, line, redirect_to'
+_NOTATION_BASE = (
+    'SELECT current_symbol, meaning FROM notations '
+    f'WHERE current_symbol IN ({_TOKENS}) AND meaning IS NOT NULL '
+    "AND (meaning_source IS NULL OR meaning_source != 'generic-fallback')"
+)
+_MEANINGFUL = " AND meaning != '' AND meaning != '?'"
+_CONTRACT_COLS = ('id, file, line, decl_name, file_status, discharge_target, '
+                  'contract_awaiting, proof_grade, data_blocked_on')
+CONTRACTS_PER_TOKEN = 3  # contracts a single token may count toward
+
+
+def _contracts_fts_hits(where: str) -> str:
+    return (f'SELECT {_CONTRACT_COLS}, COUNT(DISTINCT tok) FROM ('
+            f'  SELECT c.{_CONTRACT_COLS.replace(", ", ", c.")}, t.tok, '
+            '         ROW_NUMBER() OVER (PARTITION BY t.tok ORDER BY c.rowid) AS rn '
+            f'  FROM ({_TOKENS}) t '
+            '  JOIN lean_contracts_fts ON lean_contracts_fts MATCH '
+            """  '{decl_name statement} : "' || replace(t.tok, '"', '""') || '"' """
+            '  JOIN lean_contracts c ON c.rowid = lean_contracts_fts.rowid '
+            f"  WHERE {where}c.file NOT LIKE '%/archive/%'"
+            ') WHERE rn <= ? GROUP BY id')
+
+SQL = {
+    # python_symbols exact-name match against the loaded token set
+    'symbols_by_tokens':
+        f'SELECT {_SYMBOL_COLS} FROM python_symbols WHERE name IN ({_TOKENS}) LIMIT ?',
+    'symbols_by_tokens_in_project':
+        f'SELECT {_SYMBOL_COLS} FROM python_symbols '
+        f'WHERE name IN ({_TOKENS}) AND project = ? LIMIT ?',
+    'canonical_and_retired':
+        'SELECT name, module, status, redirect_to FROM python_symbols '
+        "WHERE status IN ('canonical','retired')",
+    # notations (generic-fallback meanings skipped); *_meaningful also drops ''/'?'
+    'notations_by_tokens': _NOTATION_BASE + ' LIMIT ?',
+    'notations_by_tokens_in_project':
+        _NOTATION_BASE + ' AND (project IS NULL OR project = ?) LIMIT ?',
+    'meaningful_notations_by_tokens': _NOTATION_BASE + _MEANINGFUL + ' LIMIT ?',
+    'meaningful_notations_by_tokens_in_project':
+        _NOTATION_BASE + _MEANINGFUL + ' AND (project IS NULL OR project = ?) LIMIT ?',
+    # findings containing a literal value (e.g. a fraction)
+    'findings_like_count': 'SELECT COUNT(*) FROM findings WHERE content LIKE ?',
+    'findings_like_count_in_project':
+        'SELECT COUNT(*) FROM findings WHERE content LIKE ? AND project = ?',
+    'findings_like': 'SELECT id, summary FROM findings WHERE content LIKE ? LIMIT ?',
+    'findings_like_in_project':
+        'SELECT id, summary FROM findings WHERE content LIKE ? AND project = ? LIMIT ?',
+    # same, probed through the trigram index (lib/kb_index.py) when it exists
+    'findings_fts_count':
+        'SELECT COUNT(*) FROM findings_fts WHERE findings_fts MATCH ?',
+    'findings_fts_count_in_project':
+        'SELECT COUNT(*) FROM findings_fts WHERE findings_fts MATCH ? AND project = ?',
+    'findings_fts':
+        'SELECT f.id, f.summary FROM findings_fts JOIN findings f ON f.rowid = findings_fts.rowid '
+        'WHERE findings_fts MATCH ? LIMIT ?',
+    'findings_fts_in_project':
+        'SELECT f.id, f.summary FROM findings_fts JOIN findings f ON f.rowid = findings_fts.rowid '
+        'WHERE findings_fts MATCH ? AND f.project = ? LIMIT ?',
+    # precomputed fraction rarity (lib/kb_index.py); stale while kb_frac_dirty is non-empty
+    'frac_rarity': 'SELECT n, top_rids FROM kb_frac_rarity WHERE frac = ? AND project = ?',
+    'frac_rarity_pending': 'SELECT 1 FROM kb_frac_dirty LIMIT 1',
+    'finding_by_rowid': 'SELECT id, summary FROM findings WHERE rowid = ?',
+    # open sorry-contracts mentioning a token
+    'contracts_like':
+        f'SELECT {_CONTRACT_COLS} FROM lean_contracts '
+        "WHERE (decl_name LIKE ? OR statement LIKE ?) AND file NOT LIKE '%/archive/%' "
+        'ORDER BY rowid LIMIT ?',
+    'contracts_like_in_project':
+        f'SELECT {_CONTRACT_COLS} FROM lean_contracts '
+        'WHERE (decl_name LIKE ? OR statement LIKE ?) AND project = ? '
+        "AND file NOT LIKE '%/archive/%' ORDER BY rowid LIMIT ?",
+    # every loaded token against the contracts trigram index, grouped per contract;
+    # like the LIKE loop, at most ? contracts (lowest rowids) count per token
+    'contracts_fts_hits': _contracts_fts_hits(''),
+    'contracts_fts_hits_in_project': _contracts_fts_hits('c.project = ? AND '),
+    # structural facts (operator catalog + per-operator lookup)
+    'structural_operators':
+        'SELECT DISTINCT lhs_operator, rhs_operator FROM structural_facts',
+    # facts mentioning any loaded operator, at most ? rows per operator
+    'structural_facts_for_operators':
+        'SELECT id, relation_type, lhs_operator, rhs_operator, result_exact, '
+        '       negative, certified_data_key, lean_thm, notes FROM ('
+        '  SELECT s.*, ROW_NUMBER() OVER (PARTITION BY t.tok ORDER BY s.rowid) AS rn '
+        f'  FROM ({_TOKENS}) t JOIN structural_facts s '
+        "  ON s.lhs_operator LIKE '%' || t.tok || '%' OR s.rhs_operator LIKE '%' || t.tok || '%'"
+        ') WHERE rn <= ?',
+    'structural_facts_version': 'SELECT COUNT(*), MAX(rowid) FROM structural_facts',
+    # every name the *_by_tokens queries can match (Bloom filter source)
+    'symbol_names':
+        'SELECT name FROM python_symbols UNION SELECT current_symbol FROM notations',
+    # trigger-maintained by kb_index.py; absent until it has run
+    'symbols_version': 'SELECT v FROM kb_symbols_version',
+}
+
+_local = threading.local()
+
+
+def connect(path: str | None = None, timeout: float = 3) -> sqlite3.Connection | None:
+    """Return this thread's shared read-only connection, or None if the KB is
+    absent or unreadable. Cheap after the first call (one stat)."""
+    path = path or KB_DB
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    ident = (path, st.st_dev, st.st_ino)
+    cached = getattr(_local, 'conn', None)
+    if cached and cached[0] == ident:
+        return cached[1]
+    if cached:
+        try:
+            cached[1].close()
+        except Exception:
+            pass
+        _local.conn = None
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=timeout,
+                               isolation_level=None, cached_statements=64)
+        for p in _PRAGMAS:
+            conn.execute(p)
+    except sqlite3.Error:
+        return None
+    _local.conn = (ident, conn)
+    return conn
+
+
+def has_table(conn: sqlite3.Connection, name: str) -> bool:
+    try:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                            (name,)).fetchone() is not None
+    except sqlite3.Error:
+        return False
+
+
+def load_tokens(conn: sqlite3.Connection, tokens) -> None:
+    """Replace the contents of temp.kb_tokens with `tokens` (deduplicated).
+    query_only is lifted only for this temp-schema write; the main database is
+    opened mode=ro and stays unwritable regardless."""
+    conn.execute('PRAGMA query_only = OFF')
+    try:
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS kb_tokens (tok TEXT PRIMARY KEY) WITHOUT ROWID')
+        conn.execute('BEGIN')
+        try:
+            conn.execute('DELETE FROM temp.kb_tokens')
+            conn.executemany('INSERT OR IGNORE INTO temp.kb_tokens VALUES (?)',
+                             ((t,) for t in tokens))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.execute('PRAGMA query_only = ON')
+
+
+def _db_file(conn: sqlite3.Connection) -> str:
+    return conn.execute('PRAGMA database_list').fetchone()[2]
+
+
+SYMBOLS_BLOOM = os.path.join(_state.STATE_DIR, 'kb-symbols.bloom')
+_BLOOM_FP = 0.01
+_bloom: tuple | None = None  # (key, m, k, bits)
+
+
+def _bloom_positions(tok: str, m: int, k: int):
+    # Double hashing over two C-speed checksums: the filter is probed once per
+    # token of a large Read, so a cryptographic hash would cost more than the
+    # SQLite work it saves.
+    e = tok.encode('utf-8', 'surrogatepass')
+    h1 = zlib.crc32(e)
+    h2 = zlib.adler32(e) | 1
+    return ((h1 + i * h2) % m for i in range(k))
+
+
+def _db_version(db: str) -> list:
+    key = [db]
+    for f in (db, db + '-wal'):
+        try:
+            st = os.stat(f)
+            key += [st.st_mtime_ns, st.st_size]
+        except OSError:
+            key += [0, 0]
+    return key
+
+
+def _load_bloom(conn: sqlite3.Connection) -> tuple | None:
+    """(key, m, k, bits) for the current database, from memory, the file, or a
+    rebuild. None if the symbol tables are unreadable."""
+    global _bloom
+    try:
+        key = _db_version(_db_file(conn))
+    except sqlite3.Error:
+        return None
+    if _bloom and _bloom[0] == key:
+        return _bloom
+    try:
+        with open(SYMBOLS_BLOOM, 'rb') as fh:
+            head = json.loads(fh.readline())
+            if head.get('key') == key:
+                _bloom = (key, head['m'], head['k'], fh.read())
+                return _bloom
+    except Exception:
+        pass
+    try:
+        names = [n for (n,) in query(conn, 'symbol_names') if n]
+    except sqlite3.Error:
+        return None
+    m = max(64, math.ceil(-len(names) * math.log(_BLOOM_FP) / math.log(2) ** 2))
+    k = max(1, round(m / max(len(names), 1) * math.log(2)))
+    bits = bytearray((m + 7) // 8)
+    for n in names:
+        for i in _bloom_positions(n, m, k):
+            bits[i >> 3] |= 1 << (i & 7)
+    _bloom = (key, m, k, bytes(bits))
+    try:
+        tmp = f'{SYMBOLS_BLOOM}.{os.getpid()}'
+        with open(tmp, 'wb') as fh:
+            fh.write(json.dumps({'key': key, 'm': m, 'k': k, 'n': len(names)}).encode() + b'\n')
+            fh.write(_bloom[3])
+        os.replace(tmp, SYMBOLS_BLOOM)
+    except OSError:
+        pass
+    return _bloom
+
+
+def maybe_symbols(conn: sqlite3.Connection, tokens) -> list[str]:
+    """The subset of `tokens` that may be a python_symbols name or notation
+    symbol (~1% false positives, no false negatives). All of them if the filter
+    cannot be built."""
+    bloom = _load_bloom(conn)
+    if bloom is None:
+        return list(tokens)
+    _, m, k, bits = bloom
+    kept = []
+    for t in tokens:
+        for i in _bloom_positions(t, m, k):
+            if not bits[i >> 3] & (1 << (i & 7)):
+                break
+        else:
+            kept.append(t)
+    return kept
+
+
+SYMBOL_MAP = os.path.join(_state.STATE_DIR, 'kb-symbol-map.bin')
+_symbol_map: tuple | None = None  # (key, SymbolTable)
+
+
+class SymbolTable:
+    """Read-only name -> (module, status, redirect_to) map over an mmap'd file:
+
+        {"key": ..., "n": N, "data": D}\n   JSON header, padded to 4 bytes
+        N x uint32                          record offsets, sorted by name
+        name US module US status US redirect LF   records, from byte D
+
+    Opening reads only the header; a lookup is a bisection over the offsets
+    touching ~log2(N) names, so nothing is decoded that is not asked for."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as fh:
+            self.head = json.loads(fh.readline())
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        n, self._data = self.head['n'], self.head['data']
+        start = self._data - 4 * n
+        self._offs = memoryview(self._mm)[start:self._data].cast('I')
+
+    def __len__(self) -> int:
+        return len(self._offs)
+
+    def _find(self, name: str) -> int:
+        key, mm, offs, data = name.encode('utf-8', 'surrogatepass'), self._mm, self._offs, self._data
+        lo, hi = 0, len(offs)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            at = data + offs[mid]
+            probe = mm[at:mm.find(b'\x1f', at)]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return at
+        return -1
+
+    def __contains__(self, name: str) -> bool:
+        return self._find(name) >= 0
+
+    def __getitem__(self, name: str) -> tuple:
+        at = self._find(name)
+        if at < 0:
+            raise KeyError(name)
+        _, module, status, redir = self._mm[at:self._mm.find(b'\n', at)].decode(
+            'utf-8', 'surrogatepass').split('\x1f')
+        return module, status, redir or None
+
+    def get(self, name: str, default=None):
+        at = self._find(name)
+        return default if at < 0 else self[name]
+
+
+def _write_symbol_table(path: str, key: list, rows) -> None:
+    recs = sorted({(n or '').encode('utf-8', 'surrogatepass'): '\x1f'.join(
+        (m or '', s or '', r or '')).encode('utf-8', 'surrogatepass')
+        for n, m, s, r in rows if n and '\x1f' not in n and '\n' not in n}.items())
+    body, offs = bytearray(), array.array('I')
+    for name, rest in recs:
+        offs.append(len(body))
+        body += name + b'\x1f' + rest + b'\n'
+    # header line (fixed-width "data" field, padded to a 4-byte boundary), offsets
+    prefix = json.dumps({'key': key, 'n': len(offs)}).encode()[:-1] + b', "data": '
+    width = len(prefix) + 10 + len(b'}\n')
+    pad = -width % 4
+    data = width + pad + 4 * len(offs)
+    line = prefix + b'%10d}' % data + b' ' * pad + b'\n'
+    tmp = f'{path}.{os.getpid()}'
+    with open(tmp, 'wb') as fh:
+        fh.write(line)
+        fh.write(offs.tobytes())
+        fh.write(body)
+    os.replace(tmp, path)
+
+
+def symbol_map(conn: sqlite3.Connection):
+    """name -> (module, status, redirect_to) for every canonical/retired
+    python_symbols row, as a SymbolTable over $STATE_DIR/kb-symbol-map.bin
+    (or a plain dict if the file cannot be written). The file is rebuilt only
+    when its key changes: the kb_symbols_version counter (kb_index.py) when
+    installed, else the database file's stat like the Bloom filter. Raises
+    sqlite3.Error if the table is unreadable."""
+    global _symbol_map
+    db = _db_file(conn)
+    try:
+        key = [db, 'v', query(conn, 'symbols_version')[0][0]]
+    except (sqlite3.Error, IndexError):
+        key = _db_version(db)
+    if _symbol_map and _symbol_map[0] == key:
+        return _symbol_map[1]
+    try:
+        table = SymbolTable(SYMBOL_MAP)
+        if table.head.get('key') == key:
+            _symbol_map = (key, table)
+            return table
+    except Exception:
+        pass
+    rows = query(conn, 'canonical_and_retired')
+    try:
+        _write_symbol_table(SYMBOL_MAP, key, rows)
+        table = SymbolTable(SYMBOL_MAP)
+    except (OSError, ValueError):
+        table = {n: (m, s, r) for n, m, s, r in rows}
+    _symbol_map = (key, table)
+    return table
+
+
+def query(conn: sqlite3.Connection, name: str, *params) -> list[tuple]:
+    """Run the named statement from SQL and return all rows."""
+    return conn.execute(SQL[name], params).fetchall()
+
+
+def scoped(name: str, project: str | None) -> tuple[str, tuple]:
+    """(query name, project params) -- the *_in_project variant when a project is
+    known. Project params go after the match params, before the LIMIT."""
+    return (f'{name}_in_project', (project,)) if project else (name, ())
+
+
+def _fts_ok(conn: sqlite3.Connection, value: str) -> bool:
+    # trigram needs >= 3 chars to probe; shorter values fall back to LIKE
+    return len(value) >= 3 and has_table(conn, 'findings_fts')
+
+
+def _content_phrase(value: str) -> str:
+    return 'content : "' + value.replace('"', '""') + '"'
+
+
+def count_findings_containing(conn: sqlite3.Connection, value: str,
+                              project: str | None = None) -> int:
+    """How many findings' content contains `value` (substring, like LIKE '%v%')."""
+    if _fts_ok(conn, value):
+        q, pp = scoped('findings_fts_count', project)
+        return query(conn, q, _content_phrase(value), *pp)[0][0]
+    q, pp = scoped('findings_like_count', project)
+    return query(conn, q, f'%{value}%', *pp)[0][0]
+
+
+def findings_containing(conn: sqlite3.Connection, value: str, project: str | None = None,
+                        limit: int = 2) -> list[tuple]:
+    """(id, summary) of findings whose content contains `value`."""
+    if _fts_ok(conn, value):
+        q, pp = scoped('findings_fts', project)
+        return query(conn, q, _content_phrase(value), *pp, limit)
+    q, pp = scoped('findings_like', project)
+    return query(conn, q, f'%{value}%', *pp, limit)
+
+
+def fraction_hits(conn: sqlite3.Connection, frac: str, project: str | None,
+                  limit: int, max_count: int) -> tuple[int, list[tuple]]:
+    """(number of findings mentioning `frac`, up to `limit` (id, summary) of
+    them). The rows are only fetched when the count is under `max_count` (the
+    callers' rarity gate). Served from kb_frac_rarity when it exists and has no
+    pending refresh; otherwise counted through findings_fts / LIKE."""
+    if project and has_table(conn, 'kb_frac_rarity') \
+            and not query(conn, 'frac_rarity_pending'):
+        hit = query(conn, 'frac_rarity', frac, project)
+        if not hit:
+            return 0, []
+        n, top = hit[0]
+        if n >= max_count:
+            return n, []
+        rows = []
+        for rid in top.split()[:limit]:
+            rows.extend(query(conn, 'finding_by_rowid', int(rid)))
+        return n, rows
+    n = count_findings_containing(conn, frac, project)
+    if n >= max_count:
+        return n, []
+    return n, findings_containing(conn, frac, project, limit)
+
+
+def contract_hits(conn: sqlite3.Connection, tokens, project: str | None = None) -> dict[str, list]:
+    """cid -> [distinct tokens matched, (file, line, decl_name, file_status,
+    discharge_target, contract_awaiting, proof_grade, data_blocked_on)] for
+    non-archived contracts whose decl_name or statement contains a token
+    (case-insensitive substring). A token counts toward at most
+    CONTRACTS_PER_TOKEN contracts, the lowest rowids, on either path. Tokens
+    must be >= 3 chars for the index."""
+    hits: dict[str, list] = {}
+    if has_table(conn, 'lean_contracts_fts') and all(len(t) >= 3 for t in tokens):
+        load_tokens(conn, tokens)
+        q, pp = scoped('contracts_fts_hits', project)
+        for row in query(conn, q, *pp, CONTRACTS_PER_TOKEN):
+            hits[row[0]] = [row[-1], row[1:-1]]
+        return hits
+    q, pp = scoped('contracts_like', project)
+    for tok in tokens:
+        for row in query(conn, q, f'%{tok}%', f'%{tok}%', *pp, CONTRACTS_PER_TOKEN):
+            entry = hits.setdefault(row[0], [0, row[1:]])
+            entry[0] += 1
+    return hits
+
+
+OPERATORS_CACHE = os.path.join(_state.STATE_DIR, 'kb-operators.json')
+_WORD = re.compile(r'\w+')
+_operators: tuple | None = None  # (key, word-only ops, [(op, compiled)] for the rest)
+
+
+def _operator_names(conn: sqlite3.Connection) -> list[str]:
+    # Split composite names like 'shift_matrix_sq_48 / M_full_48'
+    ops = set()
+    for lhs, rhs in query(conn, 'structural_operators'):
+        for side in (lhs, rhs):
+            for part in re.split(r'[/\s]+', side or ''):
+                if len(part) >= 3:
+                    ops.add(part)
+    return sorted(ops)
+
+
+def _load_operators(conn: sqlite3.Connection) -> tuple:
+    global _operators
+    try:
+        db = conn.execute('PRAGMA database_list').fetchone()[2]
+        key = [db, *query(conn, 'structural_facts_version')[0]]
+    except sqlite3.Error:
+        key = None
+    if key and _operators and _operators[0] == key:
+        return _operators
+    ops = None
+    if key:
+        try:
+            with open(OPERATORS_CACHE) as fh:
+                cached = json.load(fh)
+            if cached.get('key') == key:
+                ops = cached['ops']
+        except Exception:
+            pass
+    if ops is None:
+        ops = _operator_names(conn)
+        if key:
+            try:
+                tmp = f'{OPERATORS_CACHE}.{os.getpid()}'
+                with open(tmp, 'w') as fh:
+                    json.dump({'key': key, 'ops': ops}, fh)
+                os.replace(tmp, OPERATORS_CACHE)
+            except OSError:
+                pass
+    # \bop\b on an all-word-char op matches exactly a whole \w+ run of the
+    # text, so those are a set lookup; anything with punctuation keeps its regex.
+    words = frozenset(op for op in ops if _WORD.fullmatch(op))
+    others = [(op, re.compile(r'\b' + re.escape(op) + r'\b')) for op in ops if op not in words]
+    _operators = (key, words, others)
+    return _operators
+
+
+def match_operators(conn: sqlite3.Connection, text: str) -> set[str]:
+    """Known structural_facts operator names (parts >= 3 chars) that occur in
+    `text` with word boundaries."""
+    _, words, others = _load_operators(conn)
+    found = set(words.intersection(_WORD.findall(text)))
+    found.update(op for op, rx in others if rx.search(text))
+    return found
+
+
+def structural_facts_for(conn: sqlite3.Connection, ops, per_op: int = 4) -> list[tuple]:
+    """structural_facts rows whose lhs/rhs operator contains any of `ops`, at
+    most `per_op` per operator, in one query."""
+    load_tokens(conn, ops)
+    return query(conn, 'structural_facts_for_operators', per_op)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""Derived indexes on the KB database that the surfacing hooks read.
+
+The KB server owns knowledge.db; the hooks only read it (lib/kb_db.py). Some of
+their lookups, though, have no usable index in the server's schema -- a
+substring match on findings.content is a full scan per call. This module adds
+shadow structures NEXT to the server's tables and keeps them in sync with SQL
+triggers, so the server needs no code change and every write path (server,
+migrations, manual sqlite3) maintains them:
+
+  findings_fts   FTS5 external-content table over findings(content, summary,
+                 project) with the trigram tokenizer: `content LIKE '%17/24%'`
+                 becomes an index probe. Kept current by findings_fts_ai/_ad/_au.
+  lean_contracts_fts
+                 the same over lean_contracts(decl_name, statement): a prompt's
+                 contract tokens are scored against every contract in one
+                 grouped join instead of a LIKE scan per token.
+  kb_frac_rarity fraction -> (project, findings count, first finding rowids):
+                 the KB-VALUE rarity gate and its preview in one primary-key
+                 lookup. Built from kb_finding_fracs (fraction tokens per
+                 finding). SQL cannot run the fraction regex, so the triggers
+                 only queue changed rowids in kb_frac_dirty and ensure()
+                 re-extracts them; readers fall back to findings_fts while the
+                 queue is non-empty, so a stale count is never served.
+
+  kb_symbols_version
+                 a counter bumped by triggers on every python_symbols write;
+                 the symbol snapshot the hooks load (kb_db.symbol_map) is
+                 keyed on it.
+
+ensure() is idempotent and cheap when everything already exists (one read-only
+schema check), and drains the rarity queue; session-init.sh runs it in the
+background at session start, kb-search-track.sh after a KB write (`kb add`/
+`kb correct`, or the MCP kb_add/kb_correct). It never creates an FTS index that a KB writer cannot maintain -- the triggers run
+inside kb.py's own INSERTs, under $KB_VENV's sqlite, so a build there without
+FTS5/trigram would fail every KB write -- and skips any source table that is
+WITHOUT ROWID (external content needs rowids). An FTS index whose triggers had
+to be re-created is rebuilt from its source: rows written while they were
+missing never reached it. Likewise, any missing rarity object re-queues every
+finding.
+
+Usage: kb_index.py [--db PATH] [--rebuild]
+"""
+import argparse
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import kb_db  # noqa: E402
+
+FTS_TABLE = 'findings_fts'
+KB_VENV = os.environ.get('KB_VENV', os.path.expanduser('~/Projects/ai/kb/.venv/bin/python'))
+CONTRACTS_FTS = 'lean_contracts_fts'
+
+
+def _fts_ddl(name: str, source: str, cols: tuple[str, ...],
+             unindexed: tuple[str, ...] = ()) -> tuple[str, ...]:
+    """Trigram external-content FTS5 table over `source` plus the three sync
+    triggers."""
+    allc = cols + unindexed
+    decl = ', '.join(cols + tuple(f'{c} UNINDEXED' for c in unindexed))
+    names = ', '.join(allc)
+    new = ', '.join(f'new.{c}' for c in allc)
+    old = ', '.join(f'old.{c}' for c in allc)
+    ins = f'INSERT INTO {name}(rowid, {names}) VALUES (new.rowid, {new}); '
+    dele = f"INSERT INTO {name}({name}, rowid, {names}) VALUES ('delete', old.rowid, {old}); "
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5({decl}, "
+        f"content='{source}', content_rowid='rowid', tokenize='trigram')",
+        f'CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {source} BEGIN {ins}END',
+        f'CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {source} BEGIN {dele}END',
+        f'CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE ON {source} BEGIN {dele}{ins}END',
+    )
+
+
+# name -> (source table, DDL)
+_FTS = {
+    FTS_TABLE: ('findings', _fts_ddl(FTS_TABLE, 'findings', ('content', 'summary'), ('project',))),
+    CONTRACTS_FTS: ('lean_contracts', _fts_ddl(CONTRACTS_FTS, 'lean_contracts',
+                                               ('decl_name', 'statement'))),
+}
+
+
+def _fts_objects(name: str) -> set[str]:
+    return {name, f'{name}_ai', f'{name}_ad', f'{name}_au'}
+
+# Same token the hooks extract (symbol_surface.extract_fractions).
+FRAC_RE = re.compile(r'\b(\d{1,4}/\d{1,4})\b')
+RARITY_TOP = 2  # preview rows the hooks show per fraction
+
+_RARITY_DDL = (
+    'CREATE TABLE IF NOT EXISTS kb_finding_fracs ('
+    'frac TEXT NOT NULL, project TEXT NOT NULL, rid INTEGER NOT NULL, '
+    'PRIMARY KEY (frac, project, rid)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS kb_finding_fracs_rid ON kb_finding_fracs(rid)',
+    'CREATE TABLE IF NOT EXISTS kb_frac_rarity ('
+    'frac TEXT NOT NULL, project TEXT NOT NULL, n INTEGER NOT NULL, top_rids TEXT NOT NULL, '
+    'PRIMARY KEY (frac, project)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS kb_frac_dirty (rid INTEGER PRIMARY KEY)',
+    'CREATE TRIGGER IF NOT EXISTS kb_frac_dirty_ai AFTER INSERT ON findings BEGIN '
+    'INSERT OR IGNORE INTO kb_frac_dirty VALUES (new.rowid); END',
+    'CREATE TRIGGER IF NOT EXISTS kb_frac_dirty_ad AFTER DELETE ON findings BEGIN '
+    'INSERT OR IGNORE INTO kb_frac_dirty VALUES (old.rowid); END',
+    'CREATE TRIGGER IF NOT EXISTS kb_frac_dirty_au AFTER UPDATE OF content, project ON findings BEGIN '
+    'INSERT OR IGNORE INTO kb_frac_dirty VALUES (old.rowid); '
+    'INSERT OR IGNORE INTO kb_frac_dirty VALUES (new.rowid); END',
+)
+_RARITY_OBJECTS = {'kb_finding_fracs', 'kb_frac_rarity', 'kb_frac_dirty',
+                   'kb_frac_dirty_ai', 'kb_frac_dirty_ad', 'kb_frac_dirty_au'}
+
+
+# python_symbols change counter: kb_db.symbol_map() keys its snapshot on it, so
+# the snapshot is rebuilt when a symbol changes, not on every KB write.
+SYMBOLS_VERSION = 'kb_symbols_version'
+_SYMVER_DDL = (
+    f'CREATE TABLE IF NOT EXISTS {SYMBOLS_VERSION} (id INTEGER PRIMARY KEY CHECK (id = 0), '
+    'v INTEGER NOT NULL)',
+    f'INSERT OR IGNORE INTO {SYMBOLS_VERSION} VALUES (0, 1)',
+) + tuple(
+    f'CREATE TRIGGER IF NOT EXISTS {SYMBOLS_VERSION}_{sfx} AFTER {ev} ON python_symbols BEGIN '
+    f'UPDATE {SYMBOLS_VERSION} SET v = v + 1; END'
+    for sfx, ev in (('ai', 'INSERT'), ('ad', 'DELETE'), ('au', 'UPDATE')))
+_SYMVER_OBJECTS = {SYMBOLS_VERSION, f'{SYMBOLS_VERSION}_ai', f'{SYMBOLS_VERSION}_ad',
+                   f'{SYMBOLS_VERSION}_au'}
+
+
+def _schema_names(conn: sqlite3.Connection) -> set[str]:
+    return {r[0] for r in conn.execute('SELECT name FROM sqlite_master')}
+
+
+_TRIGRAM_PROBE = ('import sqlite3; sqlite3.connect(":memory:").execute('
+                  '"CREATE VIRTUAL TABLE t USING fts5(x, tokenize=\'trigram\')")')
+
+
+def trigram_available(python: str | None = None) -> bool:
+    """Whether the sqlite of `python` (default: this interpreter) has FTS5 with
+    the trigram tokenizer."""
+    if python is not None:
+        try:
+            return subprocess.run([python, '-c', _TRIGRAM_PROBE], capture_output=True,
+                                  timeout=30).returncode == 0
+        except (OSError, subprocess.SubprocessError):
+            return False
+    try:
+        c = sqlite3.connect(':memory:')
+        c.execute("CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram')")
+        c.close()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def writers_have_trigram() -> bool:
+    """The hooks (this interpreter) read the FTS tables; kb.py under $KB_VENV
+    fires their triggers on every write. Both sqlite builds must support them."""
+    if not trigram_available():
+        return False
+    if os.path.isfile(KB_VENV) and os.path.realpath(KB_VENV) != os.path.realpath(sys.executable):
+        return trigram_available(KB_VENV)
+    return True
+
+
+def _has_rowid(conn: sqlite3.Connection, table: str) -> bool:
+    try:
+        conn.execute(f'SELECT rowid FROM {table} LIMIT 1')
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def _refresh_rarity(conn: sqlite3.Connection) -> int:
+    """Re-extract fractions for every queued finding and recompute the rarity
+    rows they touch. Runs inside the caller's write transaction. Returns the
+    number of findings processed."""
+    rids = [r for (r,) in conn.execute('SELECT rid FROM kb_frac_dirty')]
+    affected: set[tuple[str, str]] = set()
+    for rid in rids:
+        affected.update(conn.execute(
+            'SELECT frac, project FROM kb_finding_fracs WHERE rid = ?', (rid,)).fetchall())
+        conn.execute('DELETE FROM kb_finding_fracs WHERE rid = ?', (rid,))
+        row = conn.execute('SELECT content, project FROM findings WHERE rowid = ?',
+                           (rid,)).fetchone()
+        if row:
+            project = row[1] or ''
+            for frac in set(FRAC_RE.findall(row[0] or '')):
+                conn.execute('INSERT OR IGNORE INTO kb_finding_fracs VALUES (?, ?, ?)',
+                             (frac, project, rid))
+                affected.add((frac, project))
+        conn.execute('DELETE FROM kb_frac_dirty WHERE rid = ?', (rid,))
+    for frac, project in affected:
+        hits = [r for (r,) in conn.execute(
+            'SELECT rid FROM kb_finding_fracs WHERE frac = ? AND project = ? ORDER BY rid',
+            (frac, project))]
+        if hits:
+            conn.execute('INSERT OR REPLACE INTO kb_frac_rarity VALUES (?, ?, ?, ?)',
+                         (frac, project, len(hits), ' '.join(map(str, hits[:RARITY_TOP]))))
+        else:
+            conn.execute('DELETE FROM kb_frac_rarity WHERE frac = ? AND project = ?',
+                         (frac, project))
+    return len(rids)
+
+
+def ensure(path: str | None = None, rebuild: bool = False) -> list[str]:
+    """Create any missing derived index (and backfill it), then drain the
+    rarity queue. Returns what was done."""
+    path = path or kb_db.KB_DB
+    if not os.path.exists(path):
+        return []
+    ro = kb_db.connect(path)
+    if ro is None:
+        return []
+    names = _schema_names(ro)
+    if 'findings' not in names or not _has_rowid(ro, 'findings'):
+        return []
+    need_fts = [name for name, (source, _) in _FTS.items()
+                if (rebuild or not _fts_objects(name) <= names)
+                and source in names and _has_rowid(ro, source)]
+    if need_fts and not writers_have_trigram():
+        need_fts = []
+    need_rarity = rebuild or not _RARITY_OBJECTS <= names
+    need_symver = 'python_symbols' in names and (rebuild or not _SYMVER_OBJECTS <= names)
+    if not need_fts and not need_rarity and not need_symver and \
+            ro.execute('SELECT 1 FROM kb_frac_dirty LIMIT 1').fetchone() is None:
+        return []
+
+    done = []
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            have = _schema_names(conn)
+            for name in need_fts:
+                for ddl in _FTS[name][1]:
+                    conn.execute(ddl)
+                # New, or its triggers were missing: either way re-read the source.
+                conn.execute(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+                done.append(f'{name}: built' if name not in have or rebuild
+                            else f'{name}: triggers restored, rebuilt')
+            if need_rarity:
+                for ddl in _RARITY_DDL:
+                    conn.execute(ddl)
+                # Any missing piece (a trigger included) may have let writes go
+                # unqueued: recount every finding, not just a new table's.
+                conn.execute('DELETE FROM kb_finding_fracs')
+                conn.execute('DELETE FROM kb_frac_rarity')
+                conn.execute('INSERT OR IGNORE INTO kb_frac_dirty SELECT rowid FROM findings')
+            if need_symver:
+                for ddl in _SYMVER_DDL:
+                    conn.execute(ddl)
+                conn.execute(f'UPDATE {SYMBOLS_VERSION} SET v = v + 1')
+                done.append(f'{SYMBOLS_VERSION}: triggers installed')
+            n = _refresh_rarity(conn)
+            if n:
+                done.append(f'kb_frac_rarity: {n} findings refreshed')
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+    return done
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('--db', default=kb_db.KB_DB)
+    ap.add_argument('--rebuild', action='store_true', help='rebuild indexes from scratch')
+    args = ap.parse_args()
+    try:
+        for line in ensure(args.db, args.rebuild):
+            print(line)
+    except sqlite3.Error as e:
+        sys.stderr.write(f'kb_index: {e}\n')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
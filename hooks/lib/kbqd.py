@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""Resident kb query service: serves read-only `kb.py` commands over a Unix socket.
+
+kb-prompt-surface.py ran `$KB_VENV kb.py search ... --json` on every
+UserPromptSubmit -- venv interpreter start-up, the kb.py import (numpy, HTTP
+client, sqlite) and whatever kb opens at module level, all before the embedding
+request, inside the prompt's critical path. This process runs under $KB_VENV,
+imports kb.py ONCE and runs each request's command in-process: its argv is
+handed to kb's `main()` (or, if kb.py has none, the script is re-run as
+__main__ with its imports already cached) with stdout/stderr captured. Anything
+kb keeps at module scope -- DB connection, HTTP session -- stays open between
+requests. kb.py is reloaded when its mtime changes.
+
+One service per user (kb is shared by every session), socket $STATE_DIR/kbqd.sock,
+single instance under an flock. Requests are served one at a time, each with the
+caller's env and cwd (kb reads KB_* knobs and the session id from env). Only
+READ_ONLY commands are accepted: writes keep going through the CLI. The service
+exits after IDLE_EXIT seconds without a request. Started by session-init.sh, and
+by query() when it finds no service; callers fall back to the CLI when query()
+returns None.
+
+Because requests are serial, one hung kb call (embedding server down, a lock)
+would stall every later one. A watchdog therefore ends the whole process when a
+request outlives its caller's timeout (at most REQUEST_TIMEOUT): query()
+reports the timeout (rc None) -- the caller's budget is spent, so it does not
+re-run the command through the CLI -- and the next query() starts a fresh
+service.
+
+Wire format (one request/connection), as lib/hookd.py:
+  client  -> {"argv", "script", "cwd", "env", "timeout"} JSON, EOF
+  service -> {"rc", "stdout", "stderr"} JSON
+
+Usage: kbqd.py KB_SCRIPT   (run with the KB venv interpreter)
+"""
+import contextlib
+import fcntl
+import importlib.util
+import io
+import json
+import os
+import runpy
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _state import STATE_DIR  # noqa: E402
+
+READ_ONLY = frozenset(('search', 'get', 'list'))
+IDLE_EXIT = 1800
+REQUEST_TIMEOUT = 10  # seconds; a request running longer kills the service
+SOCK = os.path.join(STATE_DIR, 'kbqd.sock')
+
+
+def query(argv: list[str], env: dict, timeout: float, kb_venv: str, kb_script: str):
+    """(rc, stdout, stderr) of `kb.py argv` from the service; rc None if it did
+    not reply within `timeout` (its watchdog ends it -- the wait is spent, do not
+    fall back). None if no service for `kb_script` took the request: none is up
+    (a detached one is then started for the next call), or it died first."""
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(0.5)
+    try:
+        s.connect(SOCK)
+    except OSError:
+        s.close()
+        spawn(kb_venv, kb_script, env)
+        return None
+    try:
+        s.settimeout(timeout)
+        s.sendall(json.dumps({'argv': argv, 'script': os.path.abspath(kb_script),
+                              'cwd': os.getcwd(), 'env': env, 'timeout': timeout}).encode() + b'\n')
+        s.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            buf = s.recv(65536)
+            if not buf:
+                break
+            chunks.append(buf)
+        if not chunks:
+            return None  # the service died mid-request (watchdog)
+        resp = json.loads(b''.join(chunks))
+        if not resp:
+            return None  # serving another kb.py (KB_SCRIPT differs)
+        return resp['rc'], resp['stdout'], resp['stderr']
+    except socket.timeout:
+        return None, '', 'kbqd: timed out\n'
+    except (OSError, ValueError, KeyError) as e:
+        return 1, '', f'kbqd: {e!r}\n'
+    finally:
+        s.close()
+
+
+def spawn(kb_venv: str, kb_script: str, env: dict | None = None) -> None:
+    """Start a detached service (a no-op if one already holds the lock).
+    `env` is what kb sees while it is imported."""
+    try:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        subprocess.Popen([kb_venv, os.path.abspath(__file__), kb_script],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL, start_new_session=True, env=env)
+    except OSError:
+        pass
+
+
+def _load(kb_script: str):
+    spec = importlib.util.spec_from_file_location('kb', kb_script)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules['kb'] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def _run_kb(server, argv: list[str]) -> tuple[int, str, str]:
+    try:
+        mtime = os.stat(server.kb_script).st_mtime_ns
+    except OSError:
+        server.running = False
+        return 1, '', 'kbqd: kb script is gone\n'
+    out, err = io.TextIOWrapper(io.BytesIO(), 'utf-8'), io.TextIOWrapper(io.BytesIO(), 'utf-8')
+    rc = 0
+    sys.argv = [server.kb_script, *argv]
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            if mtime != server.kb_mtime:
+                server.kb, server.kb_mtime = _load(server.kb_script), mtime
+            if callable(getattr(server.kb, 'main', None)):
+                ret = server.kb.main()
+                rc = ret if isinstance(ret, int) else 0
+            else:
+                runpy.run_path(server.kb_script, run_name='__main__')
+        except SystemExit as e:
+            rc = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            if e.code is not None and not isinstance(e.code, int):
+                print(e.code, file=sys.stderr)
+        except Exception as e:
+            rc = 1
+            print(f'kbqd: {e!r}', file=sys.stderr)
+            server.kb_mtime = None  # a half-initialized module is reloaded next time
+    out.flush(); err.flush()
+    return rc, out.buffer.getvalue().decode('utf-8', 'replace'), \
+        err.buffer.getvalue().decode('utf-8', 'replace')
+
+
+def _read_request(conn: socket.socket) -> bytes:
+    chunks = []
+    while True:
+        buf = conn.recv(65536)
+        if not buf:
+            return b''.join(chunks)
+        chunks.append(buf)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            req = json.loads(_read_request(self.request))
+            argv = [str(a) for a in req['argv']]
+            deadline = min(float(req.get('timeout') or REQUEST_TIMEOUT), REQUEST_TIMEOUT)
+        except (ValueError, KeyError, TypeError):
+            return
+        if req.get('script') != self.server.kb_script:
+            self.request.sendall(b'{}')
+            return
+        if not argv or argv[0] not in READ_ONLY:
+            rc, out, err = 2, '', f'kbqd: only {sorted(READ_ONLY)} are served\n'
+        else:
+            # kb reads its knobs from os.environ; requests are served one at a
+            # time, so mirroring the caller's view here is race-free.
+            os.environ.clear()
+            os.environ.update(req.get('env') or {})
+            try:
+                os.chdir(req.get('cwd') or '/')
+            except OSError:
+                pass
+            # kb runs on this thread and cannot be interrupted; past the
+            # deadline the caller has given up, so end the process instead.
+            watchdog = threading.Timer(deadline, os._exit, (1,))
+            watchdog.daemon = True
+            watchdog.start()
+            try:
+                rc, out, err = _run_kb(self.server, argv)
+            finally:
+                watchdog.cancel()
+        self.request.sendall(json.dumps({'rc': rc, 'stdout': out, 'stderr': err}).encode())
+
+
+class _Server(socketserver.UnixStreamServer):
+    timeout = IDLE_EXIT
+    request_queue_size = 64  # every session's prompts queue behind the one served
+
+    def __init__(self, path, kb_script):
+        self.kb_script = kb_script
+        self.kb, self.kb_mtime = None, None
+        self.running = True
+        super().__init__(path, _Handler)
+
+    def handle_timeout(self):
+        self.running = False
+
+
+def main(argv: list[str]) -> int:
+    if len(argv) != 1 or not os.path.isfile(argv[0]):
+        sys.stderr.write(__doc__.rsplit('Usage: ', 1)[1])
+        return 2
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(SOCK + '.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return 0  # another service is up (or starting)
+        try:
+            os.unlink(SOCK)
+        except OSError:
+            pass
+        script = os.path.abspath(argv[0])
+        try:  # import kb before the first request, not during it
+            kb, mtime = _load(script), os.stat(script).st_mtime_ns
+        except Exception:
+            kb, mtime = None, None
+        os.umask(0o077)
+        server = _Server(SOCK, script)
+        server.kb, server.kb_mtime = kb, mtime
+        try:
+            while server.running:
+                server.handle_request()
+        finally:
+            server.server_close()
+            try:
+                os.unlink(SOCK)
+            except OSError:
+                pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,35 @@
+#!/bin/bash
+# Parse-once hook payload decoding. Source this; it defines payload_fields.
+#
+# Hooks used to pull each field with its own `python3 -c "import sys,json; ..."`
+# over the same $INPUT -- 3-5 interpreter launches per hook per tool call just to
+# re-decode one JSON object. payload_fields decodes it ONCE (a single jq call) and
+# assigns every requested field as a shell variable.
+#
+# Usage:
+#   source "$HOME/.claude/hooks/lib/payload.sh"
+#   INPUT=$(cat)
+#   payload_fields "$INPUT" TOOL_NAME=.tool_name CMD=.tool_input.command \
+#       EXIT_CODE='.tool_result.exitCode // .tool_result.exit_code // 0'
+#
+# Each VAR=FILTER is a jq filter. Missing/null/ill-typed -> empty string;
+# non-strings are rendered as JSON (numbers, booleans: `true`/`false`). Trailing
+# newlines are stripped, matching the old `VAR=$(python3 -c 'print(...)')`
+# capture. Malformed JSON leaves every variable empty (callers already treat
+# empty as "not mine").
+payload_fields() {
+    local input="$1"; shift
+    local prog="" pair var filt
+    for pair in "$@"; do
+        var="${pair%%=*}"
+        filt="${pair#*=}"
+        [[ "$var" =~ ^[A-Za-z_][A-Za-z0-9_]*$ ]] || continue
+        printf -v "$var" '%s' ""
+        prog+="${prog:+, }([($filt)?][0] | if . == null then \"\" elif type == \"string\" then . else tojson end"
+        prog+=" | sub(\"\\n+\$\"; \"\") | @sh \"$var=\\(.)\")"
+    done
+    [[ -z "$prog" ]] && return 0
+    local assigns
+    assigns=$(printf '%s' "$input" | jq -r "$prog" 2>/dev/null) || return 0
+    eval "$assigns"
+}
@@ -18,13 +18,15 @@ sub-agents, distinguished by the input's `agent_id` field -- verified on 2.1.154
 
 Only gates source/doc files (coverage->understanding); logs/data/binaries fail open.
 Fail-open on ANY error -- a bug here must never block all Reads. State:
-$STATE_DIR/<session>-readcov/<sha1(path)> holds the max CONTIGUOUS line reached.
+$STATE_DIR/<session>-readcov.db (lib/readcov.py) holds, per path, the merged
+set of line ranges read so far (out-of-order pages count as soon as they
+join up) and the cached line count.
 Exit 0 = allow (optional NOTE on stderr). Exit 2 = block (sub-agent only).
 """
-import sys, json, os, hashlib
+import sys, json, os
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from _state import STATE_DIR  # noqa: E402 — persistent root (kb-h3b)
+import readcov  # noqa: E402 — per-session coverage index under the persistent root (kb-h3b)
 
 WINDOW = 2000  # Read returns up to this many lines with no `limit`
 SRC = {
@@ -36,36 +38,9 @@ SRC = {
 }
 
 
-def _session_id():
-    try:
-        return open(f"{STATE_DIR}/session-{os.getppid()}").read().strip()
-    except Exception:
-        return str(os.getppid())
-
-
-def _covdir():
-    d = f"{STATE_DIR}/{_session_id()}-readcov"
-    os.makedirs(d, exist_ok=True)
-    return d
-
-
-def _slot(covdir, fp):
-    return os.path.join(covdir, hashlib.sha1(fp.encode()).hexdigest())
-
-
-def _get_maxend(covdir, fp):
-    try:
-        return int(open(_slot(covdir, fp)).read().strip())
-    except Exception:
-        return 0
-
-
-def _set_maxend(covdir, fp, v):
-    try:
-        with open(_slot(covdir, fp), "w") as f:
-            f.write(str(int(v)))
-    except Exception:
-        pass
+def _ranges(gaps, cap=4):
+    txt = ", ".join(f"{a}-{b}" if a != b else f"{a}" for a, b in gaps[:cap])
+    return txt + (f" (+{len(gaps) - cap} more)" if len(gaps) > cap else "")
 
 
 def main():
@@ -82,7 +57,8 @@ def main():
     if os.path.splitext(fp)[1].lower() not in SRC:
         return 0
     try:
-        nlines = sum(1 for _ in open(fp, "rb"))
+        cov = readcov.connect()
+        nlines = readcov.line_count(cov, fp)
     except Exception:
         return 0
     if nlines <= 0:
@@ -93,8 +69,11 @@ def main():
     limit = ti.get("limit")
     partial = (offset is not None) or (limit is not None)
 
-    covdir = _covdir()
-    prior = _get_maxend(covdir, fp)
+    try:
+        spans = readcov.spans(cov, fp)
+    except Exception:
+        spans = []
+    prior = spans[0][1] if spans and spans[0][0] == 1 else 0
 
     if not partial:
         start, end = 1, min(nlines, WINDOW)
@@ -113,26 +92,31 @@ def main():
                 f"and slicing misses them.\n")
             return 2
         if start > prior + 1:
+            unread = [g for g in readcov.gaps(spans, nlines) if g[0] < start]
             sys.stderr.write(
                 f"BLOCKED (sub-agent): spot-read of {fp} -- starting at line {start} "
-                f"leaves lines [{prior + 1}, {start}) unread. To read this {nlines}-"
-                f"line file WHOLE, page top-down with NO gaps: Read offset={prior + 1} "
-                f"next. Agents read the whole file; no jumping to a region.\n")
+                f"leaves {_ranges(unread)} unread. To read this {nlines}-line file "
+                f"WHOLE, page top-down with NO gaps: Read offset={prior + 1} next. "
+                f"Agents read the whole file; no jumping to a region.\n")
             return 2
         # else: strict top-down page of a big file -> allowed (reading it whole)
 
-    # ---- record CONTIGUOUS coverage (a gap below `start` does not advance it) ----
-    if start <= prior + 1:
-        _set_maxend(covdir, fp, max(prior, end))
+    # ---- record coverage (merged into the file's span set) ----
+    try:
+        spans = readcov.add(cov, fp, start, end)
+    except Exception:
+        spans = readcov.merge(list(spans), start, end)
 
     # ---- meter (both sessions): big file not yet fully covered ----
-    new_max = _get_maxend(covdir, fp)
-    if nlines > WINDOW and new_max < nlines:
-        pct = 100 * new_max // nlines
+    unread = readcov.gaps(spans, nlines)
+    if nlines > WINDOW and unread:
+        done = nlines - sum(b - a + 1 for a, b in unread)
+        a, b = unread[0]
+        page = f"offset={a}" + (f", limit={b - a + 1}" if b - a + 1 < WINDOW else "")
         sys.stderr.write(
-            f"NOTE: {fp} [{nlines} lines]: contiguous 1-{new_max} read ({pct}%). "
-            f"Next page: Read offset={new_max + 1}. Full coverage required before a "
-            f"coverage/structure/behavior claim about this file.\n")
+            f"NOTE: {fp} [{nlines} lines]: {done} lines read ({100 * done // nlines}%), "
+            f"unread {_ranges(unread)}. Next page: Read {page}. Full coverage required "
+            f"before a coverage/structure/behavior claim about this file.\n")
     return 0
 
 
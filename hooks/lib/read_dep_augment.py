@@ -5,11 +5,17 @@ User-directed (2026-05-30): the main session (orchestrator) is allowed to slice
 source file, but when it does, surface what the slice hides so the side-concerns
 are not silently missed:
 
-  1. IN-FILE: the top-level definitions OUTSIDE the read slice (the side-concerns
-     in the SAME file the slice skipped).
+  1. IN-FILE: the top-level definitions no Read this session has covered (the
+     side-concerns in the SAME file the slices skipped -- coverage comes from the
+     span set read_coverage_gate.py records in lib/readcov.py).
   2. CROSS-FILE: producers (where a name the slice references is defined) and
-     consumers (where a name the slice defines is used), via ast-grep across the
-     repo source tree -- bounded and best-effort.
+     consumers (where a name the slice defines is used), from the per-repo
+     def/ref index in lib/depindex.py -- every name in the slice, no per-name
+     tree scan. Only a changed Python file just Read is re-indexed in the
+     foreground (one `ast` parse, no process); any other stale file, and the
+     rest of the tree, is refreshed by a detached builder.
+     Until its first walk completes, consumers fall back to a bounded ast-grep
+     run per name (MAX_NAMES).
 
 Sub-agents NEVER reach here (they are forced to read whole files by
 read_coverage_gate.py, so there is nothing to augment) -- this hook exits 0 if
@@ -19,38 +25,19 @@ or broken augmentation must never disrupt a Read.
 
 Emits a compact note to stderr. Exit 0 always (PostToolUse, never blocks).
 """
-import sys, json, os, re, hashlib, subprocess
+import sys, json, os, subprocess
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from _state import STATE_DIR  # noqa: E402 — persistent root (kb-h3b)
+import readcov  # noqa: E402 — per-session coverage index under the persistent root (kb-h3b)
+import depindex  # noqa: E402 — per-repo def/ref index (refreshed in the background)
+from depindex import LANG  # noqa: E402
+from _state import project_root  # noqa: E402
 
 WINDOW = 2000
-AST_TIMEOUT = 4  # seconds, total budget for ast-grep work
-MAX_NAMES = 4    # cap cross-file lookups
+AST_TIMEOUT = 4  # seconds, budget for the pre-index ast-grep fallback
+MAX_NAMES = 4    # cap cross-file lookups while the index is still being built
 MAX_HITS = 4     # cap hits reported per name
-
-LANG = {
-    ".py": "python", ".pyi": "python", ".rs": "rust", ".go": "go", ".java": "java",
-    ".js": "javascript", ".mjs": "javascript", ".cjs": "javascript", ".ts": "typescript",
-    ".tsx": "tsx", ".jsx": "jsx", ".c": "c", ".h": "c", ".cpp": "cpp", ".cc": "cpp",
-    ".cxx": "cpp", ".hpp": "cpp", ".hh": "cpp", ".rb": "ruby", ".lua": "lua",
-    ".sh": "bash", ".bash": "bash", ".scala": "scala", ".swift": "swift", ".kt": "kotlin",
-}
-# def-site patterns per ast-grep language (return-annotated variants included --
-# the plain `def $N($$$): $$$` misses annotated defs, per the project's ast-grep gotcha)
-DEFPATS = {
-    "python": ["def $N($$$): $$$", "def $N($$$) -> $R: $$$", "class $N: $$$",
-               "class $N($$$): $$$"],
-    "rust": ["fn $N($$$) $$$", "fn $N($$$) -> $R $$$", "struct $N $$$", "enum $N $$$",
-             "trait $N $$$"],
-    "go": ["func $N($$$) $$$", "type $N struct $$$"],
-    "javascript": ["function $N($$$) { $$$ }", "const $N = $_"],
-    "typescript": ["function $N($$$) { $$$ }", "class $N { $$$ }"],
-    "c": ["$T $N($$$) { $$$ }"], "cpp": ["$T $N($$$) { $$$ }"],
-    "ruby": ["def $N\n$$$\nend", "class $N\n$$$\nend"],
-    "bash": ["$N() { $$$ }"], "lua": ["function $N($$$) $$$ end"],
-}
-
+MAX_LIST = 12    # names listed per line before "(+N more)"
 
 def _run(args):
     try:
@@ -60,28 +47,6 @@ def _run(args):
         return ""
 
 
-def _defs_in_file(fp, lang):
-    """Return list of (name, line) for definitions in fp, via ast-grep."""
-    out = []
-    for pat in DEFPATS.get(lang, []):
-        txt = _run(["ast-grep", "--lang", lang, "--pattern", pat, "--json", fp])
-        try:
-            for m in json.loads(txt or "[]"):
-                meta = m.get("metaVariables", {}).get("single", {})
-                name = (meta.get("N") or {}).get("text")
-                line = m.get("range", {}).get("start", {}).get("line")
-                if name and line is not None:
-                    out.append((name, line + 1))  # ast-grep line is 0-based
-        except Exception:
-            continue
-    # dedupe by name keeping first line
-    seen, res = set(), []
-    for n, l in sorted(out, key=lambda x: x[1]):
-        if n not in seen:
-            seen.add(n); res.append((n, l))
-    return res
-
-
 def _consumers(name, lang, root, exclude_fp):
     """file:line of usages of `name` elsewhere in the tree (bounded)."""
     txt = _run(["ast-grep", "--lang", lang, "--pattern", f"{name}($$$)",
@@ -122,7 +87,8 @@ def main():
         return 0                   # whole read -> no slice -> nothing skipped
 
     try:
-        nlines = sum(1 for _ in open(fp, "rb"))
+        cov = readcov.connect()
+        nlines = readcov.line_count(cov, fp)  # cached by the PreToolUse gate
     except Exception:
         return 0
     if nlines <= 0:
@@ -132,40 +98,50 @@ def main():
 
     # dedupe: augment each file once per session
     try:
-        covdir = f"{STATE_DIR}/{open(f'{STATE_DIR}/session-{os.getppid()}').read().strip()}-readcov"
+        if not readcov.claim_augment(cov, fp):
+            return 0
     except Exception:
-        covdir = f"{STATE_DIR}/{os.getppid()}-readcov"
-    os.makedirs(covdir, exist_ok=True)
-    marker = os.path.join(covdir, "aug-" + hashlib.sha1(fp.encode()).hexdigest())
-    if os.path.exists(marker):
         return 0
-    open(marker, "w").write("1")
 
-    defs = _defs_in_file(fp, lang)
-    skipped = [(n, l) for (n, l) in defs if not (start <= l <= end)]
-    in_slice = [n for (n, l) in defs if start <= l <= end]
+    try:
+        spans = readcov.spans(cov, fp)
+    except Exception:
+        spans = []
+    readcov.merge(spans, start, end)  # in case the PreToolUse gate did not record it
+
+    root = project_root(fp)
+    try:
+        idx = depindex.connect(root)
+        depindex.refresh_file(idx, fp)
+        defs = depindex.defs_in(idx, fp)
+        indexed = depindex.complete(idx)
+        if depindex.due(idx):
+            depindex.spawn(root)
+    except Exception:
+        return 0
+    skipped = [(n, l) for (n, l) in defs if not readcov.covered(spans, l)]
+    in_slice = list(dict.fromkeys(n for (n, l) in defs if start <= l <= end))
 
     lines = []
     if skipped:
-        lst = ", ".join(f"{n}(L{l})" for n, l in skipped[:12])
-        more = "" if len(skipped) <= 12 else f" (+{len(skipped) - 12} more)"
+        lst = ", ".join(f"{n}(L{l})" for n, l in skipped[:MAX_LIST])
+        more = "" if len(skipped) <= MAX_LIST else f" (+{len(skipped) - MAX_LIST} more)"
         lines.append(
             f"DEP-AUGMENT {os.path.basename(fp)} [{nlines} lines]: you read {start}-{end}; "
-            f"the REST of this file also defines: {lst}{more}. Read the whole file for "
+            f"the unread REST of this file also defines: {lst}{more}. Read the whole file for "
             f"these side-concerns.")
 
-    root = os.path.dirname(fp)
-    for p in (os.path.dirname(root), root):  # try the package dir then the file's dir
-        if os.path.basename(p) == "cl44" or os.path.isdir(os.path.join(p, "cl44")):
-            root = os.path.join(p, "cl44") if os.path.isdir(os.path.join(p, "cl44")) else p
-            break
     cons = []
-    for n in in_slice[:MAX_NAMES]:
-        hits = _consumers(n, lang, root, fp)
+    for n in (in_slice if indexed else in_slice[:MAX_NAMES]):
+        try:
+            hits = depindex.consumers(idx, n, fp, MAX_HITS) if indexed else _consumers(n, lang, root, fp)
+        except Exception:
+            hits = []
         if hits:
             cons.append(f"{n} -> {', '.join(hits)}")
     if cons:
-        lines.append("  consumers of names in your slice: " + "; ".join(cons))
+        more = "" if len(cons) <= MAX_LIST else f" (+{len(cons) - MAX_LIST} more)"
+        lines.append("  consumers of names in your slice: " + "; ".join(cons[:MAX_LIST]) + more)
 
     if lines:
         sys.stderr.write("\n".join(lines) + "\n")
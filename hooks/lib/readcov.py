@@ -0,0 +1,145 @@
+"""Per-session Read coverage index shared by read_coverage_gate.py (PreToolUse)
+and read_dep_augment.py (PostToolUse).
+
+One SQLite file per session, $STATE_DIR/<session>-readcov.db (WAL), one row
+per file path:
+
+    nlines/mtime_ns/size  line count, valid while the file's stat is unchanged
+                          (counted by newline-counting 1 MiB buffers, once)
+    spans                 lines read so far, as a sorted list of disjoint,
+                          non-adjacent [start, end] intervals (JSON)
+    maxend                end of the span that starts at line 1 (0 if none) --
+                          the max CONTIGUOUS line covered from the top
+    augmented             read_dep_augment already fired for this file
+
+Replaces the <session>-readcov/ directory of one small file per path (and a
+full line-iteration of the file on every Read). A Read is merged into `spans`
+with two bisections and one splice inside a BEGIN IMMEDIATE transaction, so
+out-of-order pages (1-500, 1000-1500, 500-1000) collapse to one span and the
+gate and the augmentation never race on read-modify-write.
+Callers stay fail-open: any exception here means "no coverage known".
+"""
+import bisect
+import json
+import os
+import sqlite3
+import threading
+
+from _state import STATE_DIR, get_session_id
+
+_SCHEMA = ('CREATE TABLE IF NOT EXISTS files ('
+           'path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, nlines INTEGER, '
+           'maxend INTEGER NOT NULL DEFAULT 0, augmented INTEGER NOT NULL DEFAULT 0, '
+           "spans TEXT NOT NULL DEFAULT '[]') WITHOUT ROWID")
+_local = threading.local()  # .conns = {db path: connection}, one set per thread
+
+
+def db_path(sid: str | None = None) -> str:
+    return os.path.join(STATE_DIR, f'{sid or get_session_id() or os.getppid()}-readcov.db')
+
+
+def connect(sid: str | None = None) -> sqlite3.Connection:
+    path = db_path(sid)
+    conns = _local.__dict__.setdefault('conns', {})
+    conn = conns.get(path)
+    if conn is not None and os.path.exists(path):
+        return conn
+    os.makedirs(STATE_DIR, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=2, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(_SCHEMA)
+    conns[path] = conn
+    return conn
+
+
+def _count_lines(fp: str) -> int:
+    # Same count as `sum(1 for _ in open(fp, 'rb'))`: a trailing unterminated
+    # line counts.
+    n, last = 0, b'\n'
+    with open(fp, 'rb') as fh:
+        while True:
+            chunk = fh.read(1 << 20)
+            if not chunk:
+                break
+            n += chunk.count(b'\n')
+            last = chunk[-1:]
+    return n + (last != b'\n')
+
+
+def line_count(conn: sqlite3.Connection, fp: str) -> int:
+    """Lines in `fp`, recounted only when its mtime/size changed."""
+    st = os.stat(fp)
+    row = conn.execute('SELECT mtime_ns, size, nlines FROM files WHERE path = ?', (fp,)).fetchone()
+    if row and row[0] == st.st_mtime_ns and row[1] == st.st_size and row[2] is not None:
+        return row[2]
+    n = _count_lines(fp)
+    conn.execute('INSERT INTO files(path, mtime_ns, size, nlines) VALUES (?, ?, ?, ?) '
+                 'ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns, '
+                 'size = excluded.size, nlines = excluded.nlines',
+                 (fp, st.st_mtime_ns, st.st_size, n))
+    return n
+
+
+def maxend(conn: sqlite3.Connection, fp: str) -> int:
+    row = conn.execute('SELECT maxend FROM files WHERE path = ?', (fp,)).fetchone()
+    return row[0] if row else 0
+
+
+def spans(conn: sqlite3.Connection, fp: str) -> list[list[int]]:
+    row = conn.execute('SELECT spans FROM files WHERE path = ?', (fp,)).fetchone()
+    return json.loads(row[0]) if row else []
+
+
+def merge(spans: list[list[int]], start: int, end: int) -> list[list[int]]:
+    """Insert [start, end] into sorted disjoint `spans` in place, coalescing
+    every span it overlaps or touches. Both neighbours are found by bisection
+    (ends are sorted too, since the spans are disjoint)."""
+    i = bisect.bisect_left(spans, start - 1, key=lambda sp: sp[1])
+    j = bisect.bisect_right(spans, end + 1, key=lambda sp: sp[0])
+    if i < j:
+        start, end = min(start, spans[i][0]), max(end, spans[j - 1][1])
+    spans[i:j] = [[start, end]]
+    return spans
+
+
+def gaps(spans: list[list[int]], nlines: int) -> list[tuple[int, int]]:
+    """Unread [start, end] ranges of a `nlines`-line file."""
+    out, nxt = [], 1
+    for a, b in spans:
+        if a > nxt:
+            out.append((nxt, min(a - 1, nlines)))
+        nxt = max(nxt, b + 1)
+        if nxt > nlines:
+            break
+    if nxt <= nlines:
+        out.append((nxt, nlines))
+    return [g for g in out if g[0] <= g[1]]
+
+
+def covered(spans: list[list[int]], line: int) -> bool:
+    i = bisect.bisect_right(spans, line, key=lambda sp: sp[0])
+    return i > 0 and spans[i - 1][1] >= line
+
+
+def add(conn: sqlite3.Connection, fp: str, start: int, end: int) -> list[list[int]]:
+    """Record a Read of lines start..end and return the merged spans."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        sp = merge(spans(conn, fp), start, end)
+        top = sp[0][1] if sp[0][0] == 1 else 0
+        conn.execute('INSERT INTO files(path, spans, maxend) VALUES (?, ?, ?) ON CONFLICT(path) '
+                     'DO UPDATE SET spans = excluded.spans, maxend = excluded.maxend',
+                     (fp, json.dumps(sp, separators=(',', ':')), top))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return sp
+
+
+def claim_augment(conn: sqlite3.Connection, fp: str) -> bool:
+    """True the first time this session asks for `fp` (atomic across processes)."""
+    conn.execute('INSERT OR IGNORE INTO files(path) VALUES (?)', (fp,))
+    return conn.execute('UPDATE files SET augmented = 1 WHERE path = ? AND augmented = 0',
+                        (fp,)).rowcount > 0
@@ -12,3 +12,30 @@
 # Usage:  source "$(dirname "$0")/lib/state.sh"   # then use "$STATE_DIR/..."
 export STATE_DIR="${CLAUDE_STATE_DIR:-$HOME/.claude/state}"
 mkdir -p "$STATE_DIR" 2>/dev/null || true
+
+# session_id [PID]: print this hook's Claude session id (exit 1 if unknown).
+# CLAUDE_SESSION_ID (session-init / hookd), else session-$PPID, else the pid
+# index lib/_state.py maintains (pidsid-<pid> = "<owner_pid> <starttime>",
+# validated against /proc so a recycled pid never matches), else the python
+# resolver, which walks /proc once and records the index for every later hook.
+session_id() {
+    if [[ -n "${CLAUDE_SESSION_ID:-}" ]]; then
+        printf '%s\n' "$CLAUDE_SESSION_ID"
+        return 0
+    fi
+    local base="${1:-$PPID}" owner start stat
+    if [[ -s "$STATE_DIR/session-$base" ]]; then
+        cat "$STATE_DIR/session-$base"
+        return 0
+    fi
+    if read -r owner start < "$STATE_DIR/pidsid-$base" 2>/dev/null \
+            && read -r stat < "/proc/$base/stat" 2>/dev/null; then
+        stat=${stat##*) }
+        set -- $stat
+        if [[ "${20}" == "$start" && -s "$STATE_DIR/session-$owner" ]]; then
+            cat "$STATE_DIR/session-$owner"
+            return 0
+        fi
+    fi
+    python3 "${BASH_SOURCE[0]%/*}/_state.py" session-id "$base" 2>/dev/null
+}
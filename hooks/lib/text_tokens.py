@@ -0,0 +1,101 @@
+"""Single-pass typed tokenizer shared by the KB surfacing hooks.
+
+compose_time_check, symbol_surface and _canonical_match_cli each ran their own
+5-8 independent regex passes (snake, CamelCase, mixed, ALL_CAPS, Greek,
+fractions, "x = 3", "compute X") over the same prompt or file. scan() makes ONE
+pass with one compiled pattern and classifies what it finds:
+
+    snake   lower_snake_case            [a-z][a-z0-9]*(_[a-z0-9]+)+
+    camel   CamelCase, two+ humps       [A-Z][a-z]+([A-Z][a-z0-9]+)+
+    mixed   any case, underscored       [A-Za-z][A-Za-z0-9]*(_[A-Za-z0-9]+)+
+    upper   ALL_CAPS, 3+ chars          [A-Z][A-Z0-9_]{2,}
+    greek   single Greek letters        [α-ωΑ-Ω]
+    frac    exact fractions             \\d{1,4}/\\d{1,4}
+    assign  the name in `name = 3/4`    [A-Za-z_]\\w* followed by = <digit|/|.>
+    verb    the object of compute/derive/implement/prove/find/calculate/
+            determine/evaluate/check X  (its leading [A-Za-z_][A-Za-z0-9_]{2,})
+
+Each word pattern above is anchored by \\b on both sides and consists of word
+characters only, so a match is always a whole \\w run: the scanner visits every
+\\w run once and classifies it with a cheap dispatch, instead of every pattern
+re-walking the text. Results are identical to the separate passes; the test
+suite compares them against the reference regexes in tests/hook_bench.py,
+which also benchmarks both (`hook_bench.py tokens`).
+
+Every kind is a tuple in first-occurrence order, deduplicated, with no length
+filter (callers apply their own). The last few results are memoized, so a
+process that scans the same message for several advisories tokenizes it once.
+"""
+import functools
+import re
+
+KINDS = ('snake', 'camel', 'mixed', 'upper', 'greek', 'frac', 'assign', 'verb')
+VERBS = frozenset(('compute', 'derive', 'implement', 'prove', 'find', 'calculate',
+                   'determine', 'evaluate', 'check'))
+
+# A fraction, else a \w run (with an empty group 3 when `= <value>` follows).
+# The lookahead does not consume the value, so `G = 17/24` still yields 17/24.
+_SCAN = re.compile(r'\b(\d{1,4}/\d{1,4})\b|(\w+)(?:(?=\s*=\s*[\d/.])())?')
+_SNAKE = re.compile(r'[a-z][a-z0-9]*(?:_[a-z0-9]+)+')
+_CAMEL = re.compile(r'[A-Z][a-z]+(?:[A-Z][a-z0-9]+)+')
+_MIXED = re.compile(r'[A-Za-z][A-Za-z0-9]*(?:_[A-Za-z0-9]+)+')
+_UPPER = re.compile(r'[A-Z][A-Z0-9_]{2,}')
+_GREEK = re.compile(r'[α-ωΑ-Ω]')
+_VERB_OBJ = re.compile(r'\s+([A-Za-z_][A-Za-z0-9_]{2,})')
+_ASSIGN_HEAD = re.compile(r'[A-Za-z_]')
+
+
+@functools.lru_cache(maxsize=4)
+def scan(text: str) -> dict[str, tuple[str, ...]]:
+    """{kind: tokens} for every kind in KINDS, from one pass over `text`."""
+    out: dict[str, dict[str, None]] = {k: {} for k in KINDS}
+    snake, camel, mixed, upper = out['snake'], out['camel'], out['mixed'], out['upper']
+    greek, frac, assign, verb = out['greek'], out['frac'], out['assign'], out['verb']
+    verb_end = 0  # a verb phrase's object is not itself a verb (finditer semantics)
+    for m in _SCAN.finditer(text):
+        frac_tok, w, eq = m.groups()
+        if w is None:
+            frac[frac_tok] = None
+            continue
+        if eq is not None and _ASSIGN_HEAD.match(w):
+            assign[w] = None
+        if w.islower() and w.isalpha():  # the bulk of any text: only a verb matters
+            if w in VERBS and m.start() >= verb_end:
+                v = _VERB_OBJ.match(text, m.end())
+                if v:
+                    verb[v.group(1)] = None
+                    verb_end = v.end()
+            if w.isascii():
+                continue
+        if not w.isascii():
+            for ch in _GREEK.findall(w):
+                greek[ch] = None
+        c = w[0]
+        if '_' in w:
+            if _MIXED.fullmatch(w):
+                mixed[w] = None
+                if _SNAKE.fullmatch(w):
+                    snake[w] = None
+            if 'A' <= c <= 'Z' and _UPPER.fullmatch(w):
+                upper[w] = None
+        elif 'A' <= c <= 'Z':
+            if _CAMEL.fullmatch(w):
+                camel[w] = None
+            elif _UPPER.fullmatch(w):
+                upper[w] = None
+        if m.start() >= verb_end and w.lower() in VERBS:  # Compute, CHECK, ...
+            v = _VERB_OBJ.match(text, m.end())
+            if v:
+                verb[v.group(1)] = None
+                verb_end = v.end()
+    return {k: tuple(v) for k, v in out.items()}
+
+
+def symbols(text: str, min_len: int = 3) -> list[str]:
+    """Symbol candidates as symbol_surface has always defined them: snake and
+    mixed identifiers of at least `min_len` chars, CamelCase, Greek letters."""
+    t = scan(text)
+    out = dict.fromkeys(w for w in t['mixed'] if len(w) >= min_len)  # snake is a subset
+    out.update(dict.fromkeys(t['camel']))
+    out.update(dict.fromkeys(t['greek']))
+    return list(out)
@@ -19,8 +19,8 @@ PROJECT_NAME=$(basename "$(git rev-parse --show-toplevel 2>/dev/null || pwd)")
 source "$HOME/.claude/hooks/lib/state.sh"
 if [[ -n "$HOOK_SESSION_ID" ]]; then
     CURRENT_SESSION_ID="$HOOK_SESSION_ID"
-elif [[ -f "$STATE_DIR/session-$PPID" ]]; then
-    CURRENT_SESSION_ID=$(cat "$STATE_DIR/session-$PPID")
+else
+    CURRENT_SESSION_ID=$(session_id)
 fi
 [[ -z "$CURRENT_SESSION_ID" ]] && exit 0
 
@@ -20,18 +20,58 @@ if [[ -n "$session_id" ]]; then
     mkdir -p "$CLAUDE_DIR/sessions/$session_id"
 fi
 
+# --- Warm hook daemon (lib/hookd.py) ---
+# One per session; serves the hook groups in hooks/hookd/groups.json over
+# $STATE_DIR/<sid>-hookd.sock. Detached so it outlives this hook; it exits on its
+# own once the Claude process ($PPID) is gone. A no-op if one is already serving.
+if [[ -n "$session_id" ]]; then
+    setsid python3 "$CLAUDE_DIR/hooks/lib/hookd.py" --session "$session_id" --owner "$PPID" \
+        </dev/null >/dev/null 2>&1 &
+fi
+
+# --- Resident kb query service (lib/kbqd.py) ---
+# One per user, shared by every session: keeps kb.py imported under its venv so
+# kb-prompt-surface.py's per-prompt search is one local RPC. A no-op if one is
+# already serving; it exits on its own after 30 idle minutes.
+KB_VENV="${KB_VENV:-$HOME/Projects/ai/kb/.venv/bin/python}"
+KB_SCRIPT="${KB_SCRIPT:-$HOME/Projects/ai/kb/kb.py}"
+if [[ -f "$KB_SCRIPT" && -x "$KB_VENV" ]]; then
+    KB_EMBEDDING_URL="${KB_EMBEDDING_URL:-http://ash:8081/embedding}" KB_EMBEDDING_DIM="${KB_EMBEDDING_DIM:-4096}" \
+        setsid "$KB_VENV" "$CLAUDE_DIR/hooks/lib/kbqd.py" "$KB_SCRIPT" </dev/null >/dev/null 2>&1 &
+fi
+
+# --- KB derived indexes (lib/kb_index.py) ---
+# Idempotent; a single read-only schema check once they exist. Backgrounded so a
+# first-time build on a large knowledge.db never delays session start.
+python3 "$CLAUDE_DIR/hooks/lib/kb_index.py" </dev/null >/dev/null 2>&1 &
+
 # --- KB state cleanup (was kb-search-reset.sh) ---
 # Time-based, so it BOUNDS the persistent ~/.claude/state root that no longer
 # gets a reboot-wipe (kb-h3b). Every churning file class must be swept here or it
 # accumulates one stale file per dead session forever.
 for pat in "*-searched" "*-hook-seen" "*-kb-seen" "*-incomplete-markers" \
-           "*-context" "session-*" "provider-context-window*"; do
+           "*-context" "*-hookd.sock" "session-*" "pidsid-*" "provider-context-window*"; do
     find "$STATE_DIR" -maxdepth 1 -name "$pat" -mmin +240 -delete 2>/dev/null
 done
+# WAL-mode sqlite stores: a live writer touches only -wal/-shm (the main .db is
+# written at checkpoint), so sweep X.db, X.db-wal and X.db-shm together, and
+# only when the NEWEST of the three is past the cutoff -- deleting the .db under
+# a live -wal would lose every row not yet checkpointed.
+for f in "$STATE_DIR"/*-hook-seen.db{,-wal,-shm} "$STATE_DIR"/*-readcov.db{,-wal,-shm}; do
+    db="${f%-wal}"; db="${db%-shm}"
+    [[ -e "$f" ]] || continue
+    [[ -n $(find "$db" "$db-wal" "$db-shm" -maxdepth 0 -mmin -240 2>/dev/null) ]] && continue
+    rm -f "$db" "$db-wal" "$db-shm"
+done
 # readcov is a per-session SUBDIR; -maxdepth 1 + rm -rf avoids find descending
 # into a dir it is deleting. read_coverage_gate.py is fail-open, so a racing rm
 # only forces a recompute, never a block (review finding 5: safe vs live writer).
 find "$STATE_DIR" -maxdepth 1 -name "*-readcov" -type d -mmin +240 -exec rm -rf {} + 2>/dev/null
+# depindex-*.db (lib/depindex.py) is per-repo, shared across sessions: only
+# drop an index no session has touched for a month (a dropped one just rebuilds).
+find "$STATE_DIR" -maxdepth 1 -name "depindex-*" -mtime +30 -delete 2>/dev/null
+# bd-open-*.json (lib/bd_issues.py): per-repo open-issues snapshots, same policy.
+find "$STATE_DIR" -maxdepth 1 -name "bd-open-*" -mtime +30 -delete 2>/dev/null
 # Dead-session sweep: drop ALL derived files the moment the owning PID is gone.
 for f in "$STATE_DIR"/session-*; do
     [[ -f "$f" ]] || continue
@@ -41,8 +81,13 @@ for f in "$STATE_DIR"/session-*; do
         rm -f "$f"
         [[ -n "$old_sid" ]] && rm -rf \
             "$STATE_DIR/${old_sid}-searched" "$STATE_DIR/${old_sid}-hook-seen" \
+            "$STATE_DIR/${old_sid}-hook-seen.db" "$STATE_DIR/${old_sid}-hook-seen.db-wal" \
+            "$STATE_DIR/${old_sid}-hook-seen.db-shm" \
             "$STATE_DIR/${old_sid}-kb-seen" "$STATE_DIR/${old_sid}-incomplete-markers" \
-            "$STATE_DIR/${old_sid}-context" "$STATE_DIR/${old_sid}-readcov"
+            "$STATE_DIR/${old_sid}-context" "$STATE_DIR/${old_sid}-readcov" \
+            "$STATE_DIR/${old_sid}-readcov.db" "$STATE_DIR/${old_sid}-readcov.db-wal" \
+            "$STATE_DIR/${old_sid}-readcov.db-shm" \
+            "$STATE_DIR/${old_sid}-hookd.sock"
     fi
 done
 # owed-deferred (host-global): trim lines older than 6h (DEFER_TTL) via atomic
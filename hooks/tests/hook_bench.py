@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""Hook benchmark with regression budgets -- the latency twin of run_hook_tests.
+
+run_hook_tests.py asserts each hook's DECISION; this asserts its COST. Every hook
+wired for PreToolUse/PostToolUse (hookd groups expanded, see hook_profile.py) is
+fed its run_hook_tests.CASES payloads plus every payload in the corpus whose tool
+its matcher accepts, N times each. The corpus is the reviewed, committed
+bench_corpus.jsonl plus this machine's recordings in $STATE_DIR/bench_corpus.jsonl:
+
+  cold  spawned per call, payload on stdin -- how Claude Code runs a directly
+        wired hook, and how the hookd client's fallback runs every hook
+  warm  how the daemon runs it: python hooks in-process with the module kept
+        imported; shell hooks are still spawned, so warm == cold for them
+
+The median of the mode the hook is actually wired in (warm if served by hookd,
+else cold) is checked against bench_budgets.json; any hook over budget fails the
+run (exit 1). An edit that adds a subprocess or an unindexed query to a hot hook
+shows up here before it ships.
+
+Hooks run against a throwaway CLAUDE_STATE_DIR and cwd; nothing is written to the
+timing ledger.
+
+Run:  python3 ~/.claude/hooks/tests/hook_bench.py [-n 5] [-v] [--hook NAME]
+      python3 ~/.claude/hooks/tests/run_hook_tests.py --bench      (same thing)
+      python3 ~/.claude/hooks/tests/hook_bench.py record [--per-tool 20] [--out PATH]
+          (add payloads from recent session transcripts to the LOCAL corpus in
+           $STATE_DIR -- never the tracked file: tool inputs carry commands and
+           file contents. Values that look like credentials are redacted; review
+           a recording before copying any of it into bench_corpus.jsonl)
+      python3 ~/.claude/hooks/tests/hook_bench.py tokens [--mb 4]
+          (lib/text_tokens.scan vs the per-kind regex passes it replaced:
+           throughput on a multi-MB prompt-like text, outputs must agree)
+      python3 ~/.claude/hooks/tests/hook_bench.py issues [--issues 3000]
+          (open-issue scoring: bd_issues.hits over the snapshot's inverted
+           index vs the per-issue substring scan it replaced, outputs must agree)
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TESTS)
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS), 'lib'))
+import _state  # noqa: E402
+import bd_issues  # noqa: E402
+import hook_dispatch  # noqa: E402
+import hook_profile  # noqa: E402
+import text_tokens  # noqa: E402
+
+BUDGETS = os.path.join(TESTS, 'bench_budgets.json')
+CORPUS = os.path.join(TESTS, 'bench_corpus.jsonl')
+LOCAL_CORPUS = os.path.join(_state.STATE_DIR, 'bench_corpus.jsonl')
+TRANSCRIPTS = os.path.expanduser('~/.claude/projects')
+
+
+def load_budgets(path: str = BUDGETS) -> tuple[float, dict]:
+    try:
+        data = json.load(open(path))
+    except (OSError, ValueError):
+        return 500.0, {}
+    return float(data.get('default_ms', 500)), data.get('hooks') or {}
+
+
+def load_corpus(path: str = CORPUS) -> list[dict]:
+    out = []
+    try:
+        with open(path) as fh:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    try:
+                        out.append(json.loads(line))
+                    except ValueError:
+                        pass
+    except OSError:
+        pass
+    return out
+
+
+def _served_labels() -> set[str]:
+    return {hook_dispatch.hook_label(h['command'])
+            for hooks in hook_dispatch.load_groups().values() for h in hooks}
+
+
+def _time(hook, data, env, cwd, inprocess) -> float:
+    t0 = time.perf_counter()
+    hook_dispatch.run_hook(hook, data, env, cwd, inprocess=inprocess)
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def bench(n: int = 5, only: str | None = None, verbose: bool = False,
+          settings_path: str = hook_profile.SETTINGS, corpus_path: str = CORPUS,
+          budgets_path: str = BUDGETS, local_path: str = LOCAL_CORPUS) -> int:
+    hooks = hook_profile.discover(settings_path)
+    if not hooks:
+        sys.stderr.write(f"hook_bench: no hooks found in {settings_path}\n")
+        return 1
+    default_ms, budgets = load_budgets(budgets_path)
+    cases = hook_profile._case_payloads()
+    corpus = load_corpus(corpus_path) + load_corpus(local_path)
+    served = _served_labels()
+
+    sandbox = tempfile.mkdtemp(prefix='hook-bench-')
+    # In-process hooks import _state lazily (per module load), so re-pointing it
+    # here sandboxes the warm runs the same way the env does the spawned ones.
+    saved_env, saved_state = dict(os.environ), _state.STATE_DIR
+    os.environ.update(CLAUDE_STATE_DIR=sandbox, CLAUDE_SESSION_ID='hook-bench',
+                      CLAUDE_HOOK_LEDGER='0')
+    _state.STATE_DIR = sandbox
+    env = dict(os.environ)
+    results = []
+    try:
+        for event, matcher, h in hooks:
+            label = hook_dispatch.hook_label(h['command'])
+            if only and label != only:
+                continue
+            tools = hook_profile._tools_for(matcher)
+            payloads = hook_profile.payloads_for(event, matcher, label, cases)
+            payloads += [p for p in corpus if p.get('tool_name') in tools
+                         and p.get('hook_event_name', 'PreToolUse') == event]
+            blobs = [json.dumps(p).encode() for p in payloads]
+            first = _time(h, blobs[0], env, sandbox, inprocess=False)
+            cold = [_time(h, b, env, sandbox, False) for _ in range(n) for b in blobs]
+            warm = [_time(h, b, env, sandbox, True) for _ in range(n) for b in blobs]
+            is_served = label in served
+            median = statistics.median(warm if is_served else cold)
+            budget = float(budgets.get(label, default_ms))
+            results.append((f'{event}:{matcher}', label, len(blobs), first,
+                            statistics.median(cold), statistics.median(warm),
+                            is_served, median, budget))
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_env)
+        _state.STATE_DIR = saved_state
+        shutil.rmtree(sandbox, ignore_errors=True)
+
+    over = [r for r in results if r[7] > r[8]]
+    if verbose or over:
+        print(f"{'group':<34} {'hook':<34} {'pl':>3} {'first':>7} {'cold':>7} "
+              f"{'warm':>7} {'budget':>7}")
+        for group, label, npl, first, cold, warm, is_served, median, budget in \
+                sorted(results, key=lambda r: -r[7]):
+            mark = 'OVER ' if median > budget else ''
+            print(f"{group[:34]:<34} {label[:34]:<34} {npl:>3} {first:>7.1f} {cold:>7.1f}"
+                  f"{'*' if not is_served else ' '}{warm:>6.1f}{'*' if is_served else ' '}"
+                  f"{budget:>7.0f} {mark}")
+        print("  (* = wired mode, the median checked against the budget; ms)")
+    print(f"\nhook_bench: {len(results)} hooks x{n}, {len(over)} over budget")
+    for group, label, _, _, _, _, _, median, budget in over:
+        sys.stderr.write(f"FAIL  {label} ({group}): median {median:.1f}ms > budget {budget:.0f}ms\n")
+    return 1 if over else 0
+
+
+# key=value / header / token shapes that carry credentials in recorded commands
+_SECRET_RES = (
+    re.compile(r'(?i)(\bauthorization:\s*(?:bearer|basic|token)?\s*)[^\s"\']+'),
+    re.compile(r'(?i)\b((?!authorization\b)(?:[a-z0-9_]*(?:token|secret|passw(?:or)?d|api[_-]?key|auth))'
+               r'[a-z0-9_]*["\']?\s*[:=]\s*["\']?)[^\s"\'&;]+'),
+    re.compile(r'()\b(?:sk-[A-Za-z0-9_-]{16,}|gh[pousr]_[A-Za-z0-9]{20,}|xox[abpr]-[A-Za-z0-9-]{10,}'
+               r'|AKIA[0-9A-Z]{16}|eyJ[A-Za-z0-9_-]{10,}\.[A-Za-z0-9_-]{10,}\.[A-Za-z0-9_-]+)'),
+    re.compile(r'(://[^/\s:@]+:)[^/\s@]+(?=@)'),
+)
+
+
+def scrub(value):
+    """`value` with credential-looking substrings in every string replaced by
+    <redacted>."""
+    if isinstance(value, str):
+        for rx in _SECRET_RES:
+            value = rx.sub(lambda m: m.group(1) + '<redacted>', value)
+        return value
+    if isinstance(value, dict):
+        return {k: scrub(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [scrub(v) for v in value]
+    return value
+
+
+def record(per_tool: int = 20, out_path: str = LOCAL_CORPUS, root: str = TRANSCRIPTS) -> int:
+    """Append tool_use inputs from the newest session transcripts to the local
+    corpus as PreToolUse payloads (scrubbed; per-tool cap, exact duplicates
+    skipped)."""
+    corpus = load_corpus(out_path)
+    seen = {json.dumps(p, sort_keys=True) for p in corpus}
+    counts: dict[str, int] = {}
+    for p in corpus:
+        counts[p.get('tool_name', '')] = counts.get(p.get('tool_name', ''), 0) + 1
+    files = sorted(glob.glob(os.path.join(root, '*', '*.jsonl')), key=os.path.getmtime,
+                   reverse=True)
+    added = []
+    for f in files:
+        try:
+            fh = open(f)
+        except OSError:
+            continue
+        with fh:
+            for line in fh:
+                try:
+                    content = json.loads(line).get('message', {}).get('content')
+                except (ValueError, AttributeError):
+                    continue
+                for block in content if isinstance(content, list) else []:
+                    if not isinstance(block, dict) or block.get('type') != 'tool_use':
+                        continue
+                    tool = block.get('name', '')
+                    if counts.get(tool, 0) >= per_tool:
+                        continue
+                    p = {'hook_event_name': 'PreToolUse', 'tool_name': tool,
+                         'tool_input': scrub(block.get('input') or {})}
+                    key = json.dumps(p, sort_keys=True)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    counts[tool] = counts.get(tool, 0) + 1
+                    added.append(p)
+    if added:
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        with open(out_path, 'a') as fh:
+            fh.writelines(json.dumps(p) + '\n' for p in added)
+    print(f"hook_bench: recorded {len(added)} payloads -> {out_path}")
+    return 0
+
+
+# The independent passes text_tokens.scan() replaced (compose_time_check,
+# symbol_surface, _canonical_match_cli), kept as its reference implementation.
+LEGACY_TOKEN_RES = {
+    'snake': re.compile(r'\b([a-z][a-z0-9]*(?:_[a-z0-9]+){1,})\b'),
+    'camel': re.compile(r'\b([A-Z][a-z]+(?:[A-Z][a-z0-9]+)+)\b'),
+    'mixed': re.compile(r'\b([A-Za-z][A-Za-z0-9]*(?:_[A-Za-z0-9]+)+)\b'),
+    'upper': re.compile(r'\b([A-Z][A-Z0-9_]{2,})\b'),
+    'greek': re.compile(r'([α-ωΑ-Ω])'),
+    'frac': re.compile(r'\b(\d{1,4}/\d{1,4})\b'),
+    'assign': re.compile(r'\b([A-Za-z_]\w*)\s*=\s*[\d/\.]+'),
+    'verb': re.compile(r'\b(?:compute|derive|implement|prove|find|calculate|determine|evaluate|check)\s+'
+                       r'([A-Za-z_][A-Za-z0-9_]{2,})', re.IGNORECASE),
+}
+
+
+def legacy_tokens(text: str) -> dict[str, set[str]]:
+    return {k: {m.group(1) for m in rx.finditer(text)} for k, rx in LEGACY_TOKEN_RES.items()}
+
+
+_TOKEN_SAMPLE = (
+    "Compute shift_matrix_sq_48 and derive W_of_J from the SpectralTriple; G = 17/24, "
+    "alpha=3/64 while Q_EM_w stays fixed. Check ALL_CAPS_CONST and HTTPServer, then "
+    "prove that α + β = γ holds for T_3_L. items 10/11 of the plan: find eigenvalues "
+    "of M_full_48, evaluate   trace_of_rho, implement KernelBuilder.build(x = .5).\n")
+
+
+def tokens_bench(mb: float = 4.0, n: int = 3) -> int:
+    text = _TOKEN_SAMPLE * max(1, int(mb * (1 << 20) / len(_TOKEN_SAMPLE)))
+    size = len(text.encode()) / (1 << 20)
+    legacy = min(_clock(legacy_tokens, text) for _ in range(n))
+    single = min(_clock(lambda t: text_tokens.scan.__wrapped__(t), text) for _ in range(n))
+    same = {k: set(v) for k, v in text_tokens.scan.__wrapped__(text).items()} == legacy_tokens(text)
+    print(f"hook_bench tokens: {size:.1f} MB  legacy {len(LEGACY_TOKEN_RES)} passes "
+          f"{legacy * 1000:.0f} ms ({size / legacy:.1f} MB/s)  scan {single * 1000:.0f} ms "
+          f"({size / single:.1f} MB/s)  x{legacy / single:.2f}  outputs {'agree' if same else 'DIFFER'}")
+    return 0 if same else 1
+
+
+# open_issues_surface's per-issue scorer before the inverted index, kept as the
+# reference implementation of bd_issues.hits.
+def legacy_issue_hits(issues: list[dict], tokens: set[str]) -> dict[int, int]:
+    out = {}
+    for i, issue in enumerate(issues):
+        haystack = ((issue.get('title') or '') + ' ' + (issue.get('description') or '')).lower()
+        score = sum(1 for tok in tokens if tok in haystack)
+        if score:
+            out[i] = score
+    return out
+
+
+def synthetic_issues(n: int, seed: int = 11) -> tuple[list[dict], list[set[str]]]:
+    """`n` bd-like issues over a 4000-word vocabulary, plus 50 dispatch token sets."""
+    import random
+    rnd = random.Random(seed)
+    syll = ['spec', 'tral', 'solv', 'conv', 'erge', 'kern', 'matr', 'ix', 'gap', 'ratio', 'hook',
+            'cache', 'index', 'flow', 'gauge', 'field', 'trace', 'eigen', 'basis', 'norm']
+    vocab = sorted({''.join(rnd.choice(syll) for _ in range(rnd.randint(2, 4))) for _ in range(6000)})[:4000]
+    vocab += [f'{w}_{v}' for w, v in zip(vocab[:400], vocab[400:800])]
+    words = lambda k: ' '.join(rnd.choice(vocab) for _ in range(k))
+    issues = [{'id': f'kb-{i:05x}', 'priority': rnd.randint(0, 4), 'title': words(rnd.randint(4, 10)),
+               'description': words(rnd.randint(20, 80)) + '. See hooks/lib/x.py:12.'} for i in range(n)]
+    prompts = [{w.lower() for w in re.findall(r'\b([A-Za-z_][A-Za-z0-9_]{4,})\b', words(rnd.randint(15, 60)))}
+               for _ in range(50)]
+    return issues, prompts
+
+
+def issues_bench(n_issues: int = 3000) -> int:
+    issues, prompts = synthetic_issues(n_issues)
+    t0 = time.perf_counter()
+    index = bd_issues.build_index(issues)
+    build = time.perf_counter() - t0
+    plain, indexed = json.dumps({'issues': issues}), json.dumps({'issues': issues, 'index': index})
+    load_plain = min(_clock(json.loads, plain) for _ in range(3))
+    load_indexed = min(_clock(json.loads, indexed) for _ in range(3))
+    legacy = min(_clock(lambda ps: [legacy_issue_hits(issues, p) for p in ps], prompts) for _ in range(3))
+    fast = min(_clock(lambda ps: [bd_issues.hits(dict(index), p) for p in ps], prompts)  # one per hook process
+               for _ in range(3))
+    same = all(bd_issues.hits(index, p) == legacy_issue_hits(issues, p) for p in prompts)
+    print(f"hook_bench issues: {n_issues} issues, {index['words'].count(chr(10)) + 1} indexed words, "
+          f"{len(prompts)} dispatches  per dispatch: legacy {legacy / len(prompts) * 1000:.2f} ms  "
+          f"index {fast / len(prompts) * 1000:.2f} ms  x{legacy / fast:.1f}  "
+          f"(snapshot load {load_plain * 1000:.1f} -> {load_indexed * 1000:.1f} ms, "
+          f"index build {build * 1000:.0f} ms per refresh)  outputs {'agree' if same else 'DIFFER'}")
+    return 0 if same else 1
+
+
+def _clock(fn, arg) -> float:
+    t0 = time.perf_counter()
+    fn(arg)
+    return time.perf_counter() - t0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('mode', nargs='?', choices=('run', 'record', 'tokens', 'issues'), default='run')
+    ap.add_argument('-n', type=int, default=5, help='runs per payload')
+    ap.add_argument('--hook', help='only this hook (basename)')
+    ap.add_argument('--per-tool', type=int, default=20, help='record: cap per tool')
+    ap.add_argument('--out', default=LOCAL_CORPUS, help='record: corpus to append to')
+    ap.add_argument('--mb', type=float, default=4.0, help='tokens: input size')
+    ap.add_argument('--issues', type=int, default=3000, help='issues: snapshot size')
+    ap.add_argument('-v', action='store_true')
+    args = ap.parse_args(argv)
+    if args.mode == 'record':
+        return record(args.per_tool, args.out)
+    if args.mode == 'tokens':
+        return tokens_bench(args.mb)
+    if args.mode == 'issues':
+        return issues_bench(args.issues)
+    return bench(args.n, args.hook, args.v)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Hook latency profiler: replay payloads through the wired hooks, report p50/p95/p99.
+
+Both halves read/write the timing ledger (lib/hook_ledger.py, under $STATE_DIR):
+
+  replay  Discover every hook wired in settings.json (via verify_settings_paths'
+          parser, expanding hookd-client groups from hookd/groups.json) and run
+          each one as Claude Code would -- its own process, payload on stdin --
+          N times. Payloads come from run_hook_tests.CASES where a case targets
+          the hook, else a minimal sample for the matcher's tool. Hooks run
+          against a throwaway CLAUDE_STATE_DIR and cwd, so replay never touches
+          live session state. Rows are tagged source=replay.
+  report  p50/p95/p99/max per matcher (the group TOTAL rows) and per hook,
+          slowest first, next to the timeout budget the hook is wired with.
+          Live rows come from the warm daemon (lib/hook_dispatch.py records
+          every served hook); replay rows from the above. Hooks Claude Code
+          runs directly (outside hookd/groups.json) never reach the live
+          ledger: the report lists them, and only replay measures them.
+
+Run:  python3 ~/.claude/hooks/tests/hook_profile.py replay [-n 5] [--event PreToolUse]
+      python3 ~/.claude/hooks/tests/hook_profile.py report [--since 24h] [--source live]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TESTS)
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS), 'lib'))
+import hook_dispatch  # noqa: E402
+import hook_ledger  # noqa: E402
+import run_hook_tests  # noqa: E402
+import verify_settings_paths  # noqa: E402
+
+SETTINGS = os.path.join(os.path.dirname(os.path.dirname(TESTS)), 'settings.json')
+TOOL_EVENTS = ('PreToolUse', 'PostToolUse')
+
+_CLIENT_RX = re.compile(r'hookd-client\.py\s+(\S+)')
+
+# Minimal tool_input per tool, for hooks no CASES entry exercises.
+_SAMPLE_INPUT = {
+    'Bash': {'command': 'ls -la'},
+    'Read': {'file_path': os.path.abspath(__file__)},
+    'Edit': {'file_path': '/tmp/hook-profile.txt', 'old_string': 'a', 'new_string': 'b'},
+    'Write': {'file_path': '/tmp/hook-profile.txt', 'content': 'x\n'},
+    'Task': {'subagent_type': 'general-purpose', 'description': 'profile', 'prompt': 'profile'},
+}
+
+
+def discover(settings_path: str = SETTINGS, events=TOOL_EVENTS):
+    """Return [(event, matcher, {command, timeout})] for every wired hook, with
+    hookd-client groups expanded to the hooks they serve."""
+    try:
+        data = json.load(open(settings_path))
+    except (OSError, ValueError):
+        return []
+    served = hook_dispatch.load_groups()
+    out = []
+    for event, matcher, h in verify_settings_paths._hook_entries(data):
+        if events and event not in events:
+            continue
+        m = _CLIENT_RX.search(h['command'])
+        if m:
+            out.extend((event, matcher, sh) for sh in served.get(m.group(1), []))
+        else:
+            out.append((event, matcher, h))
+    return out
+
+
+def _tools_for(matcher: str) -> list[str]:
+    return [t for t in matcher.split('|') if re.fullmatch(r'\w+', t)] or ['Bash']
+
+
+def _sample_payload(event: str, matcher: str) -> dict:
+    tool = _tools_for(matcher)[0]
+    p = {'hook_event_name': event, 'session_id': 'hook-profile',
+         'tool_name': tool, 'tool_input': _SAMPLE_INPUT.get(tool, {})}
+    if event == 'PostToolUse':
+        p['tool_result'] = {'exitCode': 0, 'stdout': '', 'stderr': ''}
+    return p
+
+
+def _case_payloads() -> dict[str, list[dict]]:
+    """hook basename -> payloads run_hook_tests.CASES feeds it."""
+    idx: dict[str, list[dict]] = {}
+    for _, argv, payload, _, _ in run_hook_tests.CASES:
+        idx.setdefault(os.path.basename(argv[-1]), []).append(payload)
+    return idx
+
+
+def payloads_for(event: str, matcher: str, label: str, cases: dict) -> list[dict]:
+    tools = _tools_for(matcher)
+    hits = [p for p in cases.get(label, []) if p.get('tool_name') in tools]
+    return hits or [_sample_payload(event, matcher)]
+
+
+def replay(n: int, events, settings_path: str = SETTINGS, ledger: str = hook_ledger.LEDGER,
+           verbose: bool = False) -> int:
+    hooks = discover(settings_path, events)
+    if not hooks:
+        sys.stderr.write(f"hook_profile: no hooks found in {settings_path}\n")
+        return 1
+    cases = _case_payloads()
+    sandbox = tempfile.mkdtemp(prefix='hook-profile-')
+    env = dict(os.environ, CLAUDE_STATE_DIR=sandbox, CLAUDE_SESSION_ID='hook-profile',
+               CLAUDE_HOOK_LEDGER='0')
+    try:
+        for i in range(n):
+            totals: dict[str, float] = {}
+            rows = []
+            for event, matcher, h in hooks:
+                group = f'{event}:{matcher}' if matcher else event
+                label = hook_dispatch.hook_label(h['command'])
+                for k, payload in enumerate(payloads_for(event, matcher, label, cases)):
+                    data = json.dumps(payload).encode()
+                    t0 = time.perf_counter()
+                    rc, out, err = hook_dispatch.run_hook(h, data, env, sandbox, inprocess=False)
+                    ms = (time.perf_counter() - t0) * 1000.0
+                    rows.append((group, label, ms, rc, len(out) + len(err)))
+                    if k == 0:
+                        totals[group] = totals.get(group, 0.0) + ms
+            rows.extend((g, hook_ledger.TOTAL, ms, 0, 0) for g, ms in totals.items())
+            hook_ledger.record(rows, source='replay', path=ledger)
+            if verbose:
+                print(f"  pass {i + 1}/{n}: {len(rows) - len(totals)} invocations")
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+    print(f"hook_profile: replayed {len(hooks)} hooks x{n} -> {ledger}")
+    return 0
+
+
+def _budgets(settings_path: str) -> dict[tuple[str, str], int]:
+    """(group, hook label) -> wired timeout ms; TOTAL -> the group's own timeout."""
+    b = {}
+    try:
+        data = json.load(open(settings_path))
+    except (OSError, ValueError):
+        return b
+    served = hook_dispatch.load_groups()
+    for event, matcher, h in verify_settings_paths._hook_entries(data):
+        group = f'{event}:{matcher}' if matcher else event
+        t = h.get('timeout') or hook_dispatch.DEFAULT_TIMEOUT_MS
+        m = _CLIENT_RX.search(h['command'])
+        if m:
+            b[(group, hook_ledger.TOTAL)] = t
+            for sh in served.get(m.group(1), []):
+                b[(group, hook_dispatch.hook_label(sh['command']))] = \
+                    sh.get('timeout') or hook_dispatch.DEFAULT_TIMEOUT_MS
+        else:
+            b[(group, hook_dispatch.hook_label(h['command']))] = t
+    return b
+
+
+def _direct_hooks(settings_path: str) -> list[tuple[str, str]]:
+    """(group, hook label) of every hook settings.json wires directly, i.e.
+    not through a hookd-client group -- hooks with no live timings."""
+    try:
+        data = json.load(open(settings_path))
+    except (OSError, ValueError):
+        return []
+    out = []
+    for event, matcher, h in verify_settings_paths._hook_entries(data):
+        if not _CLIENT_RX.search(h['command']):
+            out.append((f'{event}:{matcher}' if matcher else event,
+                        hook_dispatch.hook_label(h['command'])))
+    return out
+
+
+def _parse_age(s: str) -> float:
+    m = re.fullmatch(r'(\d+(?:\.\d+)?)([smhd]?)', s or '')
+    if not m:
+        raise argparse.ArgumentTypeError(f"bad age {s!r} (e.g. 30m, 24h, 7d)")
+    return float(m.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}[m.group(2)]
+
+
+def summarize(rows) -> dict[tuple[str, str], dict]:
+    """(group, hook) -> {n, p50, p95, p99, max, timeouts, bytes}."""
+    samples: dict[tuple[str, str], list[float]] = {}
+    timeouts: dict[tuple[str, str], int] = {}
+    nbytes: dict[tuple[str, str], int] = {}
+    for _, group, hook, ms, rc, ob, _ in rows:
+        key = (group, hook)
+        samples.setdefault(key, []).append(ms)
+        timeouts[key] = timeouts.get(key, 0) + (rc == 'T')
+        nbytes[key] = nbytes.get(key, 0) + ob
+    out = {}
+    for key, vals in samples.items():
+        vals.sort()
+        out[key] = {'n': len(vals), 'p50': hook_ledger.percentile(vals, 50),
+                    'p95': hook_ledger.percentile(vals, 95),
+                    'p99': hook_ledger.percentile(vals, 99), 'max': vals[-1],
+                    'timeouts': timeouts[key], 'bytes': nbytes[key] // len(vals)}
+    return out
+
+
+def report(since_s: float, source: str | None, group: str | None,
+           settings_path: str = SETTINGS, ledger: str = hook_ledger.LEDGER) -> int:
+    since = time.time() - since_s if since_s else 0.0
+    rows = [r for r in hook_ledger.read(ledger, since, source) if not group or r[1] == group]
+    if not rows:
+        print(f"hook_profile: no ledger rows in {ledger}")
+        return 0
+    stats = summarize(rows)
+    budgets = _budgets(settings_path)
+    hdr = f"{'':<56} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'budget':>7}  {'T/O':>3} {'out_B':>6}"
+
+    def line(name, key):
+        s = stats[key]
+        b = budgets.get(key)
+        flag = ' OVER' if b and s['p99'] >= b else ''
+        return (f"{name[:56]:<56} {s['n']:>6} {s['p50']:>8.1f} {s['p95']:>8.1f} "
+                f"{s['p99']:>8.1f} {s['max']:>8.1f} {b if b else '-':>7}  "
+                f"{s['timeouts']:>3} {s['bytes']:>6}{flag}")
+
+    print("per matcher (group total, ms)")
+    print(hdr)
+    for key in sorted((k for k in stats if k[1] == hook_ledger.TOTAL),
+                      key=lambda k: -stats[k]['p95']):
+        print(line(key[0], key))
+    print("\nper hook (ms, slowest p95 first)")
+    print(hdr)
+    for key in sorted((k for k in stats if k[1] != hook_ledger.TOTAL),
+                      key=lambda k: -stats[k]['p95']):
+        print(line(f"{key[0]}  {key[1]}", key))
+    if source != 'replay':
+        unseen = [k for k in _direct_hooks(settings_path) if k not in stats]
+        if unseen:
+            print(f"\nnot in the live ledger -- run directly by Claude Code, not by hookd "
+                  f"(time them with `replay`): {len(unseen)} hooks")
+            for g, h in unseen:
+                print(f"  {g}  {h}")
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    rp = sub.add_parser('replay', help='run every wired hook N times and record timings')
+    rp.add_argument('-n', type=int, default=5)
+    rp.add_argument('--event', action='append', help='event to replay (repeatable; '
+                    'default PreToolUse + PostToolUse)')
+    rp.add_argument('--settings', default=SETTINGS)
+    rp.add_argument('-v', action='store_true')
+    rr = sub.add_parser('report', help='p50/p95/p99 per matcher and per hook')
+    rr.add_argument('--since', type=_parse_age, default=0.0, help='e.g. 30m, 24h, 7d')
+    rr.add_argument('--source', choices=('live', 'replay'))
+    rr.add_argument('--group', help='only this Event:Matcher group')
+    rr.add_argument('--settings', default=SETTINGS)
+    args = ap.parse_args()
+    if args.cmd == 'replay':
+        return replay(args.n, tuple(args.event or TOOL_EVENTS), args.settings, verbose=args.v)
+    return report(args.since, args.source, args.group, args.settings)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,9 +14,11 @@ Decision model (what we assert per case):
 
 Run:  python3 ~/.claude/hooks/tests/run_hook_tests.py        (exit 0 = all pass)
       python3 ~/.claude/hooks/tests/run_hook_tests.py -v     (show every case)
+      python3 ~/.claude/hooks/tests/run_hook_tests.py --bench  (latency budgets,
+                                                    see hook_bench.py)
 A nonzero exit means a hook's behavior changed — investigate before shipping.
 """
-import json, os, subprocess, sys
+import json, os, subprocess, sys, time
 
 HOOKS = os.path.expanduser('~/.claude/hooks')
 
@@ -204,6 +206,24 @@ def state_tests():
              env={'CLAUDE_STATE_DIR': '/tmp/kbtest-ovr'})
     r.append(('state: state.sh honors CLAUDE_STATE_DIR', p.stdout.strip() == '/tmp/kbtest-ovr', p.stdout.strip()))
 
+    # 3a. payload.sh payload_fields: the one decoder behind the shell hooks.
+    #     Missing/null -> empty, non-strings as JSON, `//` defaults, @sh quoting
+    #     survives quotes/newlines/$(...), malformed JSON -> all empty.
+    script = (f'source "{LIB}/payload.sh"; A=stale; payload_fields "$1" A=.a B=.b C=.c D=.d N=.n M=.missing '
+              'F=\'.missing // "dflt"\' G=\'.b // 7\' X=".x[]" "bad-name=.a"; declare -p A B C D N M F G X')
+    val = 'it\'s "q" $(touch PWNED) `id`\nline2\n\n'
+    p = _run(['bash', '-c', script, 'payload', json.dumps(
+        {'a': val, 'b': False, 'c': None, 'd': {'k': [1, 'v']}, 'n': 3.5, 'x': ['x1', 'x2']})])
+    got = dict(l.split(' ', 2)[2].split('=', 1) for l in p.stdout.splitlines())
+    q = _run(['bash', '-c', f'source "{LIB}/payload.sh"; A=stale; payload_fields "$1" A=.a; '
+              'echo "[$A]"', 'payload', '{"a": "x", oops'])
+    ok = got == {'A': '$\'it\\\'s "q" $(touch PWNED) `id`\\nline2\'', 'B': '"false"', 'C': '""',
+                 'D': '"{\\"k\\":[1,\\"v\\"]}"', 'N': '"3.5"', 'M': '""', 'F': '"dflt"', 'G': '"7"',
+                 'X': '"x1"'} \
+        and not os.path.exists('PWNED') and q.stdout == '[]\n'
+    r.append(('state: payload_fields missing/null/non-string/default/quoting/malformed', ok,
+              p.stdout + p.stderr[-200:] + q.stdout))
+
     # 4. session-init GC: old files swept, fresh kept, owed-deferred trimmed by epoch
     T = tempfile.mkdtemp()
     try:
@@ -211,14 +231,370 @@ def state_tests():
         old = os.path.join(T, 'sidA-context'); open(old, 'w').close(); os.utime(old, (now - 20000, now - 20000))
         oldd = os.path.join(T, 'sidA-readcov'); os.mkdir(oldd); os.utime(oldd, (now - 20000, now - 20000))
         fresh = os.path.join(T, 'sidB-context'); open(fresh, 'w').close()
+        # WAL stores go as a unit: sidC's .db is old but its -wal is live (kept);
+        # every member of sidD's is old (all swept).
+        walc = [os.path.join(T, 'sidC-hook-seen.db' + x) for x in ('', '-wal', '-shm')]
+        wald = [os.path.join(T, 'sidD-readcov.db' + x) for x in ('', '-wal', '-shm')]
+        for f in walc + wald:
+            open(f, 'w').close()
+            if f != walc[1]:
+                os.utime(f, (now - 20000, now - 20000))
         od = os.path.join(T, 'owed-deferred'); open(od, 'w').write(f'{now - 25000} 1 old\n{now - 50} 2 fresh\n')
         _run(['bash', _find('session-init.sh')], env={'CLAUDE_STATE_DIR': T}, stdin='{}')
         body = open(od).read() if os.path.exists(od) else ''
         ok = (not os.path.exists(old)) and (not os.path.exists(oldd)) and os.path.exists(fresh) \
-            and ('2 fresh' in body) and ('1 old' not in body)
-        r.append(('state: GC sweeps old (+readcov), keeps fresh, trims owed-deferred', ok,
+            and ('2 fresh' in body) and ('1 old' not in body) \
+            and all(map(os.path.exists, walc)) and not any(map(os.path.exists, wald))
+        r.append(('state: GC sweeps old (+readcov, whole WAL stores), keeps fresh, trims owed-deferred', ok,
                   f"old_gone={not os.path.exists(old)} dir_gone={not os.path.exists(oldd)} "
-                  f"fresh={os.path.exists(fresh)} owed={body.strip()!r}"))
+                  f"fresh={os.path.exists(fresh)} owed={body.strip()!r} "
+                  f"walc={[os.path.exists(f) for f in walc]} wald={[os.path.exists(f) for f in wald]}"))
+    finally:
+        shutil.rmtree(T, ignore_errors=True)
+
+    # 4a. shared session resolver: a nested hook (PPID is not the owner) walks
+    #     /proc once via _state.py, records pidsid-<ppid>, and later lookups
+    #     follow the index to a freshly read session-<owner> (rewritten on /clear)
+    T = tempfile.mkdtemp()
+    try:
+        open(os.path.join(T, f'session-{os.getpid()}'), 'w').write('sidOld\n')
+        inner = f'source "{LIB}/state.sh"; echo "$(session_id) $PPID"'
+        outer = (f'source "{LIB}/state.sh"; bash -c \'{inner}\'; '
+                 f'echo sidNew > "$STATE_DIR/session-{os.getpid()}"; bash -c \'{inner}\'; '
+                 f'python3 "{LIB}/_state.py" session-id $$')
+        p = _run(['bash', '-c', outer], env={'CLAUDE_STATE_DIR': T, 'CLAUDE_SESSION_ID': ''})
+        lines = p.stdout.split('\n')
+        idx = os.path.join(T, f'pidsid-{lines[0].split()[-1]}') if lines[0] else ''
+        ok = [l.split()[0] for l in lines[:3] if l] == ['sidOld', 'sidNew', 'sidNew'] \
+            and os.path.isfile(idx) and open(idx).read().split()[0] == str(os.getpid())
+        r.append(('state: session resolver walks once, pid index follows owner', ok,
+                  p.stdout + p.stderr[-200:]))
+    finally:
+        shutil.rmtree(T, ignore_errors=True)
+
+    # 4b. read coverage: sub-agent whole-file policy over the single-file index
+    T = tempfile.mkdtemp()
+    try:
+        big = os.path.join(T, 'big.py'); open(big, 'w').write('x = 1\n' * 2500 + 'y = 2')
+        small = os.path.join(T, 'small.py'); open(small, 'w').write('z = 3\n' * 10)
+        env = {'CLAUDE_STATE_DIR': T, 'CLAUDE_SESSION_ID': 'sidR'}
+
+        def _read(fp, agent=True, **ti):
+            d = {'tool_name': 'Read', 'tool_input': dict(file_path=fp, **ti)}
+            if agent:
+                d['agent_id'] = 'a1'
+            return _run(bash('read-coverage-gate.sh'), env=env, stdin=json.dumps(d))
+        rcs = [_read(small, offset=3, limit=2).returncode,      # small-file slice
+               _read(big, offset=2200, limit=100).returncode,   # mid-file jump
+               _read(big, offset=1, limit=2000).returncode,     # page 1
+               _read(big, offset=2001, limit=2000).returncode]  # page 2 (contiguous)
+        p = _run(['python3', '-c', 'import readcov as r; c = r.connect("sidR"); '
+                  'print(r.maxend(c, __import__("sys").argv[1]), r.line_count(c, __import__("sys").argv[1]))', big],
+                 env=dict(env, PYTHONPATH=LIB))
+        ok = rcs == [2, 2, 0, 0] and p.stdout.split() == ['2501', '2501'] \
+            and os.path.isfile(os.path.join(T, 'sidR-readcov.db')) \
+            and not os.path.exists(os.path.join(T, 'sidR-readcov'))
+        r.append(('state: read coverage gate blocks slices/jumps, tracks paging in readcov.db', ok,
+                  f'rcs={rcs} {p.stdout.strip()} {p.stderr[-200:]}'))
+        # main session, out of order: the middle page joins the spans either side
+        big2 = os.path.join(T, 'big2.py'); open(big2, 'w').write('x = 1\n' * 2500)
+        notes = [_read(big2, agent=False, offset=o, limit=n).stderr
+                 for o, n in ((1, 500), (1000, 501), (501, 499))]
+        p = _run(['python3', '-c', 'import readcov as r, sys; c = r.connect("sidR"); '
+                  'print(r.spans(c, sys.argv[1]), r.maxend(c, sys.argv[1]))', big2],
+                 env=dict(env, PYTHONPATH=LIB))
+        ok = p.stdout.strip() == '[[1, 1500]] 1500' \
+            and 'unread 501-999, 1501-2500' in notes[1] and 'offset=501, limit=499' in notes[1] \
+            and 'unread 1501-2500' in notes[2] and 'offset=1501' in notes[2]
+        r.append(('state: read coverage merges out-of-order pages, NOTE names the gaps', ok,
+                  f'{p.stdout.strip()} {notes} {p.stderr[-200:]}'))
+    finally:
+        shutil.rmtree(T, ignore_errors=True)
+
+    # 4c. _seen store: insert-if-absent, legacy line-file import, TTL re-surface,
+    #     fail-open without a session
+    T = tempfile.mkdtemp()
+    try:
+        open(os.path.join(T, 'sidS-hook-seen'), 'w').write('sym:old\n')
+        code = ('from _seen import filter_unseen as f; import time\n'
+                'print(f(["sym:old", "sym:a", "sym:b"]), f(["sym:a", "sym:c"]))')
+        env = {'PYTHONPATH': LIB, 'CLAUDE_STATE_DIR': T, 'CLAUDE_SESSION_ID': 'sidS'}
+        p = _run(['python3', '-c', code], env=env)
+        p2 = _run(['python3', '-c', 'import time; time.sleep(0.3); from _seen import filter_unseen as f; '
+                   'print(f(["sym:a", "sym:d"]))'], env=dict(env, CLAUDE_SEEN_TTL='0.2'))
+        p3 = _run(['python3', '-c', 'from _seen import filter_unseen as f; print(f(["sym:a"]))'],
+                  env=dict(env, CLAUDE_SESSION_ID='', CLAUDE_STATE_DIR=os.path.join(T, 'nosession')))
+        ok = p.stdout.strip() == "['sym:a', 'sym:b'] ['sym:c']" \
+            and p2.stdout.strip() == "['sym:a', 'sym:d']" and p3.stdout.strip() == "['sym:a']" \
+            and not os.path.exists(os.path.join(T, 'sidS-hook-seen'))
+        r.append(('state: _seen sqlite store dedups, imports legacy file, TTL, fails open', ok,
+                  p.stdout + p2.stdout + p3.stdout + p.stderr[-200:]))
+    finally:
+        shutil.rmtree(T, ignore_errors=True)
+
+    # 4d. dep index: built once per project root, refreshed per changed file,
+    #     serves the augmentation.
+    #     Python is parsed natively; only the unparseable d.py reaches ast-grep,
+    #     stood in for by a regex script with the same --json shape.
+    T = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(T, 'bin')); repo = os.path.join(T, 'repo'); os.makedirs(repo)
+        fake = os.path.join(T, 'bin', 'ast-grep')
+        open(fake, 'w').write(
+            '#!/usr/bin/env python3\nimport json, os, re, sys\n'
+            'a = sys.argv[1:]; pat = a[a.index("--pattern") + 1]; paths = a[a.index("--json") + 1:]\n'
+            f'open({os.path.join(T, "calls")!r}, "a").write(f"{{pat}}\\t{{len(paths)}}\\n")\n'
+            'rx = r"^def (\\w+)" if pat == "def $N($$$): $$$" else r"(?<!def )\\b([\\w.]+)\\(" if pat == "$N($$$)" else None\n'
+            'out = []\n'
+            'for f in paths:\n'
+            '    for i, line in enumerate(open(f)):\n'
+            '        for m in (re.finditer(rx, line) if rx else ()):\n'
+            '            out.append({"file": f, "range": {"start": {"line": i}}, '
+            '"metaVariables": {"single": {"N": {"text": m.group(1)}}}})\n'
+            'print(json.dumps(out))\n')
+        os.chmod(fake, 0o755)
+        # a.py sits in a subpackage: the root is the git toplevel, not pkg/, and
+        # the .gitignore'd gen/ stays out of the index.
+        subprocess.run(['git', 'init', '-q', repo], check=True)
+        os.makedirs(os.path.join(repo, 'pkg')); os.makedirs(os.path.join(repo, 'gen'))
+        open(os.path.join(repo, '.gitignore'), 'w').write('gen/\n')
+        open(os.path.join(repo, 'gen', 'e.py'), 'w').write('f1()\n')
+        a = os.path.join(repo, 'pkg', 'a.py')
+        open(a, 'w').write('def f1():\n    return 1\n' + 'x = 0\n' * 50 + 'def f2():\n    return f1()\n')
+        open(os.path.join(repo, 'b.py'), 'w').write('from a import f1, f2\nprint(f1(), f2())\n')
+        open(os.path.join(repo, 'c.py'), 'w').write('import a\na.f2()\n')
+        open(os.path.join(repo, 'd.py'), 'w').write('def f3(:\n    pass\n')  # ast cannot parse
+        env = {'CLAUDE_STATE_DIR': T, 'CLAUDE_SESSION_ID': 'sidD', 'PYTHONPATH': LIB,
+               'PATH': os.path.join(T, 'bin') + os.pathsep + os.environ.get('PATH', '')}
+        build = lambda: _run(['python3', os.path.join(LIB, 'depindex.py'), repo], env=env)
+        build()
+        first = open(os.path.join(T, 'calls')).read().splitlines()
+        aug = _run(bash('read-dep-augment.sh'), env=env, stdin=json.dumps(
+            {'tool_name': 'Read', 'tool_input': {'file_path': a, 'offset': 1, 'limit': 5}})).stderr
+        open(os.path.join(T, 'calls'), 'w').close()
+        open(os.path.join(repo, 'c.py'), 'a').write('a.f1()\n')
+        os.unlink(os.path.join(repo, 'b.py'))
+        build()
+        calls = [l.rsplit('\t', 1)[1] for l in open(os.path.join(T, 'calls')).read().splitlines()]
+        p = _run(['python3', '-c', 'import depindex as d, sys; c = d.connect(sys.argv[1]); '
+                  'print(d.consumers(c, "f1", sys.argv[2], 9), d.complete(c))', repo, a], env=env)
+        q = _run(['python3', '-c', 'import depindex as d, sys; c = d.connect(sys.argv[1]); '
+                  'print(d.defs_in(c, sys.argv[2]))', repo, os.path.join(repo, 'd.py')], env=env)
+        ok = q.stdout.strip() == "[('f3', 1)]" and 'f2(L53)' in aug \
+            and _run(['python3', '-c', 'import _state, sys; print(_state.project_root(sys.argv[1]))', a],
+                     env=env).stdout.strip() == repo and f"f1 -> {os.path.join(repo, 'b.py')}:2" in aug \
+            and [l.rsplit('\t', 1)[1] for l in first] == ['1'] * 5 and calls == [] \
+            and p.stdout.strip() == f"['{os.path.join(repo, 'c.py')}:3'] True"
+        r.append(('state: dep index answers augmentation, re-indexes only changed files', ok,
+                  f'{aug!r} {calls} {p.stdout.strip()} {p.stderr[-300:]}'))
+        # Foreground refresh is `ast` only: a stale non-Python file spawns no
+        # ast-grep, it marks the root due for the builder. Same-named defs
+        # (methods of two classes, a redefinition) each keep their row.
+        e = os.path.join(repo, 'e.py')
+        open(e, 'w').write('class A:\n    def run(self):\n        pass\nclass B:\n    def run(self):\n'
+                           '        pass\ndef run():\n    pass\n')
+        sh_file = os.path.join(repo, 'tool.sh')
+        open(sh_file, 'w').write('go() { :; }\n')
+        open(os.path.join(T, 'calls'), 'w').close()
+        q = _run(['python3', '-c', 'import depindex as d, sys; c = d.connect(sys.argv[1]); '
+                  'print(d.refresh_file(c, sys.argv[2]), d.defs_in(c, sys.argv[2]), '
+                  'd.refresh_file(c, sys.argv[3]), d.due(c))', repo, e, sh_file], env=env)
+        ok = q.stdout.strip() == ("True [('A', 1), ('run', 2), ('B', 4), ('run', 5), ('run', 7)] False True") \
+            and open(os.path.join(T, 'calls')).read() == ''
+        r.append(('state: dep index refreshes Python in-process only, keeps every same-named def', ok,
+                  q.stdout + q.stderr[-300:]))
+    finally:
+        shutil.rmtree(T, ignore_errors=True)
+
+    # 4d'. open-issues snapshot: the surfacing hook never runs bd; a stale or
+    #      missing snapshot is refreshed detached, bd-lifecycle.sh invalidates it.
+    T = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(T, 'bin')); repo = os.path.join(T, 'repo')
+        os.makedirs(os.path.join(repo, '.beads')); subprocess.run(['git', 'init', '-q', repo], check=True)
+        issues = os.path.join(T, 'issues.json')
+        open(issues, 'w').write(json.dumps([{'id': 'kb-aaa', 'priority': 1, 'status': 'open',
+                                             'title': 'spectral solver convergence regression'}]))
+        fake = os.path.join(T, 'bin', 'bd')
+        open(fake, 'w').write(f'#!/bin/sh\necho "$*" >> {T}/calls\ncat {issues}\n')
+        os.chmod(fake, 0o755)
+        env = {'CLAUDE_STATE_DIR': os.path.join(T, 'state'), 'CLAUDE_SESSION_ID': 'sidB',
+               'CLAUDE_PROJECT_DIR': repo, 'PATH': os.path.join(T, 'bin') + os.pathsep + os.environ.get('PATH', '')}
+        task = json.dumps({'tool_name': 'Task', 'tool_input': {
+            'prompt': 'Investigate the spectral solver convergence regression before release'}})
+        snap = _run(['python3', '-c', 'import bd_issues as b, sys; print(b.snapshot_path(sys.argv[1]))', repo],
+                    env=dict(env, PYTHONPATH=LIB)).stdout.strip()
+
+        def settle(cond):
+            for _ in range(100):
+                if cond():
+                    return True
+                time.sleep(0.05)
+            return False
+        p1 = _run(py('open_issues_surface.py'), env=env, stdin=task)  # no snapshot yet: nothing, refresh spawned
+        fresh = settle(lambda: os.path.exists(snap))
+        p2 = _run(py('open_issues_surface.py'), env=env, stdin=task)
+        open(issues, 'w').write(json.dumps([{'id': 'kb-bbb', 'priority': 2, 'title':
+                                             'spectral solver convergence regression, second report'}]))
+        _run(bash('bd-lifecycle.sh'), env=env, stdin=json.dumps(
+            {'tool_name': 'Bash', 'tool_input': {'command': 'bd create "second report"'}}))
+        fresh = fresh and settle(lambda: 'kb-bbb' in open(snap).read() and not os.path.exists(snap + '.dirty'))
+        p3 = _run(py('open_issues_surface.py'), env=env, stdin=task)
+        calls = open(os.path.join(T, 'calls')).read().splitlines()
+        ok = fresh and p1.stdout == '' and '[OPEN-BD: kb-aaa (P1)' in p2.stdout \
+            and '[OPEN-BD: kb-bbb (P2)' in p3.stdout and calls == ['list --status=open --json'] * 2
+        r.append(('state: open-issues snapshot serves the hook, refreshed detached + on bd writes', ok,
+                  f'{p1.stdout!r} {p2.stdout!r} {p3.stdout!r} {calls} {p3.stderr[-200:]}'))
+        # Inverted-index scoring == the per-issue substring scan it replaced
+        # (hook_bench.legacy_issue_hits), on synthetic issues plus edge cases.
+        code = ('import json, bd_issues as b, hook_bench as hb\n'
+                'issues, prompts = hb.synthetic_issues(400)\n'
+                'issues += [{"title": None}, {"title": "Spectral_Gap", "description": "ÉCOLE école x.solver(y)"},\n'
+                '           {"title": "prefix_solverness"}]\n'
+                'prompts += [{"solver", "spectral_gap", "école", "gap_r"}, set()]\n'
+                'index = json.loads(json.dumps(b.build_index(issues)))\n'
+                'print(sum(b.hits(index, p) != hb.legacy_issue_hits(issues, p) for p in prompts))')
+        p = _run(['python3', '-c', code], env={'PYTHONPATH': LIB + os.pathsep + os.path.join(HOOKS, 'tests')})
+        r.append(('state: open-issues inverted index scores like the per-issue scan',
+                  p.stdout.strip() == '0', p.stdout[-300:] + p.stderr[-300:]))
+        # A kb sub-project (own .claude/kb-project.json) shares its repo's bd
+        # snapshot: resolved by .beads/.git, not by the kb project root.
+        sub = os.path.join(repo, 'sub')
+        os.makedirs(os.path.join(sub, '.claude'))
+        open(os.path.join(sub, '.claude', 'kb-project.json'), 'w').write('{"kb_project": "subp"}')
+        root = _run(['python3', '-c', 'import bd_issues as b, sys; print(b.repo_root(sys.argv[1]))', sub],
+                    env=dict(env, PYTHONPATH=LIB)).stdout.strip()
+        p4 = _run(py('open_issues_surface.py'), env=dict(env, CLAUDE_PROJECT_DIR=sub, CLAUDE_SESSION_ID='sidC'),
+                 stdin=task)
+        ok = root == repo and '[OPEN-BD: kb-bbb (P2)' in p4.stdout
+        r.append(('state: open-issues snapshot keyed by the bd root, not a kb sub-project', ok,
+                  f'{root} {p4.stdout!r} {p4.stderr[-200:]}'))
+        # A failing bd still leaves a fresh snapshot (empty, or the old one
+        # re-touched), so load() does not respawn a refresher on every dispatch.
+        repo2 = os.path.join(T, 'repo2'); os.makedirs(os.path.join(repo2, '.beads'))
+        os.makedirs(os.path.join(T, 'bin2'))
+        fake2 = os.path.join(T, 'bin2', 'bd')
+        open(fake2, 'w').write(f'#!/bin/sh\necho "$*" >> {T}/calls2\nexit 1\n')
+        os.chmod(fake2, 0o755)
+        env2 = dict(env, CLAUDE_PROJECT_DIR=repo2,
+                    PATH=os.path.join(T, 'bin2') + os.pathsep + os.environ.get('PATH', ''))
+        _run(['python3', os.path.join(LIB, 'bd_issues.py'), repo2], env=env2)
+        snap2 = _run(['python3', '-c', 'import bd_issues as b, sys; print(b.snapshot_path(sys.argv[1]))', repo2],
+                     env=dict(env2, PYTHONPATH=LIB)).stdout.strip()
+        empty = os.path.exists(snap2) and json.load(open(snap2))['issues'] == []
+        for _ in range(3):
+            _run(py('open_issues_surface.py'), env=env2, stdin=task)
+        time.sleep(0.5)
+        n1 = len(open(os.path.join(T, 'calls2')).read().splitlines())
+        os.utime(snap2, (time.time() - 1000, time.time() - 1000))
+        _run(['python3', os.path.join(LIB, 'bd_issues.py'), repo2], env=env2)
+        n2 = len(open(os.path.join(T, 'calls2')).read().splitlines())
+        ok = empty and n1 == 1 and n2 == 2 and time.time() - os.stat(snap2).st_mtime < 60
+        r.append(('state: failed bd list restarts the snapshot TTL instead of respawning', ok,
+                  f'empty={empty} calls={n1},{n2}'))
+    finally:
+        shutil.rmtree(T, ignore_errors=True)
+
+    # 4d''. resident kb query service: kb-prompt-surface falls back to the CLI
+    #       once, starts the service, then every search is served by one warm
+    #       process that imported kb.py once; writes are refused.
+    T = tempfile.mkdtemp()
+    svc = None
+    try:
+        log, kb = os.path.join(T, 'log'), os.path.join(T, 'kb.py')
+        open(kb, 'w').write(
+            'import json, os, sys\n'
+            f'open({log!r}, "a").write(f"import {{os.getpid()}}\\n")\n'
+            'def main():\n'
+            f'    open({log!r}, "a").write(f"call {{os.getpid()}} {{sys.argv[1]}}\\n")\n'
+            '    q = sys.argv[2]\n'
+            '    if q.startswith("hang"):\n'
+            '        import time; time.sleep(30)\n'
+            '    print(json.dumps([{"id": "kb-" + q.split()[0], "similarity": 0.9, "project": "p",\n'
+            '                       "summary": os.environ.get("KB_EMBEDDING_DIM", "?") + " " + q[:20]}]))\n'
+            'if __name__ == "__main__":\n'
+            '    main()\n')
+        env = {'CLAUDE_STATE_DIR': os.path.join(T, 'state'), 'CLAUDE_SESSION_ID': 'sidK',
+               'KB_SCRIPT': kb, 'KB_VENV': sys.executable}
+        ask = lambda w: _run(py('kb-prompt-surface.py'), env=env, stdin=json.dumps(
+            {'prompt': f'{w} the spectral gap of the transfer operator'})).stdout
+        p1 = ask('alpha')
+        for _ in range(100):
+            if os.path.exists(os.path.join(T, 'state', 'kbqd.sock')):
+                break
+            time.sleep(0.05)
+        p2, p3 = ask('beta'), ask('gamma')
+        q = _run(['python3', '-c', 'import kbqd, os, sys; print(kbqd.query(["add", "x"], dict(os.environ), 5, '
+                  'sys.argv[1], sys.argv[2])[0])', sys.executable, kb], env=dict(env, PYTHONPATH=LIB))
+        ev = [l.split() for l in open(log).read().splitlines()]
+        svc = int(ev[-1][1])
+        ok = all('[KB ~0.90 kb-%s (p): 4096 %s the spect' % (w, w) in p
+                 for w, p in (('alpha', p1), ('beta', p2), ('gamma', p3))) \
+            and [e[0] for e in ev] == ['import', 'call', 'import', 'call', 'call'] \
+            and ev[2][1] == ev[3][1] == ev[4][1] != ev[0][1] and q.stdout.strip() == '2'
+        r.append(('state: kb query service serves prompt surfacing warm, CLI fallback once', ok,
+                  f'{p1!r} {p3!r} {ev} {q.stdout} {q.stderr[-200:]}'))
+        # A hung request: the hook gets rc None within its budget and does NOT
+        # re-run the search through the CLI (no new kb import); the watchdog
+        # ends the service, and the next prompt starts a fresh one.
+        n_log = len(open(log).read().splitlines())
+        t0 = time.time()
+        code = ('import importlib.util, io, json, sys\n'
+                'spec = importlib.util.spec_from_file_location("kps", sys.argv[1])\n'
+                'm = importlib.util.module_from_spec(spec); spec.loader.exec_module(m); m.BUDGET_S = 1.5\n'
+                'sys.stdin = io.StringIO(json.dumps({"prompt": "hang the spectral gap of the transfer operator"}))\n'
+                'orig = m.kbqd.query; got = []\n'
+                'm.kbqd.query = lambda *a: got.append(orig(*a)) or got[-1]\n'
+                'm.main(); print(json.dumps(got))')
+        q = _run(['python3', '-c', code, _find('kb-prompt-surface.py')], env=env)
+        hung = [l.split()[0] for l in open(log).read().splitlines()[n_log:]]
+        waited = time.time() - t0
+        for _ in range(100):
+            try:
+                os.kill(svc, 0)
+            except OSError:
+                break
+            time.sleep(0.05)
+        else:
+            svc = None
+        p4 = ask('delta')
+        for _ in range(100):
+            if os.path.exists(os.path.join(T, 'state', 'kbqd.sock')) and \
+                    open(log).read().splitlines()[-1].startswith('import'):
+                break
+            time.sleep(0.05)
+        p5 = ask('epsilon')
+        ev = [l.split() for l in open(log).read().splitlines()]
+        ok = svc is not None and q.stdout.strip() == '[[null, "", "kbqd: timed out\\n"]]' and waited < 4 \
+            and hung == ['call'] \
+            and '[KB ~0.90 kb-delta' in p4 and '[KB ~0.90 kb-epsilon' in p5 and ev[-1][1] != str(svc)
+        svc = int(ev[-1][1])
+        r.append(('state: kb query service ends itself on a hung request; no CLI retry on timeout', ok,
+                  f'{q.stdout} {q.stderr[-200:]} {hung} {waited:.1f}s {p4!r} {p5!r} {ev[-4:]}'))
+    finally:
+        if svc:
+            try:
+                os.kill(svc, 15)
+            except OSError:
+                pass
+        shutil.rmtree(T, ignore_errors=True)
+
+    # 4e. kb project resolution: memoized per dir, re-read when the config changes
+    T = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(T, 'p', '.claude')); os.makedirs(os.path.join(T, 'p', 'a', 'b'))
+        cfg = os.path.join(T, 'p', '.claude', 'kb-project.json')
+        open(cfg, 'w').write('{"kb_project": "one"}')
+        code = ('import _state as s, os, sys, json; cfg, f, g = sys.argv[1:]\n'
+                'r = [s.kb_project_for_path(f), s.kb_project_for_path(g)]\n'
+                'open(cfg, "w").write(json.dumps({"kb_project": "two"})); os.utime(cfg, ns=(1, 1))\n'
+                'r += [s.kb_project_for_path(f), s.kb_project_for_path("/nonexistent/x.py")]\n'
+                'print(r, len(s._projects) >= 3)')
+        p = _run(['python3', '-c', code, cfg, os.path.join(T, 'p', 'a', 'b', 'x.py'),
+                  os.path.join(T, 'p', 'a', 'y.py')], env={'PYTHONPATH': LIB})
+        ok = p.stdout.strip() == "['one', 'one', 'two', None] True"
+        r.append(('state: kb_project_for_path memoizes per dir, follows config mtime', ok,
+                  p.stdout + p.stderr[-200:]))
     finally:
         shutil.rmtree(T, ignore_errors=True)
 
@@ -246,8 +622,546 @@ def state_tests():
     return r
 
 
+def hookd_tests():
+    """Warm hook daemon (lib/hookd.py + hookd/hookd-client.py): the served group
+    must reach the same verdict whether the daemon is up or the client falls back
+    to running the group itself, and merge() must keep Claude Code's semantics."""
+    import tempfile, shutil, time
+    LIB = os.path.join(HOOKS, 'lib')
+    client = ['python3', os.path.join(HOOKS, 'hookd', 'hookd-client.py'), 'PreToolUse:Bash']
+    r = []
+    T = tempfile.mkdtemp()
+    env = {'CLAUDE_STATE_DIR': T, 'CLAUDE_SESSION_ID': 'hookdtest'}
+    try:
+        def verdict(cmd):
+            p = _run(client, env=env, stdin=json.dumps(bash_cmd(cmd)))
+            return classify(p.returncode, p.stdout)
+
+        got = verdict('git reset --hard HEAD~1')
+        r.append(('hookd: fallback (no daemon) blocks reset --hard', got == 'block', got))
+        got = verdict('ls -la /tmp')
+        r.append(('hookd: fallback (no daemon) approves ls', got == 'approve', got))
+
+        e = dict(os.environ); e.update(env)
+        d = subprocess.Popen(['python3', os.path.join(LIB, 'hookd.py'), '--session', 'hookdtest',
+                              '--owner', str(os.getpid())], env=e,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        sock = os.path.join(T, 'hookdtest-hookd.sock')
+        for _ in range(50):
+            if os.path.exists(sock):
+                break
+            time.sleep(0.1)
+        try:
+            got = verdict('git reset --hard HEAD~1')
+            r.append(('hookd: daemon serves group (blocks reset --hard)',
+                      os.path.exists(sock) and got == 'block', f"sock={os.path.exists(sock)} got={got}"))
+        finally:
+            d.terminate(); d.wait(timeout=5)
+    finally:
+        shutil.rmtree(T, ignore_errors=True)
+
+    allow = json.dumps({'hookSpecificOutput': {'hookEventName': 'PreToolUse', 'permissionDecision': 'allow',
+                                               'additionalContext': 'a'}})
+    deny = json.dumps({'hookSpecificOutput': {'hookEventName': 'PreToolUse', 'permissionDecision': 'deny',
+                                              'additionalContext': 'b'}})
+    p = _run(['python3', '-c', 'import hook_dispatch, json, sys; '
+              'print(json.dumps(hook_dispatch.merge(json.loads(sys.stdin.read()))))'],
+             env={'PYTHONPATH': LIB}, stdin=json.dumps([['x', 0, allow, ''], ['y', 0, deny, ''], ['z', None, '', '']]))
+    try:
+        rc, out, _ = json.loads(p.stdout)
+        h = json.loads(out)['hookSpecificOutput']
+        ok = rc == 0 and h['permissionDecision'] == 'deny' and h['additionalContext'] == 'a\nb'
+    except Exception:
+        ok, h = False, p.stdout + p.stderr
+    r.append(('hookd: merge deny>allow, contexts concatenated, timeout fails open', ok, str(h)))
+
+    # Parallel fan-out: two 0.4s hooks cost ~0.4s, not 0.8s; a hook past its own
+    # deadline fails open without holding the verdict; a blocker still blocks.
+    G = tempfile.mkdtemp()
+    try:
+        groups = {'groups': {
+            'T:par': [{'command': 'sleep 0.4; echo one >&2', 'timeout': 5000},
+                      {'command': 'sleep 0.4; echo two >&2', 'timeout': 5000},
+                      {'command': 'sleep 3', 'timeout': 300}],
+            'T:blk': [{'command': 'sleep 0.2; echo no >&2; exit 2', 'timeout': 5000},
+                      {'command': 'echo \'{"hookSpecificOutput": {"permissionDecision": "allow"}}\'',
+                       'timeout': 5000}]}}
+        gf = os.path.join(G, 'groups.json')
+        open(gf, 'w').write(json.dumps(groups))
+        code = ('import hook_dispatch as d, json, sys, time; d.GROUPS_FILE = sys.argv[1]; '
+                't = time.time(); rc, out, err = d.run_group("T:par", b"{}"); dt = time.time() - t; '
+                'brc, bout, berr = d.run_group("T:blk", b"{}"); '
+                'print(json.dumps([dt, rc, err, brc, bout, berr]))')
+        p = _run(['python3', '-c', code, gf], env={'PYTHONPATH': LIB, 'CLAUDE_STATE_DIR': G})
+        try:
+            dt, rc, err, brc, bout, berr = json.loads(p.stdout)
+            ok = dt < 0.75 and rc == 0 and err.index('one') < err.index('two') \
+                and 'sleep timed out' in err and brc == 2 and 'no' in berr and not bout
+        except Exception:
+            ok, dt = False, p.stdout + p.stderr
+        r.append(('hookd: parallel fan-out, per-hook deadline fails open, blocker wins', ok, str(dt)))
+
+        # A hung in-process hook: its deadline holds on the serial path too, it
+        # is demoted to a (killable) subprocess, and the pool it wedged is
+        # replaced -- later requests neither wait nor starve.
+        hang = os.path.join(G, 'hang.py')
+        open(hang, 'w').write('import time\ndef main():\n    time.sleep(4)\nif __name__ == "__main__":\n    main()\n')
+        groups['groups']['T:hang'] = [{'command': f'python3 {hang}', 'timeout': 300},
+                                      {'command': 'echo ok >&2', 'timeout': 5000}]
+        groups['groups']['T:one'] = [{'command': f'python3 {hang}', 'timeout': 300}]
+        open(gf, 'w').write(json.dumps(groups))
+        code = ('import hook_dispatch as d, json, sys, time; d.GROUPS_FILE = sys.argv[1]; out = []\n'
+                't = time.time(); rc, _, err = d.run_group("T:one", b"{}"); out.append([time.time() - t, err])\n'
+                'out.append(sorted(d._overdue) == [sys.argv[2]]); d._overdue.clear()\n'
+                'd._MAX_WORKERS = 2; pools = []\n'
+                'for _ in range(3):\n'
+                '    t = time.time(); rc, _, err = d.run_group("T:hang", b"{}"); out.append([time.time() - t, err])\n'
+                '    pools.append(d._pool)\n'
+                'print(json.dumps([out, pools[0] is None and pools[1] is pools[2] is not None]))')
+        p = _run(['python3', '-c', code, gf, hang], env={'PYTHONPATH': LIB, 'CLAUDE_STATE_DIR': G})
+        try:
+            out, npools = json.loads(p.stdout)
+            runs = [out[0]] + out[2:]
+            ok = out[1] and all(dt < 1.0 and 'hang.py timed out' in err for dt, err in runs) \
+                and all('ok' in err for _, err in out[2:]) and npools
+        except Exception:
+            ok, out = False, p.stdout + p.stderr
+        r.append(('hookd: hung in-process hook: deadline on every path, demoted, pool replaced', ok, str(out)))
+
+        # The daemon mirrors each caller's env/cwd into the process, but not
+        # while an abandoned in-process hook still runs: it keeps the view it
+        # started with, and the next request's hooks are spawned with theirs.
+        slow, probe = os.path.join(G, 'slow.py'), os.path.join(G, 'probe.py')
+        seen = os.path.join(G, 'seen')
+        open(slow, 'w').write('import os, time\ndef main():\n    time.sleep(1)\n'
+                              f'    open({seen!r}, "w").write(os.environ.get("MARK", "") + " " + os.getcwd())\n')
+        open(probe, 'w').write('import os\ndef main():\n    print(os.environ.get("MARK", ""), os.getcwd())\n'
+                               'if __name__ == "__main__":\n    main()\n')
+        groups['groups']['T:slow'] = [{'command': f'python3 {slow}', 'timeout': 300}]
+        groups['groups']['T:probe'] = [{'command': f'python3 {probe}', 'timeout': 5000}]
+        open(gf, 'w').write(json.dumps(groups))
+        for sub in ('a', 'b'):
+            os.makedirs(os.path.join(G, sub))
+        code = ('import hookd, hook_dispatch as d, json, os, sys, time; d.GROUPS_FILE = sys.argv[1]\n'
+                'req = lambda g, m: {"group": g, "env": dict(os.environ, MARK=m), "cwd": os.path.join(sys.argv[2], m)}\n'
+                'hookd.serve(req("T:slow", "a"), b"{}", "s")\n'
+                'busy = d.inprocess_running()\n'
+                'rc, out, err = hookd.serve(req("T:probe", "b"), b"{}", "s")\n'
+                'time.sleep(1.5)\n'
+                'print(json.dumps([busy, out, open(os.path.join(sys.argv[2], "seen")).read(), d.inprocess_running()]))')
+        p = _run(['python3', '-c', code, gf, G], env={'PYTHONPATH': LIB, 'CLAUDE_STATE_DIR': G})
+        try:
+            busy, out, seen_by_slow, after = json.loads(p.stdout)
+            ok = busy == 1 and out.split() == ['b', os.path.join(G, 'b')] \
+                and seen_by_slow.split() == ['a', os.path.join(G, 'a')] and after == 0
+        except Exception:
+            ok, out = False, p.stdout + p.stderr
+        r.append(('hookd: abandoned in-process hook keeps its env/cwd; next request spawned', ok, str(out)))
+
+        # A daemon that accepts but never answers: the client gives up after the
+        # group's budget (+ slack) -- None, so main() runs the group itself.
+        code = ('import importlib.util, json, os, socket, sys, time, hook_dispatch as d\n'
+                'd.GROUPS_FILE = sys.argv[1]\n'
+                'srv = socket.socket(socket.AF_UNIX); srv.bind(os.path.join(sys.argv[2], "stuck-hookd.sock")); srv.listen()\n'
+                'spec = importlib.util.spec_from_file_location("hc", sys.argv[3]); hc = importlib.util.module_from_spec(spec)\n'
+                'spec.loader.exec_module(hc); hc.GROUPS_FILE = sys.argv[1]\n'
+                't = time.time(); res = hc._via_daemon("T:blk", b"{}", "stuck"); dt = time.time() - t\n'
+                'print(json.dumps([res, dt, hc._budget("T:blk")]))')
+        p = _run(['python3', '-c', code, gf, G, os.path.join(HOOKS, 'hookd', 'hookd-client.py')],
+                 env={'PYTHONPATH': LIB, 'CLAUDE_STATE_DIR': G, 'CLAUDE_SESSION_ID': 'stuck'})
+        try:
+            res, dt, budget = json.loads(p.stdout)
+            ok = res is None and budget == 5.0 and 5.5 < dt < 7.5
+        except Exception:
+            ok, dt = False, p.stdout + p.stderr
+        r.append(('hookd: client stops waiting on a stuck daemon, runs the group itself', ok, str(dt)))
+    finally:
+        shutil.rmtree(G, ignore_errors=True)
+    return r
+
+
+def profile_tests():
+    """Timing ledger (lib/hook_ledger.py): served groups record one row per hook
+    plus a TOTAL row, and the profiler's percentiles come out of it."""
+    import tempfile, shutil
+    LIB = os.path.join(HOOKS, 'lib')
+    r = []
+    T = tempfile.mkdtemp()
+    try:
+        env = {'CLAUDE_STATE_DIR': T, 'CLAUDE_SESSION_ID': 'proftest', 'PYTHONPATH': LIB}
+        _run(['python3', os.path.join(HOOKS, 'hookd', 'hookd-client.py'), 'PreToolUse:Bash'],
+             env=env, stdin=json.dumps(bash_cmd('ls')))
+        p = _run(['python3', '-c', 'import hook_ledger, json; '
+                  'print(json.dumps([r[1:5] for r in hook_ledger.read()]))'], env=env)
+        try:
+            rows = json.loads(p.stdout)
+        except ValueError:
+            rows = []
+        hooks = [h for g, h, _, _ in rows if g == 'PreToolUse:Bash']
+        ok = 'TOTAL' in hooks and 'guard-destructive-git.sh' in hooks \
+            and all(ms >= 0 and rc != 'T' for _, _, ms, rc in rows)
+        r.append(('profile: served group writes per-hook + TOTAL ledger rows', ok,
+                  f"{len(rows)} rows {p.stderr.strip()[-200:]}"))
+        # Hooks Claude Code runs directly never reach the live ledger; the
+        # report names them instead of silently leaving them out.
+        p = _run(['python3', os.path.join(HOOKS, 'tests', 'hook_profile.py'), 'report'], env=env)
+        note = p.stdout.partition('not in the live ledger')[2]
+        ok = 'UserPromptSubmit  kb-prompt-surface.py' in note and 'guard-destructive-git.sh' not in note \
+            and 'guard-destructive-git.sh' in p.stdout
+        r.append(('profile: report lists the directly-run hooks the live ledger cannot see', ok,
+                  p.stdout[-300:] + p.stderr[-200:]))
+    finally:
+        shutil.rmtree(T, ignore_errors=True)
+    p = _run(['python3', '-c', 'import hook_ledger as l; v=list(range(1, 101)); '
+              'print(l.percentile(v, 50), l.percentile(v, 95), l.percentile(v, 99), l.percentile([7], 99))'],
+             env={'PYTHONPATH': LIB})
+    r.append(('profile: nearest-rank percentiles', p.stdout.split() == ['50', '95', '99', '7'], p.stdout.strip()))
+
+    # bench `record` writes scrubbed payloads to the local corpus in STATE_DIR,
+    # never the tracked tests/bench_corpus.jsonl
+    T = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(T, 'projects', 'p'))
+        cmd = 'curl -H "Authorization: Bearer abc123" https://u:pw@h/x && GITHUB_TOKEN=ghp_0123456789abcdefghijkl make'
+        open(os.path.join(T, 'projects', 'p', 's.jsonl'), 'w').write(json.dumps({'message': {'content': [
+            {'type': 'tool_use', 'name': 'Bash', 'input': {'command': cmd}}]}}) + '\n')
+        tracked = os.path.join(HOOKS, 'tests', 'bench_corpus.jsonl')
+        before = open(tracked).read()
+        p = _run(['python3', '-c', 'import hook_bench as hb, sys; hb.record(root=sys.argv[1]); print(hb.LOCAL_CORPUS)',
+                  os.path.join(T, 'projects')],
+                 env={'CLAUDE_STATE_DIR': T, 'PYTHONPATH': os.path.join(HOOKS, 'tests')})
+        local = os.path.join(T, 'bench_corpus.jsonl')
+        got = open(local).read() if os.path.exists(local) else ''
+        ok = open(tracked).read() == before and p.stdout.splitlines()[-1:] == [local] \
+            and 'Bearer <redacted>' in got and 'u:<redacted>@h' in got and 'GITHUB_TOKEN=<redacted>' in got \
+            and 'abc123' not in got and 'ghp_' not in got
+        r.append(('profile: bench record scrubs credentials into the local corpus', ok,
+                  got[-300:] + p.stderr[-300:]))
+    finally:
+        shutil.rmtree(T, ignore_errors=True)
+    return r
+
+
+def _kb_fixture(path):
+    """Minimal knowledge.db with the columns the surfacing hooks read."""
+    import sqlite3
+    c = sqlite3.connect(path)
+    c.executescript("""
+        CREATE TABLE python_symbols (name, kind, status, module, file, line, redirect_to, project);
+        CREATE TABLE notations (current_symbol, meaning, meaning_source, project);
+        CREATE TABLE findings (id, summary, content, project);
+        CREATE TABLE lean_contracts (id, file, line, decl_name, statement, file_status,
+            discharge_target, contract_awaiting, proof_grade, data_blocked_on, project);
+        CREATE TABLE structural_facts (id, relation_type, lhs_operator, rhs_operator,
+            result_exact, negative, certified_data_key, lean_thm, notes);
+    """)
+    c.executemany('INSERT INTO python_symbols VALUES (?,?,?,?,?,?,?,?)', [
+        ('spectral_gap_ratio', 'function', 'canonical', 'phys.spec', '/p/spec.py', 10, None, 'kbt'),
+        ('old_gap_ratio', 'function', 'retired', 'phys.spec', '/p/spec.py', 20, 'spectral_gap_ratio', 'kbt'),
+        ('other_proj_fn', 'function', 'canonical', 'x.y', '/q/y.py', 1, None, 'elsewhere'),
+    ])
+    c.executemany('INSERT INTO notations VALUES (?,?,?,?)', [
+        ('Z_species', 'species partition function', 'manual', 'kbt'),
+        ('W_of_J', 'generic', 'generic-fallback', 'kbt'),
+    ])
+    c.executemany('INSERT INTO findings VALUES (?,?,?,?)', [
+        ('kb-20260101-000000-aaaaaa', 'gap ratio is exactly 17/24', 'we find G = 17/24 exactly', 'kbt'),
+    ] + [(f'kb-20260101-00000{i}-bbbbbb', 'half', 'value 1/2 again', 'kbt') for i in range(6)])
+    c.executemany('INSERT INTO lean_contracts VALUES (?,?,?,?,?,?,?,?,?,?,?)', [
+        ('lc1', '/p/lean/ChargedSectorCharpoly.lean', 42, 'charged_sector_charpoly',
+         'charpoly of the charged sector matrix', 'open-contract (claude-gyb.4)',
+         'charpoly_factorization', None, None, None, 'kbt'),
+    ])
+    c.executemany('INSERT INTO structural_facts VALUES (?,?,?,?,?,?,?,?,?)', [
+        ('sf1', 'commutator', 'M_odd', 'P_parity', '0', 0, 'ALG.M_odd_P', None, None),
+    ])
+    c.commit()
+    c.close()
+
+
+def kb_tests():
+    """KB surfacing hooks over a fixture knowledge.db (CLAUDE_KB_DB), via the
+    shared read-only access layer (lib/kb_db.py)."""
+    import tempfile, shutil
+    LIB = os.path.join(HOOKS, 'lib')
+    r = []
+    T = tempfile.mkdtemp()
+    try:
+        db = os.path.join(T, 'knowledge.db')
+        _kb_fixture(db)
+        proj = os.path.join(T, 'proj')
+        os.makedirs(os.path.join(proj, '.claude'))
+        open(os.path.join(proj, '.claude', 'kb-project.json'), 'w').write('{"kb_project": "kbt"}')
+        env = {'CLAUDE_KB_DB': db, 'CLAUDE_STATE_DIR': T, 'CLAUDE_SESSION_ID': 'kbtest',
+               'CLAUDE_PROJECT_DIR': proj}
+
+        prompt = ('Please compute spectral_gap_ratio again, keep old_gap_ratio in sync, '
+                  'check Z_species and W_of_J, where G = 17/24 and h = 1/2. '
+                  'Also recompute [M_odd, P_parity] and the ChargedSectorCharpoly '
+                  'charged sector charpoly factorization.')
+        p = _run(py('compose_time_check.py'), env=env,
+                 stdin=json.dumps({'tool_name': 'Agent', 'tool_input': {'prompt': prompt}}))
+        try:
+            ctx = json.loads(p.stdout)['hookSpecificOutput']['additionalContext']
+        except Exception:
+            ctx = p.stdout + p.stderr
+        want = ['phys.spec.spectral_gap_ratio', 'old_gap_ratio RETIRED → use spectral_gap_ratio',
+                'notation Z_species', 'value 17/24', 'SORRY-CONTRACT WAITING: ChargedSectorCharpoly.lean:42',
+                'STRUCTURAL-FACT: commutator([M_odd,P_parity])']
+        absent = ['other_proj_fn', 'W_of_J', 'value 1/2']
+        ok = all(w in ctx for w in want) and not any(a in ctx for a in absent)
+        r.append(('kb: compose_time_check surfaces symbols/notation/value/contract/fact', ok, ctx[-400:]))
+
+        src = os.path.join(proj, 'notes.txt')
+        open(src, 'w').write('Old code still calls old_gap_ratio; see Z_species and W_of_J. '
+                             'The ratio came out 17/24 in the end.\n')
+        p = _run(py('symbol_surface.py'), env=env,
+                 stdin=json.dumps({'tool_name': 'Read', 'tool_input': {'file_path': src}}))
+        try:
+            got = json.loads(p.stdout)['hookSpecificOutput']['additionalContext']
+        except Exception:
+            got = p.stdout + p.stderr
+        ok = '[RETIRED: old_gap_ratio → spectral_gap_ratio]' in got and '[KB-VALUE: 17/24' in got \
+            and 'NOTATION: Z_species' not in got  # already surfaced this session by compose
+        r.append(('kb: symbol_surface surfaces retired + value, dedups notation', ok, got[-300:]))
+
+        # Extraction cache: the Read above stored the token set; stat hit, hash
+        # hit after a touch, miss after an edit, LRU-bounded.
+        code = ('import extract_cache as ec, os, sys; calls = []\n'
+                'def ex(c):\n    calls.append(1); return [len(c), "x"]\n'
+                'src = sys.argv[1]; ns = "t/1"\n'
+                'a = ec.cached(src, ns, ex); b = ec.cached(src, ns, ex)\n'
+                'os.utime(src, ns=(1, 1)); c = ec.cached(src, ns, ex)\n'
+                'open(src, "a").write("more"); d = ec.cached(src, ns, ex)\n'
+                'db = ec._connect(ec.CACHE_DB)\n'
+                'pre = db.execute("SELECT COUNT(*) FROM entries WHERE ns LIKE \'symbol_surface.text/%\'").fetchone()[0]\n'
+                'ec.MAX_ENTRIES = 2\n'
+                'for i in range(3):\n    f = src + str(i); open(f, "w").write("y"); ec.cached(f, ns, ex)\n'
+                'print(a == b == c, d != a, len(calls), pre, db.execute("SELECT COUNT(*) FROM entries").fetchone()[0])')
+        p = _run(['python3', '-c', code, src], env=dict(env, PYTHONPATH=LIB))
+        r.append(('kb: extract_cache stat/hash hits, miss on edit, LRU bound', p.stdout.split() ==
+                  ['True', 'True', '5', '1', '2'], p.stdout + p.stderr[-300:]))
+
+        p = _run(['python3', os.path.join(LIB, '_canonical_match_cli.py')],
+                 env=dict(env, CLAUDE_SESSION_ID='kbtest2'),
+                 stdin='calls old_gap_ratio and spectral_gap_ratio_v2 and spectral_gap_ratio')
+        ok = '[RETIRED exact: phys.spec.old_gap_ratio → spectral_gap_ratio]' in p.stdout \
+            and '[CANONICAL exact: phys.spec.spectral_gap_ratio]' in p.stdout
+        r.append(('kb: _canonical_match_cli exact canonical + retired', ok, p.stdout + p.stderr[-200:]))
+
+        # Single-scan tokenizer (lib/text_tokens.py) == the per-kind regex passes
+        # it replaced (hook_bench.LEGACY_TOKEN_RES), on edge-case and random text.
+        code = ('import random, hook_bench as hb, text_tokens as tt\n'
+                'parts = ["compute", "Compute", "CHECK", "find", "x_y", "Q_EM_w", "_priv", "ABC", "A_B",\n'
+                '         "HTTPServer", "SpectralTriple", "alpha", "αβ", "fooé_bar", "Ω", "17/24", "1/2/3",\n'
+                '         "12345/6", "a1/2", "=", " = ", "= .5", "==", "3", " ", "  ", "\\n", ".", ",", "(", "x"]\n'
+                'rnd = random.Random(7); bad = []\n'
+                'for _ in range(3000):\n'
+                '    t = "".join(rnd.choice(parts) + rnd.choice(["", " ", "\\n"]) for _ in range(rnd.randint(1, 12)))\n'
+                '    got = {k: set(v) for k, v in tt.scan.__wrapped__(t).items()}\n'
+                '    if got != hb.legacy_tokens(t): bad.append(t)\n'
+                'print(len(bad), bad[:2])')
+        p = _run(['python3', '-c', code], env={'PYTHONPATH': LIB + os.pathsep + os.path.join(HOOKS, 'tests')})
+        r.append(('kb: text_tokens single scan matches the legacy per-kind passes',
+                  p.stdout.strip() == '0 []', p.stdout[-300:] + p.stderr[-300:]))
+
+        # Trigram shadow index (lib/kb_index.py): built, trigger-synced, same answers.
+        p = _run(['python3', os.path.join(LIB, 'kb_index.py')], env=env)
+        import sqlite3
+        w = sqlite3.connect(db)
+        w.execute("INSERT INTO findings VALUES ('kb-20260102-000000-cccccc', 'fresh 5/7 result', "
+                  "'the ratio is 5/7', 'kbt')")
+        w.commit(); w.close()
+        code = ('import kb_db; c = kb_db.connect(); '
+                'print(kb_db.has_table(c, "findings_fts"), kb_db.count_findings_containing(c, "5/7", "kbt"), '
+                'kb_db.count_findings_containing(c, "1/2", "kbt"), kb_db.count_findings_containing(c, "17/24"), '
+                'kb_db.findings_containing(c, "17/24", "kbt")[0][0])')
+        p2 = _run(['python3', '-c', code], env=dict(env, PYTHONPATH=LIB))
+        ok = p.returncode == 0 and 'findings_fts: built' in p.stdout \
+            and p2.stdout.split() == ['True', '1', '6', '1', 'kb-20260101-000000-aaaaaa']
+        r.append(('kb: findings_fts trigram index built + trigger-synced, same counts as LIKE', ok,
+                  p.stdout + p2.stdout + p2.stderr[-200:]))
+
+        # Fraction rarity table: the insert above is queued; a refresh drains it
+        # and the gate becomes a primary-key lookup with the same answers.
+        code = ('import kb_db; c = kb_db.connect(); '
+                'print(kb_db.query(c, "frac_rarity_pending") != [], '
+                'kb_db.fraction_hits(c, "5/7", "kbt", 2, 5)[0])')
+        p1 = _run(['python3', '-c', code], env=dict(env, PYTHONPATH=LIB))
+        p = _run(['python3', os.path.join(LIB, 'kb_index.py')], env=env)
+        code = ('import kb_db; c = kb_db.connect(); '
+                'print(kb_db.query(c, "frac_rarity_pending") != [], kb_db.fraction_hits(c, "5/7", "kbt", 2, 5), '
+                'kb_db.fraction_hits(c, "1/2", "kbt", 2, 5), kb_db.fraction_hits(c, "7/24", "kbt", 2, 5), '
+                'kb_db.query(c, "frac_rarity", "1/2", "kbt")[0][0])')
+        p2 = _run(['python3', '-c', code], env=dict(env, PYTHONPATH=LIB))
+        ok = p1.stdout.split() == ['True', '1'] and 'kb_frac_rarity: 1 findings refreshed' in p.stdout \
+            and p2.stdout.strip() == ("False (1, [('kb-20260102-000000-cccccc', 'fresh 5/7 result')]) "
+                                      "(6, []) (0, []) 6")
+        r.append(('kb: kb_frac_rarity queued by trigger, refreshed, served by PK lookup', ok,
+                  p1.stdout + p.stdout + p2.stdout + p2.stderr[-200:]))
+
+        # kb_index on a copy: a KB_VENV whose sqlite lacks trigram gets no FTS
+        # (its writes would fail in the triggers); a dropped trigger is restored
+        # and the index rebuilt, so the rows written meanwhile are found.
+        db2 = os.path.join(T, 'knowledge2.db')
+        src_c, dst_c = sqlite3.connect(db), sqlite3.connect(db2)
+        src_c.backup(dst_c); src_c.close()
+        dst_c.executescript('DROP TABLE findings_fts; DROP TABLE lean_contracts_fts;')
+        dst_c.close()
+        nofts = os.path.join(T, 'nofts-python')
+        open(nofts, 'w').write('#!/bin/sh\nexit 1\n')
+        os.chmod(nofts, 0o755)
+        env2 = dict(env, CLAUDE_KB_DB=db2, KB_VENV=nofts)
+        p1 = _run(['python3', os.path.join(LIB, 'kb_index.py')], env=env2)
+        c2 = sqlite3.connect(db2)
+        no_fts = not c2.execute("SELECT 1 FROM sqlite_master WHERE name='findings_fts'").fetchall()
+        c2.close()
+        env2['KB_VENV'] = sys.executable
+        p2 = _run(['python3', os.path.join(LIB, 'kb_index.py')], env=env2)
+        c2 = sqlite3.connect(db2)
+        c2.execute('DROP TRIGGER findings_fts_ai')
+        c2.execute("INSERT INTO findings VALUES ('kb-20260103-000000-dddddd', 'late 5/7 again', "
+                   "'no trigger saw 5/7', 'kbt')")
+        c2.commit(); c2.close()
+        p3 = _run(['python3', os.path.join(LIB, 'kb_index.py')], env=env2)
+        code = 'import kb_db; c = kb_db.connect(); print(kb_db.count_findings_containing(c, "5/7", "kbt"))'
+        p4 = _run(['python3', '-c', code], env=dict(env2, PYTHONPATH=LIB))
+        ok = no_fts and 'findings_fts' not in p1.stdout and 'findings_fts: built' in p2.stdout \
+            and 'findings_fts: triggers restored, rebuilt' in p3.stdout and p4.stdout.strip() == '2'
+        r.append(('kb: kb_index skips FTS a KB_VENV cannot maintain, rebuilds on restored triggers', ok,
+                  p1.stdout + p2.stdout + p3.stdout + p4.stdout + p4.stderr[-200:]))
+
+        # Rarity: a finding written while the queueing trigger was missing is
+        # still counted once ensure() restores it (every finding is re-queued).
+        # kb-search-track drains after a PostToolUse KB write -- CLI or MCP --
+        # and never before the command ran.
+        c2 = sqlite3.connect(db2)
+        c2.execute('DROP TRIGGER kb_frac_dirty_ai')
+        c2.execute("INSERT INTO findings VALUES ('kb-20260104-000000-eeeeee', 'unqueued', "
+                   "'5/7 and 3/11', 'kbt')")
+        c2.commit(); c2.close()
+        p1 = _run(['python3', os.path.join(LIB, 'kb_index.py')], env=env2)
+        c2 = sqlite3.connect(db2)
+        c2.execute("INSERT INTO findings VALUES ('kb-20260105-000000-ffffff', 'queued', '3/11', 'kbt')")
+        c2.commit(); c2.close()
+        track = _find('kb-search-track.sh')
+        pre = _run(['bash', track], env=env2, stdin=json.dumps({
+            'hook_event_name': 'PreToolUse', 'tool_name': 'Bash',
+            'tool_input': {'command': 'kb add "x"'}}))
+        time.sleep(1)
+        code = ('import kb_db; c = kb_db.connect(); print(kb_db.query(c, "frac_rarity_pending") != [], '
+                'kb_db.fraction_hits(c, "5/7", "kbt", 5, 5)[0], kb_db.fraction_hits(c, "3/11", "kbt", 5, 5)[0])')
+        p2 = _run(['python3', '-c', code], env=dict(env2, PYTHONPATH=LIB))
+        post = _run(['bash', track], env=env2, stdin=json.dumps({
+            'hook_event_name': 'PostToolUse', 'tool_name': 'mcp__knowledge-base__kb_add',
+            'tool_input': {'content': 'x'}}))
+        for _ in range(50):
+            p3 = _run(['python3', '-c', code], env=dict(env2, PYTHONPATH=LIB))
+            if p3.stdout.startswith('False'):
+                break
+            time.sleep(0.1)
+        ok = pre.returncode == post.returncode == 0 and 'kb_frac_rarity' in p1.stdout \
+            and p2.stdout.split()[0] == 'True' and p3.stdout.split() == ['False', '3', '2']
+        r.append(('kb: rarity recount on a restored trigger; search-track drains only after KB writes',
+                  ok, p1.stdout + p2.stdout + p3.stdout + p3.stderr[-200:] + pre.stdout + post.stdout))
+
+        # Contracts trigram index: one grouped join, same hit counts as the LIKE loop.
+        code = ('import kb_db; c = kb_db.connect(); toks = ["charged", "sector", "charpoly", "matrix", "nothere"]; '
+                'print(kb_db.has_table(c, "lean_contracts_fts"), kb_db.contract_hits(c, toks, "kbt")["lc1"][0], '
+                'kb_db.contract_hits(c, ["ch"] + toks, "kbt")["lc1"][0], kb_db.contract_hits(c, toks, "elsewhere"))')
+        p = _run(['python3', '-c', code], env=dict(env, PYTHONPATH=LIB))
+        p2 = _run(py('compose_time_check.py'), env=dict(env, CLAUDE_SESSION_ID='kbtest3'),
+                  stdin=json.dumps({'tool_name': 'Agent', 'tool_input': {'prompt': prompt}}))
+        ok = p.stdout.split() == ['True', '4', '5', '{}'] \
+            and 'SORRY-CONTRACT WAITING: ChargedSectorCharpoly.lean:42' in p2.stdout
+        r.append(('kb: lean_contracts_fts scores all tokens in one query, same hits as LIKE', ok,
+                  p.stdout + p.stderr[-200:] + p2.stdout[-200:]))
+        # Per-token cap: a token shared by many contracts counts toward at most
+        # CONTRACTS_PER_TOKEN of them (lowest rowids) on both paths.
+        c2 = sqlite3.connect(db2)
+        c2.executemany("INSERT INTO lean_contracts VALUES (?, 'Extra.lean', ?, ?, 'charpoly sector', "
+                       "'open', NULL, NULL, NULL, NULL, 'kbt')",
+                       [(f'lx{i}', i, f'extra_{i}') for i in range(5)])
+        c2.commit(); c2.close()
+        code = ('import json, kb_db; c = kb_db.connect(); toks = ["charpoly", "sector", "matrix"]; '
+                'fts = kb_db.contract_hits(c, toks, "kbt"); kb_db.has_table = lambda c, t: False; '
+                'like = kb_db.contract_hits(c, toks, "kbt"); '
+                'print(json.dumps([fts == like, sorted((k, v[0]) for k, v in fts.items())]))')
+        p = _run(['python3', '-c', code], env=dict(env2, PYTHONPATH=LIB))
+        try:
+            same, got = json.loads(p.stdout)
+            ok = same and got == [['lc1', 3], ['lx0', 2], ['lx1', 2]]
+        except ValueError:
+            ok, got = False, p.stdout + p.stderr[-300:]
+        r.append(('kb: contract_hits caps each token at CONTRACTS_PER_TOKEN on both paths', ok, str(got)))
+
+        # Symbol Bloom prefilter: no false negatives, drops noise, rebuilt on db change.
+        code = ('import kb_db, os; c = kb_db.connect(); known = ["spectral_gap_ratio", "old_gap_ratio", '
+                '"other_proj_fn", "Z_species", "W_of_J", "fresh_sym_fn"]; noise = ["tok%d" % i for i in range(1000)]; '
+                'kept = kb_db.maybe_symbols(c, known + noise); '
+                'print(len([t for t in kept if t in known]), len(kept) - len([t for t in kept if t in known]) < 50, '
+                'os.path.exists(kb_db.SYMBOLS_BLOOM))')
+        p1 = _run(['python3', '-c', code], env=dict(env, PYTHONPATH=LIB))
+        w = sqlite3.connect(db)
+        w.execute("INSERT INTO python_symbols VALUES ('fresh_sym_fn', 'function', 'public', 'm', '/p/m.py', 1, NULL, 'kbt')")
+        w.commit(); w.close()
+        p2 = _run(['python3', '-c', code], env=dict(env, PYTHONPATH=LIB))
+        ok = p1.stdout.split() == ['5', 'True', 'True'] and p2.stdout.split() == ['6', 'True', 'True']
+        r.append(('kb: symbol Bloom prefilter keeps known names, drops noise, follows db writes', ok,
+                  p1.stdout + p2.stdout + p2.stderr[-200:]))
+
+        # Symbol snapshot + batch mode: one process for several reports; a
+        # python_symbols write bumps kb_symbols_version and the table is rebuilt.
+        r1, r2 = os.path.join(T, 'r1.txt'), os.path.join(T, 'r2.txt')
+        open(r1, 'w').write('still calls old_gap_ratio here')
+        open(r2, 'w').write('uses spectral_gap_ratio')
+        cli = ['python3', os.path.join(LIB, '_canonical_match_cli.py'), r1, os.path.join(T, 'missing'), r2]
+        p1 = _run(cli, env=dict(env, CLAUDE_SESSION_ID='kbtest4'))
+        w = sqlite3.connect(db)
+        w.execute("UPDATE python_symbols SET status = 'retired', redirect_to = 'gap_ratio_v3' "
+                  "WHERE name = 'spectral_gap_ratio'")
+        w.commit(); w.close()
+        p2 = _run(cli[:2] + [r2], env=dict(env, CLAUDE_SESSION_ID='kbtest5'))
+        head = open(os.path.join(T, 'kb-symbol-map.bin'), 'rb').readline()
+        ok = p1.stdout.splitlines() == [
+                f'== {r1}', '[RETIRED exact: phys.spec.old_gap_ratio → spectral_gap_ratio]',
+                f'== {r2}', '[CANONICAL exact: phys.spec.spectral_gap_ratio]'] \
+            and p2.stdout.splitlines() == [f'== {r2}', '[RETIRED exact: phys.spec.spectral_gap_ratio → gap_ratio_v3]'] \
+            and b'"v"' in head
+        r.append(('kb: _canonical_match_cli batch mode over the versioned symbol snapshot', ok,
+                  p1.stdout + p2.stdout + p2.stderr[-200:]))
+
+        # Operator catalog: word-set match, persisted, rebuilt when the table changes.
+        code = ('import kb_db, os; c = kb_db.connect(); t = "use M_odd, P_parity and x.y_z, not M_odd_gram"; '
+                'print(sorted(kb_db.match_operators(c, t)), os.path.exists(kb_db.OPERATORS_CACHE))')
+        p1 = _run(['python3', '-c', code], env=dict(env, PYTHONPATH=LIB))
+        w = sqlite3.connect(db)
+        w.execute("INSERT INTO structural_facts VALUES ('sf2', 'product', 'x.y_z', NULL, '1', 0, NULL, NULL, NULL)")
+        w.commit(); w.close()
+        p2 = _run(['python3', '-c', code], env=dict(env, PYTHONPATH=LIB))
+        ok = p1.stdout.strip() == "['M_odd', 'P_parity'] True" \
+            and p2.stdout.strip() == "['M_odd', 'P_parity', 'x.y_z'] True"
+        r.append(('kb: structural operator matcher cached + invalidated on table change', ok,
+                  p1.stdout + p2.stdout + p2.stderr[-200:]))
+
+        code = ('import kb_db; c = kb_db.connect(); kb_db.load_tokens(c, ["a%d" % i for i in range(5000)]); '
+                'n = c.execute("SELECT COUNT(*) FROM temp.kb_tokens").fetchone()[0]; '
+                'print(n, kb_db.connect() is c, c.execute("PRAGMA query_only").fetchone()[0])\n'
+                'try:\n    c.execute("DELETE FROM python_symbols")\nexcept Exception:\n    print("ro")')
+        p = _run(['python3', '-c', code], env=dict(env, PYTHONPATH=LIB))
+        r.append(('kb: kb_db shared ro connection, temp token table (5000 tokens)',
+                  p.stdout.split() == ['5000', 'True', '1', 'ro'], p.stdout + p.stderr[-200:]))
+    finally:
+        shutil.rmtree(T, ignore_errors=True)
+    return r
+
+
 def main():
     verbose = '-v' in sys.argv
+    if '--bench' in sys.argv:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import hook_bench
+        sys.exit(hook_bench.main([a for a in sys.argv[1:] if a != '--bench']))
     npass = nfail = 0
     fails = []
     for label, argv, payload, expect, substr in CASES:
@@ -265,7 +1179,7 @@ def main():
         else:
             nfail += 1
             fails.append(f"FAIL  {label}: expected {expect}, got {got} (rc={rc})")
-    for label, ok, detail in state_tests():
+    for label, ok, detail in state_tests() + hookd_tests() + profile_tests() + kb_tests():
         if ok:
             npass += 1
             if verbose: print(f"  PASS  {label}")
@@ -12,6 +12,10 @@ Critically it scans NOT just the global settings but the Physics project
 settings too — those reference compose_time_check.py / symbol_surface.py by
 absolute path and would dangle green if only the global file were checked.
 
+Hooks served by the warm daemon are listed in hooks/hookd/groups.json instead of
+settings.json (settings only wires the hookd-client.py shim per group), so that
+table is checked the same way -- a dangling path there is just as silent.
+
 Exit 0 = every referenced hook path resolves. Exit 1 = at least one is missing
 (listed on stderr). Pass -v to print every checked path.
 
@@ -42,20 +46,40 @@ SETTINGS_FILES = [
 # /home/<user>/ form, under .claude/hooks/, ending in .sh or .py.
 PATH_RX = re.compile(r'(?:\$HOME|/home/[^/\s"\']+)/\.claude/hooks/[^\s"\';|&]+\.(?:sh|py)')
 
-EXPECTED_GLOBAL = 63  # sanity check; update if the hook set legitimately changes
+EXPECTED_GLOBAL = 40  # sanity check; update if the hook set legitimately changes
 
+# Daemon-served hook groups (same {command, timeout} shape as settings.json).
+HOOKD_GROUPS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'hookd', 'groups.json')
+EXPECTED_HOOKD = 26
 
-def _commands(obj):
-    """Yield every hooks.<event>[].hooks[].command string in a settings dict."""
+
+def _hook_entries(obj):
+    """Yield (event, matcher, hook-dict) for every hooks.<event>[].hooks[] entry
+    with a string command. matcher is '' for events that take none."""
     hooks = obj.get('hooks', {})
     for event, groups in hooks.items():
         if not isinstance(groups, list):
             continue
         for g in groups:
             for h in (g.get('hooks') or []):
-                cmd = h.get('command')
-                if isinstance(cmd, str):
-                    yield event, cmd
+                if isinstance(h.get('command'), str):
+                    yield event, g.get('matcher') or '', h
+
+
+def _commands(obj):
+    """Yield every hooks.<event>[].hooks[].command string in a settings dict."""
+    for event, _, h in _hook_entries(obj):
+        yield event, h['command']
+
+
+def _hookd_commands(obj):
+    """Yield (group, command) for every hook in hookd/groups.json."""
+    for group, hooks in (obj.get('groups') or {}).items():
+        for h in hooks or []:
+            cmd = h.get('command')
+            if isinstance(cmd, str):
+                yield group, cmd
 
 
 def main():
@@ -63,7 +87,7 @@ def main():
     missing = []
     total = 0
     per_file = {}
-    for sf in SETTINGS_FILES:
+    for sf in SETTINGS_FILES + [HOOKD_GROUPS]:
         if not os.path.isfile(sf):
             sys.stderr.write(f"NOTE: settings file absent (skipped): {sf}\n")
             continue
@@ -73,7 +97,8 @@ def main():
             sys.stderr.write(f"ERROR: cannot parse {sf}: {e}\n")
             return 1
         n = 0
-        for event, cmd in _commands(data):
+        walk = _hookd_commands if sf == HOOKD_GROUPS else _commands
+        for event, cmd in walk(data):
             for m in PATH_RX.findall(cmd):
                 path = m.replace('$HOME', HOME)
                 total += 1
@@ -96,6 +121,10 @@ def main():
     if g and g != EXPECTED_GLOBAL:
         print(f"  NOTE: global ref count {g} != expected {EXPECTED_GLOBAL} "
               f"(update EXPECTED_GLOBAL if the hook set changed intentionally)")
+    hd = per_file.get(HOOKD_GROUPS, 0)
+    if hd and hd != EXPECTED_HOOKD:
+        print(f"  NOTE: hookd group ref count {hd} != expected {EXPECTED_HOOKD} "
+              f"(update EXPECTED_HOOKD if the served set changed intentionally)")
     if missing:
         sys.stderr.write(f"\nFAIL: {len(missing)} referenced hook path(s) do not resolve:\n")
         sys.stderr.write("\n".join(missing) + "\n")